@@ -1,4 +1,307 @@
+import os
+import re
 import json
+import mmap
+import bisect
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+
+# 缓存的已解析脚本个数（按内容哈希）
+SCHEDULE_CACHE_SIZE = 16
+# 缓存的文件记录偏移索引个数
+FILE_INDEX_CACHE_SIZE = 8
+
+
+class ShortsSchedule:
+    """
+    解析并校验后的 shorts 脚本，按列存储：
+    数值列为 array('d')，其余为 tuple，按索引取值 O(1)，长度 O(1)。
+    """
+    __slots__ = ("is_lip_sync", "start_time", "duration", "first_frame_prompt", "video_prompt", "_interval_index")
+
+    def __init__(self, items):
+        is_lip_sync = []
+        start_time = array('d')
+        duration = array('d')
+        first_frame_prompt = []
+        video_prompt = []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                raise ValueError(f"索引 {index} 对应的元素不是对象。")
+            try:
+                start_time.append(float(item.get("start_time", 0.0)))
+                duration.append(float(item.get("duration", 0.0)))
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"索引 {index} 的 start_time / duration 不是数值: {e}")
+            is_lip_sync.append(item.get("is_lip_sync", False))
+            first_frame_prompt.append(item.get("first_frame_prompt", ""))
+            video_prompt.append(item.get("video_prompt", ""))
+        self.is_lip_sync = tuple(is_lip_sync)
+        self.start_time = start_time
+        self.duration = duration
+        self.first_frame_prompt = tuple(first_frame_prompt)
+        self.video_prompt = tuple(video_prompt)
+        self._interval_index = None
+
+    def __len__(self):
+        return len(self.start_time)
+
+    def row(self, index):
+        """返回 (is_lip_sync, start_time, duration, first_frame_prompt, video_prompt)"""
+        if index < 0 or index >= len(self):
+            raise ValueError(f"索引 {index} 超出范围（数组长度 {len(self)}）。")
+        return (self.is_lip_sync[index], self.start_time[index], self.duration[index],
+                self.first_frame_prompt[index], self.video_prompt[index])
+
+    def lip_sync_mask(self):
+        return [bool(v) for v in self.is_lip_sync]
+
+    def start_frames(self, fps):
+        """每段起始时间对应的帧索引（即 WanInfiniteTalkToVideoEx 的 audio_offset）"""
+        return [int(round(t * fps)) for t in self.start_time]
+
+    def frame_offsets(self, fps):
+        """按各段时长 round(duration * fps) 累加的起始帧偏移，首段为 0"""
+        offsets = []
+        total = 0
+        for d in self.duration:
+            offsets.append(total)
+            total += int(round(d * fps))
+        return offsets
+
+    def _get_interval_index(self):
+        """按起始时间排序的区间索引：(排序后的原始索引, 排序后的起点, 结束时间的前缀最大值)"""
+        if self._interval_index is None:
+            order = sorted(range(len(self)), key=self.start_time.__getitem__)
+            starts = array('d', (self.start_time[i] for i in order))
+            max_ends = array('d')
+            running = float("-inf")
+            for i in order:
+                running = max(running, self.start_time[i] + self.duration[i])
+                max_ends.append(running)
+            self._interval_index = (tuple(order), starts, max_ends)
+        return self._interval_index
+
+    def overlapping(self, start, end=None):
+        """
+        返回与时间区间 [start, end) 重叠的片段索引（升序）；end 为 None 时查询包含时间点 start 的片段。
+        二分定位最后一个起点在区间内的片段，再向前扫描，前缀最大结束时间不超过 start 时停止。
+        """
+        order, starts, max_ends = self._get_interval_index()
+        if end is None:
+            k = bisect.bisect_right(starts, start)
+        else:
+            k = bisect.bisect_left(starts, end)
+        result = []
+        for pos in range(k - 1, -1, -1):
+            if max_ends[pos] <= start:
+                break
+            i = order[pos]
+            if self.start_time[i] + self.duration[i] > start:
+                result.append(i)
+        result.sort()
+        return result
+
+
+class _ParsedScript:
+    """缓存条目：原始数组长度，以及校验通过的 ShortsSchedule 或校验错误"""
+    __slots__ = ("length", "schedule", "error")
+
+    def __init__(self, length, schedule=None, error=None):
+        self.length = length
+        self.schedule = schedule
+        self.error = error
+
+
+_script_cache = OrderedDict()  # 内容哈希 -> _ParsedScript
+_script_cache_lock = threading.Lock()
+
+
+def _parse_script(json_str):
+    """按内容哈希缓存 json.loads + 整体校验的结果（包括校验失败），同一脚本只解析一次"""
+    key = hashlib.blake2b(json_str.encode("utf-8"), digest_size=16).digest()
+    with _script_cache_lock:
+        parsed = _script_cache.get(key)
+        if parsed is not None:
+            _script_cache.move_to_end(key)
+            return parsed
+
+    try:
+        data = json.loads(json_str)
+    except json.JSONDecodeError as e:
+        # 不缓存：与原行为一致，每次执行都抛出解析错误
+        raise ValueError(f"JSON解析失败: {e}\n请确保输入是合法的JSON数组。")
+
+    if not isinstance(data, list):
+        parsed = _ParsedScript(0, error=ValueError("JSON根元素必须是数组。"))
+    else:
+        try:
+            parsed = _ParsedScript(len(data), schedule=ShortsSchedule(data))
+        except ValueError as e:
+            parsed = _ParsedScript(len(data), error=e)
+
+    with _script_cache_lock:
+        _script_cache[key] = parsed
+        while len(_script_cache) > SCHEDULE_CACHE_SIZE:
+            _script_cache.popitem(last=False)
+    return parsed
+
+
+def get_schedule(json_str):
+    """返回校验后的 ShortsSchedule，脚本不合法时抛出 ValueError"""
+    parsed = _parse_script(json_str)
+    if parsed.error is not None:
+        raise ValueError(str(parsed.error))
+    return parsed.schedule
+
+
+# JSON 数组扫描时只关心的结构字符（转义序列整体匹配，避免误判字符串中的引号）
+_JSON_TOKEN_RE = re.compile(rb'\\.|["\[\]{},]')
+
+
+class ShortsFileIndex:
+    """
+    JSONL / JSON 数组文件的记录偏移索引：只保存每条记录的 [起, 止) 字节偏移，
+    取记录时 mmap 文件并只解码该条记录。
+    """
+    __slots__ = ("path", "stat_key", "starts", "ends")
+
+    def __init__(self, path, stat_key, starts, ends):
+        self.path = path
+        self.stat_key = stat_key
+        self.starts = starts
+        self.ends = ends
+
+    def __len__(self):
+        return len(self.starts)
+
+    def record(self, index):
+        if index < 0 or index >= len(self):
+            raise ValueError(f"索引 {index} 超出范围（记录数 {len(self)}）。")
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            raw = mm[self.starts[index]:self.ends[index]]
+        try:
+            return json.loads(raw)
+        except ValueError as e:
+            raise ValueError(f"记录 {index} 解析失败: {e}")
+
+
+def _index_jsonl(mm):
+    """按换行切分，跳过空行"""
+    starts, ends = array('Q'), array('Q')
+    pos, size = 0, len(mm)
+    while pos < size:
+        nl = mm.find(b"\n", pos)
+        end = size if nl < 0 else nl
+        if mm[pos:end].strip():
+            starts.append(pos)
+            ends.append(end)
+        pos = end + 1
+    return starts, ends
+
+
+def _index_json_array(mm):
+    """扫描顶层数组，记录每个元素的字节范围（只在结构字符上做状态转移）"""
+    starts, ends = array('Q'), array('Q')
+    depth = 0
+    in_string = False
+    element_start = None
+    boundary = 0  # 上一个 '[' 或 ',' 之后的位置
+
+    def close_element(pos, required):
+        if element_start is not None:
+            starts.append(element_start)
+            ends.append(pos)
+            return
+        # 数字 / true / false / null 等没有结构字符的元素
+        raw = mm[boundary:pos]
+        stripped = raw.strip()
+        if stripped:
+            start = boundary + (len(raw) - len(raw.lstrip()))
+            starts.append(start)
+            ends.append(start + len(stripped))
+        elif required:
+            raise ValueError(f"位置 {pos} 处存在空元素。")
+
+    for match in _JSON_TOKEN_RE.finditer(mm):
+        token = match.group()
+        if in_string:
+            if token == b'"':
+                in_string = False
+            continue
+        if token[:1] == b'\\':
+            continue
+        pos = match.start()
+        if token == b'"':
+            in_string = True
+            if depth == 1 and element_start is None:
+                element_start = pos
+        elif token in (b'[', b'{'):
+            if depth == 1 and element_start is None:
+                element_start = pos
+            depth += 1
+            if depth == 1:
+                boundary = pos + 1
+        elif token in (b']', b'}'):
+            depth -= 1
+            if depth == 0:
+                close_element(pos, False)
+                break
+        elif token == b',' and depth == 1:
+            close_element(pos, True)
+            element_start = None
+            boundary = pos + 1
+    if depth != 0:
+        raise ValueError("JSON 数组不完整。")
+    return starts, ends
+
+
+_file_index_cache = OrderedDict()  # 绝对路径 -> ShortsFileIndex
+_file_index_cache_lock = threading.Lock()
+
+
+def _stat_key(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def get_file_index(path):
+    """
+    获取文件的记录偏移索引，文件 (mtime, size) 变化时重建。
+    .jsonl / .ndjson 按行；其它文件首个非空白字符为 '[' 时按 JSON 数组扫描，否则按行。
+    """
+    path = os.path.abspath(path)
+    try:
+        stat_key = _stat_key(path)
+    except OSError:
+        raise ValueError(f"文件不存在: {path}")
+
+    with _file_index_cache_lock:
+        index = _file_index_cache.get(path)
+        if index is not None and index.stat_key == stat_key:
+            _file_index_cache.move_to_end(path)
+            return index
+
+    if stat_key[1] == 0:
+        starts, ends = array('Q'), array('Q')
+    else:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            head = mm[:4096].lstrip(b"\xef\xbb\xbf \t\r\n")
+            if not path.lower().endswith(('.jsonl', '.ndjson')) and head[:1] == b'[':
+                starts, ends = _index_json_array(mm)
+            else:
+                starts, ends = _index_jsonl(mm)
+
+    index = ShortsFileIndex(path, stat_key, starts, ends)
+    with _file_index_cache_lock:
+        _file_index_cache[path] = index
+        _file_index_cache.move_to_end(path)
+        while len(_file_index_cache) > FILE_INDEX_CACHE_SIZE:
+            _file_index_cache.popitem(last=False)
+    return index
+
 
 class JSONShortsMVByIndex:
     """
@@ -32,30 +335,8 @@ class JSONShortsMVByIndex:
     CATEGORY = "utils/parser"
     
     def get_segment(self, json_str, index):
-        # 解析JSON
-        try:
-            data = json.loads(json_str)
-        except json.JSONDecodeError as e:
-            raise ValueError(f"JSON解析失败: {e}\n请确保输入是合法的JSON数组。")
-        
-        if not isinstance(data, list):
-            raise ValueError("JSON根元素必须是数组。")
-        
-        if index < 0 or index >= len(data):
-            raise ValueError(f"索引 {index} 超出范围（数组长度 {len(data)}）。")
-        
-        item = data[index]
-        if not isinstance(item, dict):
-            raise ValueError(f"索引 {index} 对应的元素不是对象。")
-        
-        # 提取字段，提供默认值
-        is_lip_sync = item.get("is_lip_sync", False)
-        start_time = float(item.get("start_time", 0.0))
-        duration = float(item.get("duration", 0.0))
-        first_frame_prompt = item.get("first_frame_prompt", "")
-        video_prompt = item.get("video_prompt", "")
-        
-        return (is_lip_sync, start_time, duration, first_frame_prompt, video_prompt)
+        # 同一脚本只解析、校验一次，之后按列 O(1) 取值
+        return get_schedule(json_str).row(index)
 
 
 class JSONArrayLength:
@@ -66,5 +347,131 @@ class JSONArrayLength:
     FUNCTION = "get_length"
     CATEGORY = "utils/parser"
     def get_length(self, json_str):
-        data = json.loads(json_str)
-        return (len(data) if isinstance(data, list) else 0,)
\ No newline at end of file
+        try:
+            return (_parse_script(json_str).length,)
+        except ValueError as e:
+            raise ValueError(f"[JSONArrayLength] {e}")
+
+
+class JSONShortsMVColumns:
+    """
+    一次取出整份脚本的列：起始时间、时长、累计帧偏移、音频偏移和口型同步掩码。
+    列表输出，下游节点会对每个元素各执行一次。
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "json_str": ("STRING", {
+                    "multiline": True,
+                    "default": "[]",
+                    "tooltip": "符合格式的JSON数组字符串"
+                }),
+                "fps": ("INT", {
+                    "default": 25,
+                    "min": 1,
+                    "max": 120,
+                    "step": 1,
+                    "tooltip": "计算帧偏移使用的帧率"
+                }),
+            }
+        }
+
+    RETURN_TYPES = ("FLOAT", "FLOAT", "INT", "INT", "BOOLEAN", "INT")
+    RETURN_NAMES = ("start_times", "durations", "frame_offsets", "audio_offsets", "lip_sync_mask", "count")
+    OUTPUT_IS_LIST = (True, True, True, True, True, False)
+    FUNCTION = "get_columns"
+    CATEGORY = "utils/parser"
+
+    def get_columns(self, json_str, fps=25):
+        schedule = get_schedule(json_str)
+        return (list(schedule.start_time), list(schedule.duration), schedule.frame_offsets(fps),
+                schedule.start_frames(fps), schedule.lip_sync_mask(), len(schedule))
+
+
+class JSONShortsMVOverlapping:
+    """查询与某个时间点（或时间区间）重叠的片段索引"""
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "json_str": ("STRING", {
+                    "multiline": True,
+                    "default": "[]",
+                    "tooltip": "符合格式的JSON数组字符串"
+                }),
+                "time": ("FLOAT", {
+                    "default": 0.0,
+                    "min": 0.0,
+                    "max": 1e6,
+                    "step": 0.01,
+                    "tooltip": "查询的时间点 / 区间起点（秒）"
+                }),
+                "end_time": ("FLOAT", {
+                    "default": -1.0,
+                    "min": -1.0,
+                    "max": 1e6,
+                    "step": 0.01,
+                    "tooltip": "区间终点（秒），-1 表示只查询时间点 time"
+                }),
+            }
+        }
+
+    RETURN_TYPES = ("INT", "INT")
+    RETURN_NAMES = ("indices", "count")
+    OUTPUT_IS_LIST = (True, False)
+    FUNCTION = "query"
+    CATEGORY = "utils/parser"
+
+    def query(self, json_str, time, end_time=-1.0):
+        schedule = get_schedule(json_str)
+        indices = schedule.overlapping(time, end_time if end_time >= 0 else None)
+        return (indices, len(indices))
+
+
+class JSONShortsMVFromFile:
+    """
+    从 JSONL / JSON 数组文件中按索引读取片段。
+    文件只建立一次记录偏移索引，每次执行只解码一条记录，提示词中只包含文件路径。
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "file_path": ("STRING", {
+                    "default": "",
+                    "tooltip": "shorts 脚本文件路径（.jsonl 每行一个对象，或 JSON 数组）"
+                }),
+                "index": ("INT", {
+                    "default": 0,
+                    "min": 0,
+                    "max": 999999,
+                    "step": 1,
+                    "tooltip": "要提取的片段索引（从0开始）"
+                }),
+            }
+        }
+
+    RETURN_TYPES = ("BOOLEAN", "FLOAT", "FLOAT", "STRING", "STRING", "INT")
+    RETURN_NAMES = ("is_lip_sync", "start_time", "duration", "first_frame_prompt", "video_prompt", "count")
+    FUNCTION = "get_segment"
+    CATEGORY = "utils/parser"
+
+    def get_segment(self, file_path, index):
+        file_index = get_file_index(file_path)
+        item = file_index.record(index)
+        if not isinstance(item, dict):
+            raise ValueError(f"索引 {index} 对应的元素不是对象。")
+        # 复用 ShortsSchedule 的字段默认值与校验
+        return ShortsSchedule([item]).row(0) + (len(file_index),)
+
+    @classmethod
+    def IS_CHANGED(cls, file_path, index):
+        """文件状态未变（且输入未变）时让 ComfyUI 直接复用缓存结果"""
+        try:
+            return str(_stat_key(os.path.abspath(file_path)))
+        except OSError:
+            return "missing"
@@ -1,20 +1,22 @@
 # ComfyUI-LoLo-Nodes/__init__.py
 from .lolo_save_string import LoloSaveString2File
 from .lolo_generate_filename import LoloGenerateFilename
-from .lolo_load_string_from_dir import LoloLoadStringFromDir,LoloLoadStringFromFile
+from .lolo_load_string_from_dir import LoloLoadStringFromDir,LoloLoadStringFromFile,LoloLoadStringBatchFromDir
 from .lolo_save_dir import LoloSaveDirToZip
 from .lolo_get_video_info import LoloGetVideoInfo      
 from .lolo_video_combine import LoloVideoCombine
 from .FlashVSRPipeCleaner import FlashVSRPipeCleaner
-from .debugMemoryNode import DebugMemoryNode
+from .debugMemoryNode import DebugMemoryNode, LoloProfilerReport
 from .wan_infinite_talk_ex import WanInfiniteTalkToVideoEx
 from .lolo_video_save_output import LoloVideoSaveOutput
 from .lolo_clear_cache import LoLolClearCache, LoLolClearCacheWithLabel
 from .lolo_load_audio_from_dir import LoloLoadAudioFromDir
 from .lolo_get_file_count import LoloGetFileCount
 from .lolo_load_video_from_dir import LoloLoadVideoFromDir
-from .JSONShortsMVParser import  JSONShortsMVByIndex, JSONArrayLength
+from .JSONShortsMVParser import  JSONShortsMVByIndex, JSONArrayLength, JSONShortsMVColumns, JSONShortsMVOverlapping, JSONShortsMVFromFile
 from .lolo_generate_batch_save import LoloGenerateBatchSave
+from .lolo_video_encoder_session import LoloVideoEncoderAppend, LoloVideoEncoderFinalize
+from .lolo_segment_planner import LoloSegmentPlanner, LoloSegmentPlanByIndex
 
      
 import os
@@ -24,11 +26,13 @@ NODE_CLASS_MAPPINGS = {
     "LoloGenerateFilename": LoloGenerateFilename,
     "LoloLoadStringFromDir": LoloLoadStringFromDir,
     "LoloLoadStringFromFile":LoloLoadStringFromFile,
+    "LoloLoadStringBatchFromDir": LoloLoadStringBatchFromDir,
     "LoloSaveDirToZip": LoloSaveDirToZip,
     "LoloGetVideoInfo": LoloGetVideoInfo,
     "LoloVideoCombine": LoloVideoCombine,
     "FlashVSRPipeCleaner": FlashVSRPipeCleaner,
     "DebugMemoryNode": DebugMemoryNode,
+    "LoloProfilerReport": LoloProfilerReport,
     "WanInfiniteTalkToVideoEx": WanInfiniteTalkToVideoEx,
     "LoloVideoSaveOutput": LoloVideoSaveOutput,
     "LoLolClearCache": LoLolClearCache,
@@ -38,7 +42,14 @@ NODE_CLASS_MAPPINGS = {
     "LoloLoadVideoFromDir": LoloLoadVideoFromDir,
     "JSONShortsMVByIndex": JSONShortsMVByIndex,
     "JSONArrayLength": JSONArrayLength,
-    "Lolo_generate_batch_save": LoloGenerateBatchSave
+    "JSONShortsMVColumns": JSONShortsMVColumns,
+    "JSONShortsMVOverlapping": JSONShortsMVOverlapping,
+    "JSONShortsMVFromFile": JSONShortsMVFromFile,
+    "Lolo_generate_batch_save": LoloGenerateBatchSave,
+    "LoloVideoEncoderAppend": LoloVideoEncoderAppend,
+    "LoloVideoEncoderFinalize": LoloVideoEncoderFinalize,
+    "LoloSegmentPlanner": LoloSegmentPlanner,
+    "LoloSegmentPlanByIndex": LoloSegmentPlanByIndex,
    
 
 }
@@ -49,11 +60,13 @@ NODE_DISPLAY_NAME_MAPPINGS = {
     "LoloGenerateFilename": "LoLo Generate Filename",
     "LoloLoadStringFromDir": "LoLo Load String From Dir",
     "LoloLoadStringFromFile": "LoLo Load String From File",
+    "LoloLoadStringBatchFromDir": "LoLo Load String Batch From Dir",
     "LoloSaveDirToZip": "LoLo Save Dir To Zip",
     "LoloGetVideoInfo": "LoLo Get Video Info",
     "LoloVideoCombine": "LoLo Video Combine",
     "FlashVSRPipeCleaner": "FlashVSR Pipe Cleaner",
     "DebugMemoryNode": "Debug Memory Node",
+    "LoloProfilerReport": "LoLo Profiler Report",
     "WanInfiniteTalkToVideoEx": "Wan Infinite Talk To Video (Extended)",
     "LoloVideoSaveOutput" : "Lolo Video Save Output",
     "LoLolClearCache": "LoLo: Clear Cache",
@@ -63,9 +76,21 @@ NODE_DISPLAY_NAME_MAPPINGS = {
     "LoloLoadVideoFromDir": "LoLo Load Video From Dir",
     "JSONShortsMVByIndex": "JSON Shorts MV By Index",
     "JSONArrayLength": "JSON Array Length",
+    "JSONShortsMVColumns": "JSON Shorts MV Columns",
+    "JSONShortsMVOverlapping": "JSON Shorts MV Overlapping",
+    "JSONShortsMVFromFile": "JSON Shorts MV From File",
     "Lolo_generate_batch_save": "Lolo Generate Batch Save",
+    "LoloVideoEncoderAppend": "LoLo Video Encoder Append",
+    "LoloVideoEncoderFinalize": "LoLo Video Encoder Finalize",
+    "LoloSegmentPlanner": "LoLo Segment Planner",
+    "LoloSegmentPlanByIndex": "LoLo Segment Plan By Index",
 }
 
+# 挂载 LoLo 节点性能记录（默认关闭，LOLO_PROFILE=1 或 LoLo Profiler Report 节点开启）
+from .lolo_profiler import install_profiler, register_routes
+install_profiler(NODE_CLASS_MAPPINGS)
+register_routes()
+
 NODE_DIR = os.path.dirname(os.path.abspath(__file__))
 WEB_DIRECTORY = "./web"
 def get_web_dir():
@@ -1,5 +1,7 @@
+import os
 import sys
 import time
+from .lolo_profiler import set_profiling, is_profiling, get_records, summarize, export_json, export_csv, clear_records
 
 # 尝试导入 psutil，用于获取内存信息
 try:
@@ -35,4 +37,62 @@ class DebugMemoryNode:
             print("[DebugMemoryNode] psutil not installed, cannot get memory info.")
         
         # 原样返回输入
-        return (anything,)
\ No newline at end of file
+        return (anything,)
+
+
+class LoloProfilerReport:
+    """
+    调试节点：接收任意输入，直接输出，同时开关 LoLo 节点性能记录，
+    并输出按节点汇总的耗时 / 内存报告，可选导出完整记录到 output/profile。
+    """
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "anything": ("*",),
+                "enabled": ("BOOLEAN", {"default": True, "tooltip": "开启 / 关闭 LoLo 节点性能记录"}),
+                "export_format": (["none", "json", "csv"], {"default": "none"}),
+                "top_n": ("INT", {"default": 10, "min": 1, "max": 1000, "step": 1,
+                                  "tooltip": "报告中按总耗时列出前 N 个节点"}),
+                "clear_after": ("BOOLEAN", {"default": False, "tooltip": "输出报告后清空记录"}),
+            }
+        }
+
+    RETURN_TYPES = ("*", "STRING", "STRING")
+    RETURN_NAMES = ("anything", "report", "export_path")
+    FUNCTION = "report"
+    CATEGORY = "utils/debug"
+
+    def report(self, anything, enabled=True, export_format="none", top_n=10, clear_after=False):
+        set_profiling(enabled)
+        records = get_records()
+
+        lines = [f"[LoloProfilerReport] {time.strftime('%H:%M:%S')} 记录 {len(records)} 条，"
+                 f"性能记录{'开启' if is_profiling() else '关闭'}"]
+        for s in summarize(records)[:top_n]:
+            lines.append(f"  {s['node']}: {s['calls']} 次, 总耗时 {s['wall_total']:.2f}s (最大 {s['wall_max']:.2f}s), "
+                         f"CPU {s['cpu_total']:.2f}s, RSS +{s['rss_delta_max']/1024**2:.1f} MB "
+                         f"(采样峰值 +{s['rss_peak_delta_max']/1024**2:.1f} MB), "
+                         f"CUDA峰值 +{s['cuda_peak_delta_max']/1024**2:.1f} MB"
+                         + (f", 失败 {s['errors']} 次" if s['errors'] else ""))
+        report = "\n".join(lines)
+        print(report)
+
+        export_path = ""
+        if export_format != "none":
+            output_dir = os.path.join(".", "output", "profile")
+            os.makedirs(output_dir, exist_ok=True)
+            export_path = os.path.join(output_dir, f"lolo_profile_{int(time.time())}.{export_format}")
+            content = export_json(records) if export_format == "json" else export_csv(records)
+            with open(export_path, "w", encoding="utf-8", newline="") as f:
+                f.write(content)
+            print(f"[LoloProfilerReport] 已导出到 {export_path}")
+
+        if clear_after:
+            clear_records()
+        return (anything, report, export_path)
+
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        """报告内容随时间变化，每次都执行"""
+        return float(time.time())
@@ -11,12 +11,25 @@ LoLolClearCache - 透明缓存清理节点
 使用场景：
 - 在工作流中插入此节点来自动清理缓存
 - 可以添加到任何工作流的任意位置
+
+threshold 模式：
+- 只有内存 / 显存占用或显存碎片率超过水位线时才清理
+- 垃圾回收从年轻代开始逐级升级，降到水位线以下即停止
+- 记录每个动作实际释放的内存和耗时（最近若干条保存在内存中）
 """
 
 import torch
 import gc
 import time
 import logging
+import threading
+from collections import deque
+
+try:
+    import psutil
+    HAS_PSUTIL = True
+except ImportError:
+    HAS_PSUTIL = False
 
 # 尝试导入 ComfyUI 的 model_management，以便清理未使用的模型
 try:
@@ -26,6 +39,166 @@ except ImportError:
 
 logger = logging.getLogger("LoLolClearCache")
 
+# 保留的清理动作记录条数
+GOVERNOR_HISTORY_SIZE = 256
+# 显存保留量低于该值时不计算碎片率（避免小分配下比例失真）
+FRAGMENTATION_MIN_RESERVED_BYTES = 512 << 20
+
+_history = deque(maxlen=GOVERNOR_HISTORY_SIZE)
+_history_lock = threading.Lock()
+
+
+def memory_snapshot():
+    """当前内存状态：RAM 占用率、进程 RSS、显存 allocated / reserved / total（不可用的项为 None）"""
+    snap = {"ram_percent": None, "rss": None, "vram_allocated": None, "vram_reserved": None, "vram_total": None}
+    if HAS_PSUTIL:
+        snap["ram_percent"] = psutil.virtual_memory().percent
+        snap["rss"] = psutil.Process().memory_info().rss
+    if torch.cuda.is_available():
+        snap["vram_allocated"] = torch.cuda.memory_allocated()
+        snap["vram_reserved"] = torch.cuda.memory_reserved()
+        snap["vram_total"] = torch.cuda.get_device_properties(torch.cuda.current_device()).total_memory
+    return snap
+
+
+def _vram_percent(snap):
+    if snap["vram_total"]:
+        return snap["vram_reserved"] * 100.0 / snap["vram_total"]
+    return None
+
+
+def _fragmentation(snap):
+    """显存碎片率：已保留但未分配的比例"""
+    reserved = snap["vram_reserved"]
+    if not reserved or reserved < FRAGMENTATION_MIN_RESERVED_BYTES:
+        return None
+    return (reserved - snap["vram_allocated"]) / reserved
+
+
+def _record(label, action, trigger, before, after, seconds):
+    """记录一次清理动作：RSS / 显存保留量的实际变化和耗时"""
+    entry = {
+        "time": time.time(),
+        "label": label,
+        "action": action,
+        "trigger": trigger,
+        "seconds": round(seconds, 4),
+        "rss_freed": None if before["rss"] is None else before["rss"] - after["rss"],
+        "vram_freed": None if before["vram_reserved"] is None else before["vram_reserved"] - after["vram_reserved"],
+    }
+    with _history_lock:
+        _history.append(entry)
+    freed = []
+    if entry["rss_freed"] is not None:
+        freed.append(f"RAM {entry['rss_freed'] / 1024**2:.1f} MB")
+    if entry["vram_freed"] is not None:
+        freed.append(f"VRAM {entry['vram_freed'] / 1024**2:.1f} MB")
+    logger.info(f"  - {action}（{trigger}）: 释放 {', '.join(freed) or '未知'}，耗时 {seconds * 1000:.1f} ms")
+    return entry
+
+
+def get_governor_history():
+    """返回最近的清理动作记录（从旧到新）"""
+    with _history_lock:
+        return list(_history)
+
+
+def govern_memory(label="", clean_cuda=True, clean_memory=True, clean_unused_models=False,
+                  ram_watermark=85.0, vram_watermark=85.0, fragmentation_watermark=0.5):
+    """
+    按水位线清理：
+    - 任一水位线超标时先清空 LoLo 节点缓存（音频特征 / motion latent）；
+    - RAM 占用率 >= ram_watermark：依次执行 gc.collect(0/1/2)，降到水位线以下即停止；
+    - 显存保留率 >= vram_watermark 或碎片率 >= fragmentation_watermark：先回收年轻代再 empty_cache；
+    - 仍超过水位线且允许时清理未使用的模型。
+    返回本次执行的动作记录列表。
+    """
+    actions = []
+    snap = memory_snapshot()
+
+    over_ram = snap["ram_percent"] is not None and snap["ram_percent"] >= ram_watermark
+    vram_percent = _vram_percent(snap)
+    fragmentation = _fragmentation(snap)
+    over_vram = (vram_percent is not None and vram_percent >= vram_watermark) \
+        or (fragmentation is not None and fragmentation >= fragmentation_watermark)
+    if (clean_memory and over_ram) or (clean_cuda and over_vram):
+        start = time.perf_counter()
+        cleared = clear_lolo_caches()
+        if cleared:
+            after = memory_snapshot()
+            actions.append(_record(label, f"clear {'/'.join(cleared)} cache", "超过水位线", snap, after,
+                                   time.perf_counter() - start))
+            snap = after
+
+    if clean_memory and snap["ram_percent"] is not None and snap["ram_percent"] >= ram_watermark:
+        trigger = f"RAM {snap['ram_percent']:.1f}% >= {ram_watermark:.1f}%"
+        for generation in (0, 1, 2):
+            start = time.perf_counter()
+            gc.collect(generation)
+            after = memory_snapshot()
+            actions.append(_record(label, f"gc.collect({generation})", trigger, snap, after, time.perf_counter() - start))
+            snap = after
+            if snap["ram_percent"] < ram_watermark:
+                break
+
+    vram_percent = _vram_percent(snap)
+    fragmentation = _fragmentation(snap)
+    vram_trigger = None
+    if vram_percent is not None and vram_percent >= vram_watermark:
+        vram_trigger = f"VRAM {vram_percent:.1f}% >= {vram_watermark:.1f}%"
+    elif fragmentation is not None and fragmentation >= fragmentation_watermark:
+        vram_trigger = f"碎片率 {fragmentation:.2f} >= {fragmentation_watermark:.2f}"
+    if clean_cuda and vram_trigger is not None:
+        start = time.perf_counter()
+        # 年轻代里常有刚失去引用、仍占着显存的张量
+        gc.collect(0)
+        torch.cuda.empty_cache()
+        after = memory_snapshot()
+        actions.append(_record(label, "empty_cache", vram_trigger, snap, after, time.perf_counter() - start))
+        snap = after
+
+    if clean_unused_models and comfy.model_management is not None \
+            and hasattr(comfy.model_management, 'cleanup_models'):
+        vram_percent = _vram_percent(snap)
+        over_ram = snap["ram_percent"] is not None and snap["ram_percent"] >= ram_watermark
+        over_vram = vram_percent is not None and vram_percent >= vram_watermark
+        if over_ram or over_vram:
+            start = time.perf_counter()
+            comfy.model_management.cleanup_models()
+            after = memory_snapshot()
+            actions.append(_record(label, "cleanup_models", "清理后仍超过水位线", snap, after, time.perf_counter() - start))
+
+    if not actions:
+        logger.info(f"[LoLolClearCache] 未超过水位线，跳过清理 (RAM {snap['ram_percent']}%, "
+                    f"VRAM {None if vram_percent is None else round(vram_percent, 1)}%)")
+    return actions
+
+
+def clear_lolo_caches():
+    """清空 LoLo 节点的模块级缓存，返回已清理的缓存名列表"""
+    cleared = []
+    try:
+        from .wan_infinite_talk_ex import clear_audio_feature_cache, clear_motion_latent_cache
+    except ImportError:
+        # ComfyUI 版本过旧，InfiniteTalk 节点不可用
+        return cleared
+    clear_audio_feature_cache()
+    cleared.append("audio_feature")
+    clear_motion_latent_cache()
+    cleared.append("motion_latent")
+    return cleared
+
+
+def _format_report(actions):
+    if not actions:
+        return "未超过水位线，未清理"
+    lines = []
+    for a in actions:
+        rss = "?" if a["rss_freed"] is None else f"{a['rss_freed'] / 1024**2:.1f}MB"
+        vram = "?" if a["vram_freed"] is None else f"{a['vram_freed'] / 1024**2:.1f}MB"
+        lines.append(f"{a['action']} [{a['trigger']}] RAM -{rss} VRAM -{vram} {a['seconds'] * 1000:.1f}ms")
+    return "\n".join(lines)
+
 class LoLolClearCache:
     """
     透明缓存清理节点（基础版）
@@ -41,6 +214,22 @@ class LoLolClearCache:
                 "clean_unused_models": ("BOOLEAN", {"default": False, "label": "清理未使用的模型"}),
             },
             "optional": {
+                "mode": (["always", "threshold"], {
+                    "default": "always",
+                    "tooltip": "always：每次执行都清理；threshold：仅在超过水位线时清理，输入不变时不重复执行",
+                }),
+                "ram_watermark": ("FLOAT", {"default": 85.0, "min": 0.0, "max": 100.0, "step": 1.0,
+                                            "tooltip": "系统内存占用率水位线（%），需要 psutil"}),
+                "vram_watermark": ("FLOAT", {"default": 85.0, "min": 0.0, "max": 100.0, "step": 1.0,
+                                             "tooltip": "显存保留量占总显存的水位线（%）"}),
+                "fragmentation_watermark": ("FLOAT", {"default": 0.5, "min": 0.0, "max": 1.0, "step": 0.05,
+                                                      "tooltip": "显存碎片率水位线：(reserved - allocated) / reserved"}),
+                "clear_node_caches": ("BOOLEAN", {
+                    "default": False,
+                    "tooltip": "always 模式下同时清空 LoLo 节点缓存（InfiniteTalk 音频特征 / motion latent）。"
+                               "这些缓存用于分段循环中跨段复用，放在循环内时保持关闭；"
+                               "threshold 模式超过水位线时总会清空",
+                }),
                 "input_1": ("*",),
                 "input_2": ("*",),
                 "input_3": ("*",),
@@ -49,58 +238,100 @@ class LoLolClearCache:
             }
         }
 
-    RETURN_TYPES = ("*",) * 5
-    RETURN_NAMES = ("output_1", "output_2", "output_3", "output_4", "output_5")
+    RETURN_TYPES = ("*",) * 5 + ("STRING",)
+    RETURN_NAMES = ("output_1", "output_2", "output_3", "output_4", "output_5", "report")
     FUNCTION = "process"
     CATEGORY = "LoLoNodes"
     DESCRIPTION = "透传节点，执行后可清理显存、内存和未使用的模型。接收最多5个任意输入，原样输出。"
 
-    def clear_cache(self, clean_cuda, clean_memory, clean_unused_models):
-        """执行缓存清理"""
+    def clear_cache(self, clean_cuda, clean_memory, clean_unused_models, label="", clear_node_caches=False):
+        """执行缓存清理（always 模式），同样记录每个动作释放的内存和耗时"""
+        actions = []
         try:
             logger.info("[LoLolClearCache] 开始清理缓存...")
+            snap = memory_snapshot()
+
+            if clear_node_caches:
+                # 先释放节点缓存持有的张量，后面的 empty_cache / gc 才能真正回收
+                start = time.perf_counter()
+                cleared = clear_lolo_caches()
+                if cleared:
+                    after = memory_snapshot()
+                    actions.append(_record(label, f"clear {'/'.join(cleared)} cache", "always", snap, after,
+                                           time.perf_counter() - start))
+                    snap = after
 
             if clean_cuda and torch.cuda.is_available():
+                start = time.perf_counter()
                 torch.cuda.empty_cache()
-                logger.info("  - CUDA 缓存已清空")
+                after = memory_snapshot()
+                actions.append(_record(label, "empty_cache", "always", snap, after, time.perf_counter() - start))
+                snap = after
 
             if clean_memory:
                 # 多次垃圾回收可能更彻底
+                start = time.perf_counter()
                 for _ in range(3):
                     gc.collect()
-                logger.info("  - 垃圾回收已执行")
+                after = memory_snapshot()
+                actions.append(_record(label, "gc.collect() x3", "always", snap, after, time.perf_counter() - start))
+                snap = after
 
             if clean_unused_models and comfy.model_management is not None:
                 if hasattr(comfy.model_management, 'cleanup_models'):
+                    start = time.perf_counter()
                     comfy.model_management.cleanup_models()
-                    logger.info("  - 未使用的模型已清理")
+                    after = memory_snapshot()
+                    actions.append(_record(label, "cleanup_models", "always", snap, after, time.perf_counter() - start))
                 else:
                     logger.warning("  - comfy.model_management.cleanup_models 不存在，跳过")
 
             logger.info("[LoLolClearCache] 缓存清理完成")
-            return True
         except Exception as e:
             logger.error(f"[LoLolClearCache] 清理缓存时出错: {e}")
-            return False
+        return actions
+
+    def run_cleanup(self, clean_cuda, clean_memory, clean_unused_models, mode="always", ram_watermark=85.0,
+                    vram_watermark=85.0, fragmentation_watermark=0.5, label="", clear_node_caches=False):
+        """按模式执行清理，返回报告文本"""
+        if mode == "threshold":
+            try:
+                actions = govern_memory(label, clean_cuda, clean_memory, clean_unused_models,
+                                        ram_watermark, vram_watermark, fragmentation_watermark)
+            except Exception as e:
+                logger.error(f"[LoLolClearCache] 按水位线清理时出错: {e}")
+                actions = []
+        else:
+            actions = self.clear_cache(clean_cuda, clean_memory, clean_unused_models, label, clear_node_caches)
+        return _format_report(actions)
 
-    def process(self, clean_cuda, clean_memory, clean_unused_models, **kwargs):
+    def process(self, clean_cuda, clean_memory, clean_unused_models, mode="always", ram_watermark=85.0,
+                vram_watermark=85.0, fragmentation_watermark=0.5, clear_node_caches=False, **kwargs):
         """
         处理函数：
         - 接收可选输入（input_1 ~ input_5）
         - 执行清理
-        - 返回与输入顺序对应的5个输出（未提供的输入对应 None）
+        - 返回与输入顺序对应的5个输出（未提供的输入对应 None）以及清理报告
         """
         inputs = [kwargs.get(f"input_{i}") for i in range(1, 6)]
         non_none_inputs = [f"input_{i}" for i, v in enumerate(inputs, start=1) if v is not None]
         logger.info(f"[LoLolClearCache] 收到输入: {', '.join(non_none_inputs) or '无'}")
 
-        self.clear_cache(clean_cuda, clean_memory, clean_unused_models)
+        report = self.run_cleanup(clean_cuda, clean_memory, clean_unused_models, mode,
+                                  ram_watermark, vram_watermark, fragmentation_watermark,
+                                  clear_node_caches=clear_node_caches)
 
-        return tuple(inputs)
+        return tuple(inputs) + (report,)
 
     @classmethod
-    def IS_CHANGED(cls, clean_cuda, clean_memory, clean_unused_models, **kwargs):
-        """每次执行都视为变化，避免被缓存"""
+    def IS_CHANGED(cls, clean_cuda, clean_memory, clean_unused_models, mode="always", **kwargs):
+        """
+        always 模式每次执行都视为变化，避免被缓存；
+        threshold 模式只在输入（即上游结果）变化时执行，届时再检查水位线。
+        """
+        if mode == "threshold":
+            return f"threshold:{clean_cuda}:{clean_memory}:{clean_unused_models}:" \
+                   f"{kwargs.get('ram_watermark')}:{kwargs.get('vram_watermark')}:{kwargs.get('fragmentation_watermark')}"
         return float(time.time())
 
 
@@ -119,18 +350,20 @@ class LoLolClearCacheWithLabel(LoLolClearCache):
         }
         return parent_input
 
-    RETURN_TYPES = ("*",) * 5
-    RETURN_NAMES = ("output_1", "output_2", "output_3", "output_4", "output_5")
+    RETURN_TYPES = ("*",) * 5 + ("STRING",)
+    RETURN_NAMES = ("output_1", "output_2", "output_3", "output_4", "output_5", "report")
     FUNCTION = "process"
     CATEGORY = "LoLoNodes"
     DESCRIPTION = "透传节点，带自定义标签，执行后可清理显存、内存和未使用的模型。"
 
-    def process(self, label, clean_cuda, clean_memory, clean_unused_models, **kwargs):
+    def process(self, label, clean_cuda, clean_memory, clean_unused_models, mode="always", ram_watermark=85.0,
+                vram_watermark=85.0, fragmentation_watermark=0.5, clear_node_caches=False, **kwargs):
         inputs = [kwargs.get(f"input_{i}") for i in range(1, 6)]
         non_none_inputs = [f"input_{i}" for i, v in enumerate(inputs, start=1) if v is not None]
         logger.info(f"[LoLolClearCache] ({label}) 收到输入: {', '.join(non_none_inputs) or '无'}")
 
-        self.clear_cache(clean_cuda, clean_memory, clean_unused_models)
+        report = self.run_cleanup(clean_cuda, clean_memory, clean_unused_models, mode,
+                                  ram_watermark, vram_watermark, fragmentation_watermark, label, clear_node_caches)
         logger.info(f"[LoLolClearCache] ({label}) 清理完成")
 
-        return tuple(inputs)
\ No newline at end of file
+        return tuple(inputs) + (report,)
\ No newline at end of file
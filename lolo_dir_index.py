@@ -0,0 +1,119 @@
+# ComfyUI-LoLo-Nodes/lolo_dir_index.py
+"""
+共享的目录列表索引。
+
+多个节点每次执行都会 listdir + 过滤 + 排序，目录下文件很多（尤其网络挂载）时开销明显。
+这里按 (目录, 过滤条件) 缓存排序后的文件名，目录 mtime 变化时重新扫描；
+计数 O(1)，按索引取文件 O(1)，按文件名定位 O(log n)，范围查询为切片。
+"""
+import os
+import time
+import bisect
+import threading
+from collections import OrderedDict
+
+# 最多缓存的 (目录, 过滤条件) 组合数
+DIR_INDEX_CACHE_SIZE = 64
+
+# 目录 mtime 距今小于该秒数时不信任缓存（部分文件系统 mtime 精度只有 1~2 秒）
+MTIME_SETTLE_SECONDS = 2.0
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class DirIndex:
+    """排序后的目录文件名列表（只读）"""
+    __slots__ = ("directory", "names", "mtime_ns")
+
+    def __init__(self, directory, names, mtime_ns):
+        self.directory = directory
+        self.names = tuple(names)
+        self.mtime_ns = mtime_ns
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, item):
+        return self.names[item]
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def index_of(self, name):
+        """二分查找文件名的位置，不存在返回 -1"""
+        i = bisect.bisect_left(self.names, name)
+        if i < len(self.names) and self.names[i] == name:
+            return i
+        return -1
+
+    def range(self, start=0, stop=None, step=1):
+        return self.names[start:stop:step]
+
+    def path(self, i):
+        return os.path.join(self.directory, self.names[i])
+
+    def paths(self, start=0, stop=None, step=1):
+        return [os.path.join(self.directory, name) for name in self.names[start:stop:step]]
+
+
+def get_dir_index(directory, exts=None, case_sensitive=False, files_only=False, include_hidden=True):
+    """
+    获取目录的排序文件名索引。
+    参数:
+        exts: 后缀元组（如 ('.mp4', '.webm')），None 表示不过滤。
+        case_sensitive: 后缀匹配是否区分大小写（glob 行为为区分）。
+        files_only: 是否只保留普通文件。
+        include_hidden: 是否包含以 '.' 开头的文件（glob 默认不包含）。
+    目录不存在时抛出 NotADirectoryError。
+    """
+    directory = os.path.abspath(directory)
+    try:
+        st = os.stat(directory)
+    except OSError:
+        raise NotADirectoryError(f"目录不存在: {directory}")
+
+    if exts is not None:
+        exts = tuple(exts) if case_sensitive else tuple(e.lower() for e in exts)
+    key = (directory, exts, case_sensitive, files_only, include_hidden)
+
+    settled = time.time() - st.st_mtime >= MTIME_SETTLE_SECONDS
+    with _cache_lock:
+        index = _cache.get(key)
+        if index is not None and index.mtime_ns == st.st_mtime_ns and settled:
+            _cache.move_to_end(key)
+            return index
+
+    names = []
+    with os.scandir(directory) as it:
+        for entry in it:
+            name = entry.name
+            if not include_hidden and name.startswith('.'):
+                continue
+            if exts is not None:
+                match_name = name if case_sensitive else name.lower()
+                if not match_name.endswith(exts):
+                    continue
+            if files_only and not entry.is_file():
+                continue
+            names.append(name)
+    names.sort()
+
+    index = DirIndex(directory, names, st.st_mtime_ns)
+    with _cache_lock:
+        _cache[key] = index
+        _cache.move_to_end(key)
+        while len(_cache) > DIR_INDEX_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return index
+
+
+def invalidate_dir_index(directory=None):
+    """手动失效某个目录（或全部）的缓存，例如本进程刚写入了新文件"""
+    with _cache_lock:
+        if directory is None:
+            _cache.clear()
+            return
+        directory = os.path.abspath(directory)
+        for key in [k for k in _cache if k[0] == directory]:
+            del _cache[key]
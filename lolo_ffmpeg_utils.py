@@ -1,5 +1,8 @@
 import os
 import shutil
+import subprocess
+import tempfile
+import numpy as np
 import folder_paths
 
 try:
@@ -30,4 +33,115 @@ def get_ffmpeg_path():
         "❌ 找不到 ffmpeg 可执行文件。\n"
         "请安装 imageio-ffmpeg：pip install imageio[ffmpeg]\n"
         "或将 ffmpeg 添加到系统 PATH 中。"
-    )
\ No newline at end of file
+    )
+
+
+def get_ffprobe_path():
+    """
+    获取 ffprobe 可执行文件路径。
+    imageio-ffmpeg 只附带 ffmpeg，找不到 ffprobe 时返回 None，由调用方回退到 ffmpeg 头部解析。
+    """
+    path = shutil.which("ffprobe")
+    if path:
+        return path
+    try:
+        ffmpeg_dir = os.path.dirname(get_ffmpeg_path())
+    except RuntimeError:
+        return None
+    for name in ("ffprobe", "ffprobe.exe"):
+        candidate = os.path.join(ffmpeg_dir, name)
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def iter_uint8_frame_chunks(images, chunk_size):
+    """
+    将 IMAGE 张量 [N,H,W,C]（0~1 浮点）按 chunk_size 帧分块转换为 uint8 numpy 数组。
+    峰值内存只与单个分块大小相关，与整段视频长度无关。
+    chunk_size <= 0 表示一次性转换整个批次（旧行为）。
+    """
+    total = images.shape[0]
+    if chunk_size <= 0:
+        # 空批次时 range 的步长不能为 0
+        chunk_size = max(total, 1)
+    for start in range(0, total, chunk_size):
+        chunk = images[start:start + chunk_size]
+        yield np.ascontiguousarray((chunk.cpu().numpy() * 255).astype(np.uint8))
+
+
+class FFmpegFrameWriter:
+    """
+    以流式方式向 ffmpeg stdin 写入 rgb24 原始帧。
+    stderr 重定向到临时文件，避免长时间写入时 stderr 管道写满导致死锁。
+    """
+
+    def __init__(self, cmd):
+        self.cmd = cmd
+        self.frames_written = 0
+        self._stderr_file = tempfile.TemporaryFile()
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE,
+                                     stdout=subprocess.DEVNULL,
+                                     stderr=self._stderr_file)
+
+    def _read_stderr(self):
+        try:
+            self._stderr_file.seek(0)
+            return self._stderr_file.read().decode('utf-8', errors='ignore')
+        except Exception:
+            return ""
+
+    def write(self, images, chunk_size=16):
+        """按块写入 IMAGE 张量，返回本次写入的帧数"""
+        written = 0
+        for frames_np in iter_uint8_frame_chunks(images, chunk_size):
+            try:
+                self.proc.stdin.write(memoryview(frames_np).cast("B"))
+            except (BrokenPipeError, OSError):
+                self.proc.wait()
+                raise RuntimeError(
+                    f"ffmpeg 进程提前退出 (返回码 {self.proc.returncode}):\n{self._read_stderr()}")
+            written += frames_np.shape[0]
+        self.frames_written += written
+        return written
+
+    def close(self):
+        """关闭 stdin 并等待 ffmpeg 完成编码，失败时抛出 RuntimeError"""
+        try:
+            if self.proc.stdin and not self.proc.stdin.closed:
+                try:
+                    self.proc.stdin.close()
+                except (BrokenPipeError, OSError):
+                    pass
+            self.proc.wait()
+            if self.proc.returncode != 0:
+                raise RuntimeError(
+                    f"ffmpeg 编码失败 (返回码 {self.proc.returncode}):\n{self._read_stderr()}")
+        finally:
+            self._stderr_file.close()
+
+    def abort(self):
+        """异常情况下终止 ffmpeg 进程"""
+        try:
+            if self.proc.poll() is None:
+                self.proc.kill()
+                self.proc.wait()
+        finally:
+            self._stderr_file.close()
+
+
+def audio_to_f32le(audio):
+    """
+    将 ComfyUI AUDIO 字典转换为交织的 float32 PCM（f32le）。
+    返回 (audio_np [samples, channels], sample_rate, channels)
+    """
+    waveform = audio["waveform"]
+    sample_rate = audio["sample_rate"]
+    if waveform.dim() == 3:
+        waveform = waveform.squeeze(0)
+    elif waveform.dim() == 1:
+        waveform = waveform.unsqueeze(0)
+
+    channels = waveform.shape[0]
+    audio_np = np.ascontiguousarray(waveform.t().cpu().numpy().astype(np.float32))
+    return audio_np, sample_rate, channels
@@ -1,4 +1,5 @@
 import os
+from .lolo_dir_index import get_dir_index
 
 class LoloGetFileCount:
     @classmethod
@@ -31,15 +32,10 @@ class LoloGetFileCount:
             raise NotADirectoryError(f"目录不存在: {dir}")
 
         if suffix == "*":
-            files = [f for f in os.listdir(dir) if os.path.isfile(os.path.join(dir, f))]
+            files = get_dir_index(dir, files_only=True)
         else:
-            suffixes = [s.strip().lower() for s in suffix.split('|')]
-            files = []
-            for f in os.listdir(dir):
-                if os.path.isfile(os.path.join(dir, f)):
-                    ext = os.path.splitext(f)[1].lower()
-                    if ext in suffixes:
-                        files.append(f)
+            suffixes = tuple(s.strip().lower() for s in suffix.split('|') if s.strip())
+            files = get_dir_index(dir, suffixes, files_only=True)
 
         count = len(files)
         print(f"[LoloGetFileCount] 目录 {dir} 中共有 {count} 个匹配的文件")
@@ -1,19 +1,18 @@
 import os
 import subprocess
 import tempfile
-import re
 
 import torch
-import torchaudio
 import folder_paths
 
 from .lolo_ffmpeg_utils import get_ffmpeg_path
+from .lolo_media_info import get_media_info
 
 class LoloGetVideoInfo:
     """
     输入：视频文件（标准ComfyUI上传）
     输出：
-        - frames_count (INT)   : 视频总帧数（通过 duration * fps 估算）
+        - frames_count (INT)   : 视频总帧数（容器/数据包计数，无法获取时按 duration * fps 估算）
         - fps (FLOAT)         : 视频帧率
         - audio (AUDIO)       : 波形 = [1, channels, samples], sample_rate = int
     """
@@ -31,6 +30,16 @@ class LoloGetVideoInfo:
             "required": {
                 "video": (sorted(files), {"video_upload": True}),
             },
+            "optional": {
+                "audio_start": ("FLOAT", {"default": 0.0, "min": 0.0, "max": 86400.0, "step": 0.01,
+                                          "tooltip": "音频截取起点（秒）"}),
+                "audio_duration": ("FLOAT", {"default": 0.0, "min": 0.0, "max": 86400.0, "step": 0.01,
+                                             "tooltip": "音频截取时长（秒），0 表示到结尾"}),
+                "audio_sample_rate": ("INT", {"default": 0, "min": 0, "max": 192000,
+                                              "tooltip": "输出采样率，0 表示保持原始采样率"}),
+                "audio_channels": ("INT", {"default": 0, "min": 0, "max": 8,
+                                           "tooltip": "输出声道数，0 表示保持原始声道，1 表示混音为单声道"}),
+            },
         }
 
     RETURN_TYPES = ("INT", "FLOAT", "AUDIO")
@@ -50,82 +59,100 @@ class LoloGetVideoInfo:
         except RuntimeError as e:
             raise RuntimeError(f"节点初始化失败: {e}")
 
-    def get_info(self, video):
+    def get_info(self, video, audio_start=0.0, audio_duration=0.0, audio_sample_rate=0, audio_channels=0):
         video_path = folder_paths.get_annotated_filepath(video)
         if not os.path.exists(video_path):
             raise FileNotFoundError(f"视频文件不存在: {video_path}")
 
-        # ---------- 通过 ffmpeg -i 解析视频信息 ----------
-        duration, fps = self._probe_video(video_path)
-        frames_count = int(duration * fps)
-        audio_data = self._extract_audio(video_path)
+        # ---------- 读取容器元数据（不解码，带缓存） ----------
+        info = get_media_info(video_path)
+        duration, fps, frames_count = self._probe_video(info)
+        if info["audio"]:
+            audio_data = self._extract_audio(video_path, info, audio_start, audio_duration,
+                                             audio_sample_rate, audio_channels)
+        else:
+            print(f"[LoloGetVideoInfo] 视频没有音频流 → 使用静音")
+            audio_data = {"waveform": torch.zeros(1, 1, 44100), "sample_rate": 44100}
 
         return (frames_count, fps, audio_data)
 
-    def _probe_video(self, video_path):
+    def _probe_video(self, info):
         """
-        运行 ffmpeg -i 并解析输出，获取时长（秒）和帧率（浮点数）
-        返回 (duration, fps)
+        从共享元数据中取出时长（秒）、帧率（浮点数）和总帧数
+        返回 (duration, fps, frames_count)
         """
-        cmd = [self.ffmpeg_path, "-i", video_path, "-f", "null", "-"]
-        try:
-            result = subprocess.run(cmd, capture_output=True, text=True, check=False)
-            output = result.stderr  # ffmpeg 输出到 stderr
-        except Exception as e:
-            raise RuntimeError(f"运行 ffmpeg 失败: {e}")
-
-        # 解析时长 Duration: HH:MM:SS.milliseconds
-        duration = 0.0
-        duration_match = re.search(r"Duration: (\d+):(\d+):([\d.]+)", output)
-        if duration_match:
-            h, m, s = duration_match.groups()
-            duration = int(h) * 3600 + int(m) * 60 + float(s)
-
-        # 解析帧率，寻找类似 "25 fps" 或 "30000/1001 fps"
-        fps = 0.0
-        fps_match = re.search(r"(\d+(?:\.\d+)?|\d+/\d+)\s+fps", output)
-        if fps_match:
-            fps_str = fps_match.group(1)
-            if '/' in fps_str:
-                num, den = map(int, fps_str.split('/'))
-                fps = num / den
-            else:
-                fps = float(fps_str)
+        video = info["video"]
+        duration = info["duration"]
+        fps = video["fps"] if video is not None else 0.0
 
         if duration == 0 or fps == 0:
-            raise RuntimeError(f"无法从视频中解析出时长或帧率:\n{output}")
+            raise RuntimeError(f"无法从视频中解析出时长或帧率: {info['path']}")
 
-        return duration, fps
+        frames_count = video["frame_count"] or int(duration * fps)
+        return duration, fps, frames_count
 
-    def _extract_audio(self, video_path):
-        """提取音频，输出波形形状 = [1, channels, samples]（与之前相同）"""
-        waveform = torch.zeros(1, 44100)  # 默认静音，[channels, samples]
-        sample_rate = 44100
+    def _extract_audio(self, video_path, info, start=0.0, duration=0.0, sample_rate=0, channels=0):
+        """
+        提取音频，输出波形形状 = [1, channels, samples]（与之前相同）
+        ffmpeg 直接向 stdout 输出 f32le PCM，按预估长度预分配张量并 readinto，不落临时文件。
+        可选截取时间段、重采样、混音。
+        """
+        stream = info["audio"][0]
+        out_rate = sample_rate or stream["sample_rate"] or 44100
+        out_channels = channels or stream["channels"] or 2
+
+        cmd = [self.ffmpeg_path, "-v", "error", "-nostdin"]
+        if start > 0:
+            cmd += ["-ss", str(start)]
+        cmd += ["-i", video_path]
+        if duration > 0:
+            cmd += ["-t", str(duration)]
+        cmd += ["-vn", "-map", "0:a:0", "-acodec", "pcm_f32le", "-f", "f32le",
+                "-ar", str(out_rate), "-ac", str(out_channels), "pipe:1"]
+
+        # 按时长预估样本数（多留 1 秒余量），不足时再扩容
+        span = duration if duration > 0 else max(0.0, info["duration"] - start)
+        frame_bytes = 4 * out_channels
+        buffer = torch.empty((int(span * out_rate) + out_rate) * out_channels, dtype=torch.float32)
+        filled = 0
 
-        # 检查是否有音频流（可选，不检查也能提取，失败回退静音）
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
-            tmp_wav = tmp.name
         try:
-            cmd = [self.ffmpeg_path, "-i", video_path, "-vn",
-                   "-acodec", "pcm_s16le", "-y", tmp_wav]
-            subprocess.run(cmd, check=True, capture_output=True)
-            waveform, sample_rate = torchaudio.load(tmp_wav)  # [channels, samples]
+            with tempfile.TemporaryFile() as stderr_file:
+                proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file)
+                try:
+                    view = memoryview(buffer.numpy()).cast("B")
+                    while True:
+                        if filled == len(view):
+                            grown = torch.empty(buffer.numel() + (buffer.numel() >> 1) + out_rate * out_channels,
+                                                dtype=torch.float32)
+                            grown[:buffer.numel()].copy_(buffer)
+                            buffer = grown
+                            view = memoryview(buffer.numpy()).cast("B")
+                        n = proc.stdout.readinto(view[filled:])
+                        if not n:
+                            break
+                        filled += n
+                finally:
+                    proc.stdout.close()
+                    proc.wait()
+                if proc.returncode != 0:
+                    stderr_file.seek(0)
+                    raise RuntimeError(stderr_file.read().decode("utf-8", errors="ignore"))
         except Exception as e:
             print(f"[LoloGetVideoInfo] 音频提取失败: {e} → 使用静音")
-        finally:
-            if os.path.exists(tmp_wav):
-                os.remove(tmp_wav)
+            return {"waveform": torch.zeros(1, 1, 44100), "sample_rate": 44100}
 
-        # 强制转换为 [1, channels, samples]
-        if waveform.dim() == 1:
-            waveform = waveform.unsqueeze(0).unsqueeze(0)   # [S] → [1, 1, S]
-        elif waveform.dim() == 2:
-            waveform = waveform.unsqueeze(0)                # [C, S] → [1, C, S]
-        # 已经是3维，确保batch在第一维
+        samples = filled // frame_bytes
+        if samples == 0:
+            print(f"[LoloGetVideoInfo] 指定范围内没有音频数据 → 使用静音")
+            return {"waveform": torch.zeros(1, out_channels, out_rate), "sample_rate": out_rate}
 
-        return {"waveform": waveform, "sample_rate": sample_rate}
+        # 交织 PCM [S, C] → [1, C, S]；contiguous 复制出恰好大小的连续张量，
+        # 不返回带步长的转置视图，也不让它拖住预留了余量的整块缓冲区
+        waveform = buffer[:samples * out_channels].view(samples, out_channels).t().contiguous().unsqueeze(0)
+        return {"waveform": waveform, "sample_rate": out_rate}
 
     @classmethod
-    def IS_CHANGED(cls, video):
+    def IS_CHANGED(cls, video, **kwargs):
         path = folder_paths.get_annotated_filepath(video)
         return os.path.getmtime(path) if os.path.exists(path) else float("nan")
\ No newline at end of file
@@ -1,6 +1,10 @@
 import os
 import torch
 import torchaudio
+from .lolo_dir_index import get_dir_index
+from .lolo_prefetch import Prefetcher
+
+_prefetcher = Prefetcher("LoloLoadAudioFromDir")
 
 class LoloLoadAudioFromDir:
     @classmethod
@@ -10,6 +14,12 @@ class LoloLoadAudioFromDir:
                 "audio_dir": ("STRING", {"default": "", "multiline": False}),
                 "index": ("INT", {"default": 0, "min": 0, "max": 999999}),
             },
+            "optional": {
+                "prefetch": ("INT", {"default": 0, "min": 0, "max": 16,
+                                     "tooltip": "后台预取后续音频的个数，0 表示关闭"}),
+                "prefetch_budget_mb": ("INT", {"default": 1024, "min": 0, "max": 1048576,
+                                               "tooltip": "预取结果可占用的内存上限（MB）"}),
+            },
         }
 
     RETURN_TYPES = ("AUDIO",)
@@ -17,7 +27,15 @@ class LoloLoadAudioFromDir:
     FUNCTION = "load_audio"
     CATEGORY = "LoLo Nodes/audio"
 
-    def load_audio(self, audio_dir, index):
+    def load_audio(self, audio_dir, index, prefetch=0, prefetch_budget_mb=1024):
+        if prefetch <= 0:
+            return self._load_audio(audio_dir, index)
+        return _prefetcher.fetch(audio_dir, index, lambda i: self._load_audio(audio_dir, i),
+                                 prefetch, prefetch_budget_mb << 20,
+                                 path_fn=lambda i: self._resolve_audio_path(audio_dir, i))
+
+    def _resolve_audio_path(self, audio_dir, index):
+        """按目录索引返回第 index 个音频文件的完整路径"""
         audio_dir = audio_dir.strip()
         if not audio_dir:
             raise ValueError("音频目录路径不能为空")
@@ -25,21 +43,22 @@ class LoloLoadAudioFromDir:
         if not os.path.isabs(audio_dir):
             comfy_root = os.getcwd()
             audio_dir = os.path.join(comfy_root, audio_dir)
-            print(f"[LoloLoadAudioFromDir] 解析相对路径为: {audio_dir}")
 
         if not os.path.isdir(audio_dir):
             raise NotADirectoryError(f"音频目录不存在: {audio_dir}")
 
         supported_exts = ('.wav', '.mp3', '.flac', '.ogg', '.m4a', '.aac')
-        files = [f for f in os.listdir(audio_dir) if f.lower().endswith(supported_exts)]
-        files.sort()
+        files = get_dir_index(audio_dir, supported_exts)
         if not files:
             raise RuntimeError(f"目录中没有找到支持的音频文件: {audio_dir}")
 
         if index < 0 or index >= len(files):
             raise IndexError(f"索引 {index} 超出范围 (0-{len(files)-1})")
 
-        file_path = os.path.join(audio_dir, files[index])
+        return os.path.join(audio_dir, files[index])
+
+    def _load_audio(self, audio_dir, index):
+        file_path = self._resolve_audio_path(audio_dir, index)
         print(f"[LoloLoadAudioFromDir] 加载音频: {file_path}")
 
         try:
@@ -1,8 +1,85 @@
 # ComfyUI-LoLo-Nodes/lolo_load_string_from_dir.py
 import os
-import glob
 import time
 import datetime
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from .lolo_prefetch import Prefetcher
+from .lolo_dir_index import get_dir_index
+
+_prefetcher = Prefetcher("LoloLoadStringFromDir")
+
+
+# 文本内容缓存的字节预算（按已解码字符串长度粗略计算）
+TEXT_CACHE_BUDGET_BYTES = 64 << 20
+
+# 绝对路径 -> (mtime_ns, size, content)
+_text_cache = OrderedDict()
+_text_cache_bytes = 0
+_text_cache_lock = threading.Lock()
+
+
+def _file_stat_key(path):
+    """文件状态标识 (mtime_ns, size)，文件不存在返回 None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _decode_text(data):
+    """一次读取的字节内容：先按 UTF-8 解码，失败再按 GBK；换行统一为 \\n（与文本模式读取一致）"""
+    try:
+        text = data.decode('utf-8')
+    except UnicodeDecodeError:
+        print(f"[LoLo Nodes] 文件编码错误，尝试使用其他编码")
+        text = data.decode('gbk')
+    return text.replace('\r\n', '\n').replace('\r', '\n')
+
+
+def _read_text_file(path):
+    """
+    读取文本文件内容（带缓存）：按 (路径, mtime, size) 命中，超出字节预算时按 LRU 淘汰。
+    无法读取返回 None。
+    """
+    global _text_cache_bytes
+    path = os.path.abspath(path)
+    stat_key = _file_stat_key(path)
+    if stat_key is None:
+        print(f"[LoLo Nodes] 读取文件时出错: 文件不存在 {path}")
+        return None
+
+    with _text_cache_lock:
+        entry = _text_cache.get(path)
+        if entry is not None and entry[:2] == stat_key:
+            _text_cache.move_to_end(path)
+            return entry[2]
+
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        content = _decode_text(data)
+    except IOError as e:
+        print(f"[LoLo Nodes] 读取文件时出错: {e}")
+        return None
+    except UnicodeDecodeError:
+        print(f"[LoLo Nodes] 无法读取文件: {path}")
+        return None
+
+    with _text_cache_lock:
+        old = _text_cache.pop(path, None)
+        if old is not None:
+            _text_cache_bytes -= len(old[2])
+        if len(content) <= TEXT_CACHE_BUDGET_BYTES:
+            _text_cache[path] = (stat_key[0], stat_key[1], content)
+            _text_cache_bytes += len(content)
+            while _text_cache_bytes > TEXT_CACHE_BUDGET_BYTES:
+                _, evicted = _text_cache.popitem(last=False)
+                _text_cache_bytes -= len(evicted[2])
+    return content
+
 
 class LoloLoadStringFromDir:
     """
@@ -45,7 +122,20 @@ class LoloLoadStringFromDir:
                 "max": 0xffffffffffffffff
                 }),
             },
-            "optional": {}
+            "optional": {
+                "prefetch": ("INT", {
+                    "default": 0,
+                    "min": 0,
+                    "max": 16,
+                    "tooltip": "后台预取后续文件的个数，0 表示关闭"
+                }),
+                "prefetch_budget_mb": ("INT", {
+                    "default": 64,
+                    "min": 0,
+                    "max": 65536,
+                    "tooltip": "预取结果可占用的内存上限（MB）"
+                }),
+            }
         }
 
     CATEGORY = "LoLo Nodes/Utils"
@@ -53,7 +143,8 @@ class LoloLoadStringFromDir:
     RETURN_NAMES = ("str", "file_name",)
     FUNCTION = "load_string"
 
-    def load_string(self, dir, suffix=".txt", load=10, index=0, refresh_seed=0):
+    def load_string(self, dir, suffix=".txt", load=10, index=0, refresh_seed=0,
+                    prefetch=0, prefetch_budget_mb=64):
         """
         从指定目录加载字符串文件内容。
         
@@ -62,10 +153,45 @@ class LoloLoadStringFromDir:
             suffix: 文件后缀，默认".txt"。
             load: 预加载的文件个数，>=0。
             index: 要读取的文件索引，>=0。
+            prefetch: 后台预取后续文件的个数，0 表示关闭。
+            prefetch_budget_mb: 预取结果可占用的内存上限（MB）。
             
         返回:
-            tuple: (文件内容字符串,)
+            tuple: (文件内容字符串, 文件名)
         """
+        if prefetch <= 0:
+            return self._load_string(dir, suffix, load, index)
+        return _prefetcher.fetch((dir, suffix, load), index,
+                                 lambda i: self._load_string(dir, suffix, load, i),
+                                 prefetch, prefetch_budget_mb << 20,
+                                 path_fn=lambda i: self._target_path(dir, suffix, load, i))
+
+    @staticmethod
+    def _target_path(dir, suffix, load, index):
+        """与 _load_string 相同的规则定位要读取的文件（索引超出时取最后一个），没有文件返回 None"""
+        if suffix and not suffix.startswith('.'):
+            suffix = '.' + suffix
+        dir_index = get_dir_index(dir, (suffix,), case_sensitive=True, include_hidden=False)
+        count = min(load, len(dir_index)) if load > 0 else len(dir_index)
+        if count == 0:
+            return None
+        return dir_index.path(min(index, count - 1))
+
+    @classmethod
+    def IS_CHANGED(cls, dir, suffix=".txt", load=10, index=0, refresh_seed=0, **kwargs):
+        """目录列表与目标文件状态都未变时让 ComfyUI 直接复用缓存结果"""
+        if not os.path.isdir(dir):
+            return "missing"
+        if suffix and not suffix.startswith('.'):
+            suffix = '.' + suffix
+        dir_index = get_dir_index(dir, (suffix,), case_sensitive=True, include_hidden=False)
+        count = min(load, len(dir_index)) if load > 0 else len(dir_index)
+        if count == 0:
+            return f"{dir_index.mtime_ns}:empty"
+        target = dir_index.path(min(index, count - 1))
+        return f"{dir_index.mtime_ns}:{target}:{_file_stat_key(target)}"
+
+    def _load_string(self, dir, suffix, load, index):
         # 1. 检查目录是否存在
         if not os.path.isdir(dir):
             print(f"[LoLo Nodes] 目录不存在: {dir}")
@@ -75,32 +201,27 @@ class LoloLoadStringFromDir:
         if suffix and not suffix.startswith('.'):
             suffix = '.' + suffix
         
-        # 3. 构建文件匹配模式并查找文件
-        # 使用glob查找匹配后缀的文件
-        pattern = os.path.join(dir, f"*{suffix}")
-        all_files = glob.glob(pattern)
+        # 3. 查找匹配后缀的文件（共享目录索引，已按文件名排序；与 glob 一致：区分大小写、忽略隐藏文件）
+        dir_index = get_dir_index(dir, (suffix,), case_sensitive=True, include_hidden=False)
         
-        # 4. 按文件名排序以确保一致性
-        all_files.sort()
-        
-        # 5. 根据load参数限制文件数量
+        # 4. 根据load参数限制文件数量
         if load > 0:
-            files = all_files[:load]
+            files = dir_index.paths(0, load)
         else:
-            files = all_files
+            files = dir_index.paths()
         
-        # 6. 检查文件数量是否足够
+        # 5. 检查文件数量是否足够
         if len(files) == 0:
             print(f"[LoLo Nodes] 在目录 {dir} 中未找到 {suffix} 文件")
             return ("","",)
         
-        # 7. 检查索引是否在有效范围内
+        # 6. 检查索引是否在有效范围内
         if index >= len(files):
             print(f"[LoLo Nodes] 索引 {index} 超出范围 (0-{len(files)-1})")
             # 如果索引超出范围，返回最后一个文件的内容
             index = len(files) - 1
         
-        # 8. 读取指定索引的文件内容
+        # 7. 读取指定索引的文件内容
         target_file = files[index]
 
         # 获取不带路径的完整文件名（含后缀）
@@ -113,25 +234,96 @@ class LoloLoadStringFromDir:
         # - filename_without_ext 是不包含路径和后缀的纯文件名
         # - file_ext 是后缀（例如 ".txt"、".json" 等，包含点号）
 
-        try:
-            with open(target_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            print(f"[LoLo Nodes] 从 {target_file} 加载了 {len(content)} 个字符")
-            return (content,filename_without_ext,)
-            
-        except IOError as e:
-            print(f"[LoLo Nodes] 读取文件时出错: {e}")
+        content = _read_text_file(target_file)
+        if content is None:
             return ("", "",)
-        except UnicodeDecodeError:
-            print(f"[LoLo Nodes] 文件编码错误，尝试使用其他编码")
-            try:
-                with open(target_file, 'r', encoding='gbk') as f:
-                    content = f.read()
-                return (content, filename_without_ext,)
-            except:
-                print(f"[LoLo Nodes] 无法读取文件: {target_file}")
-                return ("", "",)
+        print(f"[LoLo Nodes] 从 {target_file} 加载了 {len(content)} 个字符")
+        return (content, filename_without_ext,)
+
+
+class LoloLoadStringBatchFromDir:
+    """
+    一次扫描目录，批量读取多个字符串文件（线程池并行读取）。
+    输入：目录路径、文件后缀、起始索引、读取个数、并行线程数。
+    输出：文件内容列表、文件名列表（列表输出，下游节点按元素展开执行）以及实际读取个数。
+    """
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "dir": ("STRING", {
+                    "default": "./input",
+                    "multiline": False
+                }),
+                "suffix": ("STRING", {
+                    "default": ".txt",
+                    "multiline": False
+                }),
+                "start_index": ("INT", {
+                    "default": 0,
+                    "min": 0,
+                    "max": 1000000,
+                    "step": 1,
+                    "display": "number"
+                }),
+                "count": ("INT", {
+                    "default": 0,
+                    "min": 0,
+                    "max": 1000000,
+                    "step": 1,
+                    "display": "number",
+                    "tooltip": "读取的文件个数，0 表示读取到最后"
+                }),
+                "workers": ("INT", {
+                    "default": 8,
+                    "min": 1,
+                    "max": 64,
+                    "step": 1,
+                    "display": "number"
+                }),
+                "refresh_seed": ("INT", {
+                    "default": 0,
+                    "min": 0,
+                    "max": 0xffffffffffffffff
+                }),
+            },
+            "optional": {}
+        }
+
+    CATEGORY = "LoLo Nodes/Utils"
+    RETURN_TYPES = ("STRING", "STRING", "INT",)
+    RETURN_NAMES = ("str_list", "file_name_list", "count",)
+    OUTPUT_IS_LIST = (True, True, False,)
+    FUNCTION = "load_strings"
+
+    def load_strings(self, dir, suffix=".txt", start_index=0, count=0, workers=8, refresh_seed=0):
+        """
+        从指定目录批量加载字符串文件内容。
+
+        返回:
+            tuple: (文件内容列表, 文件名列表, 读取个数)
+        """
+        if not os.path.isdir(dir):
+            print(f"[LoLo Nodes] 目录不存在: {dir}")
+            return ([], [], 0,)
+
+        if suffix and not suffix.startswith('.'):
+            suffix = '.' + suffix
+
+        dir_index = get_dir_index(dir, (suffix,), case_sensitive=True, include_hidden=False)
+        stop = start_index + count if count > 0 else None
+        files = dir_index.paths(start_index, stop)
+        if not files:
+            print(f"[LoLo Nodes] 在目录 {dir} 中未找到 {suffix} 文件（起始索引 {start_index}）")
+            return ([], [], 0,)
+
+        # 并行读取，map 保持与文件顺序一致；读取失败的文件返回空字符串
+        with ThreadPoolExecutor(max_workers=min(workers, len(files))) as pool:
+            contents = [c if c is not None else "" for c in pool.map(_read_text_file, files)]
+        names = [os.path.splitext(os.path.basename(f))[0] for f in files]
+
+        print(f"[LoLo Nodes] 从 {dir} 批量加载了 {len(files)} 个文件")
+        return (contents, names, len(files),)
 
 
 class LoloLoadStringFromFile:
@@ -190,21 +382,16 @@ class LoloLoadStringFromFile:
             print(f"[LoLo Nodes] 文件不存在: {file_full_path}")
             return ("",)
 
-        # 4. 读取文件内容
-        try:
-            with open(file_full_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            print(f"[LoLo Nodes] 从 {file_full_path} 加载了 {len(content)} 个字符")
-            return (content,)
-        except IOError as e:
-            print(f"[LoLo Nodes] 读取文件时出错 ({file_full_path}): {e}")
+        # 4. 读取文件内容（UTF-8 / GBK 单次读取解码，带缓存）
+        content = _read_text_file(file_full_path)
+        if content is None:
             return ("",)
-        except UnicodeDecodeError:
-            # 尝试GBK编码作为备选
-            try:
-                with open(file_full_path, 'r', encoding='gbk') as f:
-                    content = f.read()
-                return (content,)
-            except Exception as e:
-                print(f"[LoLo Nodes] 无法解码文件 ({file_full_path}): {e}")
-                return ("",)
\ No newline at end of file
+        print(f"[LoLo Nodes] 从 {file_full_path} 加载了 {len(content)} 个字符")
+        return (content,)
+
+    @classmethod
+    def IS_CHANGED(cls, dir, filename, suffix=".txt", seed=0):
+        """文件状态未变（且输入未变）时让 ComfyUI 直接复用缓存结果"""
+        if suffix and not suffix.startswith('.'):
+            suffix = '.' + suffix
+        return str(_file_stat_key(os.path.join(dir, f"{filename}{suffix}")))
\ No newline at end of file
@@ -1,8 +1,70 @@
 import os
+import time
+import bisect
+import tempfile
+import subprocess
 import cv2
 import torch
 import numpy as np
 import folder_paths
+from .lolo_ffmpeg_utils import get_ffmpeg_path
+from .lolo_media_info import get_media_info, get_frame_index, display_size
+from .lolo_dir_index import get_dir_index
+from .lolo_prefetch import Prefetcher
+
+# ffmpeg 后端每次 readinto 的缓冲区大小上限
+FFMPEG_READ_CHUNK_BYTES = 64 << 20
+# 帧数未知时输出缓冲区的初始帧数与扩容倍数
+UNKNOWN_COUNT_INITIAL_FRAMES = 64
+UNKNOWN_COUNT_GROWTH = 1.5
+
+_prefetcher = Prefetcher("LoloLoadVideoFromDir")
+
+
+class _FrameBuffer:
+    """
+    [N, H, W, 3] float32 输出缓冲区。
+    帧数已知时一次分配到位；未知（capacity=None）时按倍数扩容，一直读到视频结尾。
+    """
+
+    def __init__(self, height, width, capacity=None):
+        self.height = height
+        self.width = width
+        self.capacity = capacity
+        self.images = torch.empty((capacity or UNKNOWN_COUNT_INITIAL_FRAMES, height, width, 3),
+                                  dtype=torch.float32)
+        self.array = self.images.numpy()
+        self.loaded = 0
+
+    def full(self):
+        return self.capacity is not None and self.loaded >= self.capacity
+
+    def remaining(self, limit):
+        """本次最多还能写入的帧数（不超过 limit）"""
+        if self.capacity is None:
+            return limit
+        return min(limit, self.capacity - self.loaded)
+
+    def slots(self, n):
+        """返回接下来 n 帧的 numpy 视图，容量不足时扩容"""
+        end = self.loaded + n
+        if end > len(self.images):
+            grown = torch.empty((max(end, int(len(self.images) * UNKNOWN_COUNT_GROWTH)),
+                                 self.height, self.width, 3), dtype=torch.float32)
+            grown[:self.loaded] = self.images[:self.loaded]
+            self.images = grown
+            self.array = grown.numpy()
+        return self.array[self.loaded:end]
+
+    def commit(self, n):
+        self.loaded += n
+
+    def result(self):
+        """返回恰好 loaded 帧的张量；有多余容量时复制一份，不让切片视图拖住整块过量分配的内存"""
+        if self.loaded == len(self.images):
+            return self.images
+        return self.images[:self.loaded].clone()
+
 
 class LoloLoadVideoFromDir:
     @classmethod
@@ -12,6 +74,24 @@ class LoloLoadVideoFromDir:
                 "video_dir": ("STRING", {"default": "", "multiline": False}),
                 "index": ("INT", {"default": 0, "min": 0, "max": 999999}),
             },
+            "optional": {
+                "start_frame": ("INT", {"default": 0, "min": -999999, "max": 999999,
+                                        "tooltip": "起始帧，负数表示从末尾倒数（如 -9 取最后 9 帧）"}),
+                "frame_count": ("INT", {"default": 0, "min": 0, "max": 999999,
+                                        "tooltip": "最多读取的帧数，0 表示读到结尾"}),
+                "stride": ("INT", {"default": 1, "min": 1, "max": 1000,
+                                   "tooltip": "每隔 stride 帧取一帧"}),
+                "max_resolution": ("INT", {"default": 0, "min": 0, "max": 16384,
+                                           "tooltip": "长边超过该值时等比缩小，0 表示不缩放"}),
+                "backend": (["cv2", "ffmpeg"], {"default": "cv2",
+                                                "tooltip": "解码后端：OpenCV 逐帧解码，或 ffmpeg 多线程解码并通过管道批量读取"}),
+                "decode_threads": ("INT", {"default": 0, "min": 0, "max": 64,
+                                           "tooltip": "ffmpeg 后端的解码线程数，0 表示自动"}),
+                "prefetch": ("INT", {"default": 0, "min": 0, "max": 16,
+                                     "tooltip": "后台预取后续视频的个数，0 表示关闭"}),
+                "prefetch_budget_mb": ("INT", {"default": 4096, "min": 0, "max": 1048576,
+                                               "tooltip": "预取结果可占用的内存上限（MB）"}),
+            },
         }
 
     RETURN_TYPES = ("IMAGE", "STRING")
@@ -19,7 +99,20 @@ class LoloLoadVideoFromDir:
     FUNCTION = "load_video"
     CATEGORY = "LoLo Nodes/video"
 
-    def load_video(self, video_dir, index):
+    def load_video(self, video_dir, index, start_frame=0, frame_count=0, stride=1, max_resolution=0,
+                   backend="cv2", decode_threads=0, prefetch=0, prefetch_budget_mb=4096):
+        def load(i):
+            return self._load_video(video_dir, i, start_frame, frame_count, stride, max_resolution,
+                                    backend, decode_threads)
+
+        if prefetch <= 0:
+            return load(index)
+        key = (video_dir, start_frame, frame_count, stride, max_resolution, backend, decode_threads)
+        return _prefetcher.fetch(key, index, load, prefetch, prefetch_budget_mb << 20,
+                                 path_fn=lambda i: self._resolve_video_path(video_dir, i))
+
+    def _resolve_video_path(self, video_dir, index):
+        """按目录索引返回第 index 个视频文件的完整路径"""
         # 去除首尾空白
         video_dir = video_dir.strip()
         if not video_dir:
@@ -29,49 +122,226 @@ class LoloLoadVideoFromDir:
         if not os.path.isabs(video_dir):
             comfy_root = os.getcwd()
             video_dir = os.path.join(comfy_root, video_dir)
-            print(f"[LoloLoadVideoFromDir] 解析相对路径为: {video_dir}")
 
         if not os.path.isdir(video_dir):
             raise NotADirectoryError(f"视频目录不存在: {video_dir}")
 
         # 支持的视频扩展名（与 VideoHelperSuite 保持一致）
         video_exts = ('.mp4', '.webm', '.avi', '.mov', '.mkv', '.gif')
-        files = [f for f in os.listdir(video_dir) if f.lower().endswith(video_exts)]
-        files.sort()
+        files = get_dir_index(video_dir, video_exts)
         if not files:
             raise RuntimeError(f"目录中没有找到支持的视频文件: {video_dir}")
 
         if index < 0 or index >= len(files):
             raise IndexError(f"索引 {index} 超出范围 (0-{len(files)-1})")
 
-        video_path = os.path.join(video_dir, files[index])
-        base_name = os.path.splitext(files[index])[0]  # 不含后缀的文件名
+        return os.path.join(video_dir, files[index])
+
+    def _load_video(self, video_dir, index, start_frame, frame_count, stride, max_resolution,
+                    backend, decode_threads):
+        video_path = self._resolve_video_path(video_dir, index)
+        base_name = os.path.splitext(os.path.basename(video_path))[0]  # 不含后缀的文件名
         print(f"[LoloLoadVideoFromDir] 加载视频: {video_path}")
 
-        # 使用 OpenCV 加载视频帧
+        total, src_h, src_w, _ = self._probe_video(video_path)
+        if total is None and start_frame < 0:
+            # 容器没有记录帧数，从末尾倒数时需要先数一遍
+            total = self._count_frames_cv2(video_path)
+        start, count = self._resolve_range(total, start_frame, frame_count, stride)
+        if count == 0:
+            raise RuntimeError(f"视频文件中没有读取到任何帧: {video_path}")
+
+        # 直接写入预分配的 [N, H, W, C] 张量，避免逐帧张量列表 + torch.stack 的双倍峰值内存
+        start_time = time.perf_counter()
+        if backend == "ffmpeg":
+            out_h, out_w = self._target_size(src_h, src_w, max_resolution)
+            buffer = self._decode_ffmpeg(video_path, out_h, out_w, start, count, stride, decode_threads)
+        else:
+            buffer = self._decode_cv2(video_path, start, count, stride, max_resolution)
+        elapsed = time.perf_counter() - start_time
+
+        if buffer is None or buffer.loaded == 0:
+            raise RuntimeError(f"视频文件中没有读取到任何帧: {video_path}")
+        images = buffer.result()
+
+        print(f"[LoloLoadVideoFromDir] [{backend}] 成功加载 {len(images)} 帧（起始帧 {start}，步长 {stride}），"
+              f"尺寸 {images.shape[1]}x{images.shape[2]}，耗时 {elapsed:.2f}s")
+
+        return (images, base_name)
+
+    def _probe_video(self, video_path):
+        """
+        返回 (总帧数, 高, 宽, fps)，高宽为应用旋转后的显示尺寸，帧数未知时为 None。
+        优先使用共享元数据缓存中的准确值，失败时回退到 OpenCV 的属性。
+        """
+        try:
+            video = get_media_info(video_path)["video"]
+            if video is not None and video["width"]:
+                height, width = display_size(video)
+                return video["frame_count"] or None, height, width, video["fps"]
+        except Exception as e:
+            print(f"[LoloLoadVideoFromDir] 元数据探测失败，使用 OpenCV 属性: {e}")
+
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise RuntimeError(f"无法打开视频文件: {video_path}")
+        try:
+            # gif/mkv/webm 等容器上 CAP_PROP_FRAME_COUNT 可能为 0 或负数，视为未知
+            total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            return (total if total > 0 else None,
+                    int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                    int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                    float(cap.get(cv2.CAP_PROP_FPS)))
+        finally:
+            cap.release()
+
+    def _count_frames_cv2(self, video_path):
+        """逐帧 grab() 统计帧数（不做颜色转换）"""
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise RuntimeError(f"无法打开视频文件: {video_path}")
+        total = 0
+        try:
+            while cap.grab():
+                total += 1
+        finally:
+            cap.release()
+        return total
+
+    def _decode_cv2(self, video_path, start, count, stride, max_resolution):
+        """
+        OpenCV 后端：逐帧解码。输出尺寸以第一帧解码结果为准（OpenCV 已应用旋转），
+        count 为 None 时读到结尾。返回 _FrameBuffer，没有读到帧时返回 None。
+        """
         cap = cv2.VideoCapture(video_path)
         if not cap.isOpened():
             raise RuntimeError(f"无法打开视频文件: {video_path}")
 
-        frames = []
+        buffer = None
         try:
-            while True:
+            # 只 seek 到起始帧，跳过的帧用 grab() 丢弃，不做颜色转换
+            if start > 0:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+            while buffer is None or not buffer.full():
                 ret, frame = cap.read()
                 if not ret:
                     break
-                # OpenCV 读取的是 BGR，转换为 RGB
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                # 归一化到 [0,1] 并转为 float32
-                frame_tensor = torch.from_numpy(frame_rgb.astype(np.float32) / 255.0)
-                frames.append(frame_tensor)
+                if buffer is None:
+                    out_h, out_w = self._target_size(frame.shape[0], frame.shape[1], max_resolution)
+                    buffer = _FrameBuffer(out_h, out_w, count)
+                    rgb = np.empty((out_h, out_w, 3), dtype=np.uint8)
+                if frame.shape[0] != out_h or frame.shape[1] != out_w:
+                    frame = cv2.resize(frame, (out_w, out_h), interpolation=cv2.INTER_AREA)
+                # OpenCV 读取的是 BGR，转换为 RGB，归一化到 [0,1]
+                cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb)
+                np.divide(rgb, np.float32(255.0), out=buffer.slots(1)[0])
+                buffer.commit(1)
+                for _ in range(stride - 1):
+                    if not cap.grab():
+                        break
         finally:
             cap.release()
+        return buffer
 
-        if not frames:
-            raise RuntimeError(f"视频文件中没有读取到任何帧: {video_path}")
+    def _decode_ffmpeg(self, video_path, out_h, out_w, start, count, stride, threads):
+        """
+        ffmpeg 后端：多线程解码并在 ffmpeg 内完成旋转/抽帧/缩放/转 rgb24，
+        Python 端按块 readinto 到预分配的 uint8 缓冲区，再向量化转换为 float。
+        count 为 None 时读到结尾。返回 _FrameBuffer。
+        """
+        seek_args, start_condition = self._seek_to_frame(video_path, start)
+        cmd = [get_ffmpeg_path(), "-v", "error", "-nostdin", "-threads", str(threads),
+               *seek_args, "-i", video_path, "-map", "0:v:0"]
+
+        filters = []
+        if start_condition is not None:
+            filters.append(f"select={start_condition}")
+        if stride > 1:
+            # 第二个 select 的 n 只计入通过起始条件的帧，步长从起始帧开始计算
+            filters.append(f"select=not(mod(n\\,{stride}))")
+        filters.append(f"scale={out_w}:{out_h}:flags=area")
+        # -vsync passthrough：select 丢弃的帧不补重复帧（比 -fps_mode 兼容更旧的 ffmpeg）
+        cmd += ["-vf", ",".join(filters), "-vsync", "passthrough"]
+        if count is not None:
+            cmd += ["-frames:v", str(count)]
+        cmd += ["-f", "rawvideo", "-pix_fmt", "rgb24", "pipe:1"]
+
+        buffer = _FrameBuffer(out_h, out_w, count)
+        frame_bytes = out_h * out_w * 3
+        chunk_frames = buffer.remaining(max(1, FFMPEG_READ_CHUNK_BYTES // frame_bytes))
+        chunk = np.empty((chunk_frames, out_h, out_w, 3), dtype=np.uint8)
+        chunk_view = memoryview(chunk).cast("B")
+
+        with tempfile.TemporaryFile() as stderr_file:
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file)
+            try:
+                while not buffer.full():
+                    want = buffer.remaining(chunk_frames) * frame_bytes
+                    filled = 0
+                    while filled < want:
+                        n = proc.stdout.readinto(chunk_view[filled:want])
+                        if not n:
+                            break
+                        filled += n
+                    frames = filled // frame_bytes
+                    if frames == 0:
+                        break
+                    np.divide(chunk[:frames], np.float32(255.0), out=buffer.slots(frames))
+                    buffer.commit(frames)
+                    if filled < want:
+                        break
+            finally:
+                proc.stdout.close()
+                proc.wait()
+            # 读满后提前关闭管道，ffmpeg 因写入失败返回非零属正常情况
+            if proc.returncode != 0 and not buffer.full():
+                stderr_file.seek(0)
+                raise RuntimeError(f"ffmpeg 解码失败 (返回码 {proc.returncode}):\n"
+                                   f"{stderr_file.read().decode('utf-8', errors='ignore')}")
+        return buffer
+
+    def _seek_to_frame(self, video_path, start):
+        """
+        返回定位到第 start 帧的 (输入端参数, select 条件)。
+        按帧时间戳索引找到起始帧之前最近的关键帧，-ss 粗略 seek 到该关键帧，只解码这一个 GOP 内的前置帧；
+        -copyts 保留原始时间戳，再按时间戳 t 选出起始帧及之后的帧，可变帧率 / start_time 不为 0 时同样帧精确。
+        没有时间戳索引（无 ffprobe）时退回按帧序号 n 选帧，需要解码起始帧之前的所有帧。
+        """
+        if start <= 0:
+            return [], None
+        try:
+            index = get_frame_index(video_path)
+        except Exception as e:
+            print(f"[LoloLoadVideoFromDir] 帧时间戳索引获取失败，从头解码: {e}")
+            index = None
+        if index is None or start >= len(index[0]):
+            return [], f"gte(n\\,{start})"
+
+        frame_times, keyframe_times = index
+        target = frame_times[start]
+        # 取与前一帧的中点为阈值，不受时间戳打印精度影响
+        threshold = (frame_times[start - 1] + target) / 2
+        k = bisect.bisect_right(keyframe_times, target) - 1
+        if k < 0:
+            return ["-copyts"], f"gte(t\\,{threshold:.6f})"
+        # -seek_timestamp：-ss 为原始时间戳，不再加上 start_time；
+        # -noaccurate_seek：不按 -ss 裁掉关键帧之后的帧，由 select 负责精确起点
+        return (["-copyts", "-seek_timestamp", "1", "-noaccurate_seek", "-ss", f"{keyframe_times[k]:.6f}"],
+                f"gte(t\\,{threshold:.6f})")
 
-        # 堆叠为 [N, H, W, C]
-        images = torch.stack(frames, dim=0)
-        print(f"[LoloLoadVideoFromDir] 成功加载 {len(images)} 帧，尺寸 {images.shape[1]}x{images.shape[2]}")
+    def _resolve_range(self, total, start_frame, frame_count, stride):
+        """根据总帧数计算 (起始帧, 读取帧数)；总帧数未知时读取帧数为 frame_count，0 则为 None（读到结尾）"""
+        if total is None:
+            return max(start_frame, 0), (frame_count if frame_count > 0 else None)
+        start = total + start_frame if start_frame < 0 else start_frame
+        start = min(max(start, 0), total)
+        available = (total - start + stride - 1) // stride
+        count = min(frame_count, available) if frame_count > 0 else available
+        return start, count
 
-        return (images, base_name)
\ No newline at end of file
+    def _target_size(self, height, width, max_resolution):
+        """长边超过 max_resolution 时等比缩小，返回 (H, W)"""
+        if max_resolution <= 0 or max(height, width) <= max_resolution:
+            return height, width
+        scale = max_resolution / max(height, width)
+        return max(1, round(height * scale)), max(1, round(width * scale))
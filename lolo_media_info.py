@@ -0,0 +1,290 @@
+# ComfyUI-LoLo-Nodes/lolo_media_info.py
+"""
+共享的媒体元数据探测与缓存。
+
+只读取容器头 / 数据包，不解码画面：
+- 优先使用 ffprobe JSON 输出；
+- 没有 ffprobe（imageio-ffmpeg 只附带 ffmpeg）时，回退为 ffmpeg 流复制到 null 并解析头部信息。
+
+结果按 (绝对路径, mtime, size) 缓存，LRU 淘汰，文件被改写后自动重新探测。
+"""
+import os
+import re
+import json
+import threading
+import subprocess
+from collections import OrderedDict
+from .lolo_ffmpeg_utils import get_ffmpeg_path, get_ffprobe_path
+
+# 最多缓存的文件数
+MEDIA_INFO_CACHE_SIZE = 256
+# 最多缓存几个文件的帧时间戳索引
+FRAME_INDEX_CACHE_SIZE = 16
+
+_cache = OrderedDict()
+_frame_index_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def get_media_info(path):
+    """
+    获取媒体文件元数据，返回 dict:
+        {
+            "path": 绝对路径,
+            "duration": 时长（秒）,
+            "video": {"index", "codec", "profile", "level", "pix_fmt", "width", "height", "fps",
+                      "fps_str", "frame_count", "timescale", "rotation"} 或 None,
+            "audio": [{"codec", "sample_rate", "channels"}, ...],
+        }
+    profile 为 ffprobe 的名称（如 "High"、"Main 10"），level 为 ffprobe 的整数值（h264 为 级别×10，
+    hevc 为 级别×30），未知时为 None。
+    width/height 为编码尺寸（未应用旋转）；rotation 为显示时需要旋转的角度（0/90/180/270），
+    解码器（ffmpeg 自动旋转、新版 OpenCV）输出的画面尺寸以旋转后为准，见 display_size。
+    返回的 dict 为缓存共享对象，调用方不要修改。
+    """
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    key = (path, st.st_mtime_ns, st.st_size)
+
+    with _cache_lock:
+        info = _cache.get(key)
+        if info is not None:
+            _cache.move_to_end(key)
+            return info
+
+    ffprobe_path = get_ffprobe_path()
+    if ffprobe_path:
+        info = _probe_with_ffprobe(ffprobe_path, path)
+    else:
+        info = _probe_with_ffmpeg(path)
+
+    with _cache_lock:
+        _cache[key] = info
+        _cache.move_to_end(key)
+        while len(_cache) > MEDIA_INFO_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return info
+
+
+def clear_media_info_cache():
+    with _cache_lock:
+        _cache.clear()
+        _frame_index_cache.clear()
+
+
+def get_frame_index(path):
+    """
+    视频流的帧时间戳索引，只解复用读取数据包，不解码（需要 ffprobe）。
+    返回 (frame_times, keyframe_times)：每帧显示时间戳（秒，升序，第 i 项即第 i 帧）与关键帧时间戳，
+    时间戳为容器原始值（未减去 start_time）。没有 ffprobe 或存在缺失时间戳的数据包时返回 None。
+    """
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    key = (path, st.st_mtime_ns, st.st_size)
+
+    with _cache_lock:
+        if key in _frame_index_cache:
+            _frame_index_cache.move_to_end(key)
+            return _frame_index_cache[key]
+
+    index = None
+    ffprobe_path = get_ffprobe_path()
+    if ffprobe_path:
+        cmd = [ffprobe_path, "-v", "error", "-select_streams", "v:0",
+               "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", path]
+        result = subprocess.run(cmd, capture_output=True, text=True, errors="ignore")
+        frame_times = []
+        keyframe_times = []
+        valid = result.returncode == 0
+        for line in result.stdout.splitlines() if valid else ():
+            fields = line.strip().split(",")
+            if not fields[0]:
+                continue
+            try:
+                pts = float(fields[0])
+            except ValueError:
+                valid = False
+                break
+            frame_times.append(pts)
+            if len(fields) > 1 and "K" in fields[1]:
+                keyframe_times.append(pts)
+        if valid and frame_times:
+            # 数据包按解码顺序排列，有 B 帧时需要按显示时间排序
+            frame_times.sort()
+            keyframe_times.sort()
+            index = (frame_times, keyframe_times)
+
+    with _cache_lock:
+        _frame_index_cache[key] = index
+        _frame_index_cache.move_to_end(key)
+        while len(_frame_index_cache) > FRAME_INDEX_CACHE_SIZE:
+            _frame_index_cache.popitem(last=False)
+    return index
+
+
+def display_size(video):
+    """按 rotation 返回显示尺寸 (高, 宽)：旋转 90/270 度时宽高互换"""
+    if video.get("rotation", 0) in (90, 270):
+        return video["width"], video["height"]
+    return video["height"], video["width"]
+
+
+def _normalize_rotation(value):
+    """把 -90 / 270.00 / "90" 之类的角度归一到 0/90/180/270"""
+    try:
+        return int(round(float(value))) % 360
+    except (TypeError, ValueError):
+        return 0
+
+
+def _parse_rate(rate):
+    """解析 "30000/1001" / "25" 形式的帧率，失败返回 0.0"""
+    try:
+        if "/" in rate:
+            num, den = rate.split("/", 1)
+            return float(num) / float(den) if float(den) else 0.0
+        return float(rate)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _probe_with_ffprobe(ffprobe_path, path):
+    cmd = [ffprobe_path, "-v", "error", "-show_format", "-show_streams", "-of", "json", path]
+    result = subprocess.run(cmd, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffprobe 探测失败: {path}\n{result.stderr.decode('utf-8', errors='ignore')}")
+    data = json.loads(result.stdout.decode("utf-8", errors="ignore") or "{}")
+
+    info = {
+        "path": path,
+        "duration": float(data.get("format", {}).get("duration") or 0.0),
+        "video": None,
+        "audio": [],
+    }
+    for stream in data.get("streams", []):
+        codec_type = stream.get("codec_type")
+        if codec_type == "video" and info["video"] is None:
+            # 跳过封面图之类的附加图片流
+            if stream.get("disposition", {}).get("attached_pic"):
+                continue
+            fps_str = stream.get("avg_frame_rate") or stream.get("r_frame_rate") or "0/0"
+            if _parse_rate(fps_str) == 0.0:
+                fps_str = stream.get("r_frame_rate") or "0/0"
+            time_base = stream.get("time_base", "")
+            # 新版 ffprobe 在 Display Matrix 侧数据中给出旋转，旧版在 rotate 标签中
+            rotation = stream.get("tags", {}).get("rotate", 0)
+            for side_data in stream.get("side_data_list", []):
+                if "rotation" in side_data:
+                    rotation = side_data["rotation"]
+            info["video"] = {
+                "index": stream.get("index", 0),
+                "codec": stream.get("codec_name"),
+                "profile": stream.get("profile"),
+                # 未知级别 ffprobe 输出 -99
+                "level": stream.get("level") if (stream.get("level") or 0) > 0 else None,
+                "pix_fmt": stream.get("pix_fmt"),
+                "width": int(stream.get("width") or 0),
+                "height": int(stream.get("height") or 0),
+                "fps": _parse_rate(fps_str),
+                "fps_str": fps_str,
+                "frame_count": int(stream.get("nb_frames") or 0) or None,
+                "timescale": int(time_base.split("/")[1]) if "/" in time_base else None,
+                "rotation": _normalize_rotation(rotation),
+            }
+        elif codec_type == "audio":
+            info["audio"].append({
+                "codec": stream.get("codec_name"),
+                "sample_rate": int(stream.get("sample_rate") or 0),
+                "channels": int(stream.get("channels") or 0),
+            })
+
+    video = info["video"]
+    if video is not None and video["frame_count"] is None:
+        # 容器头没有帧数（如 webm/mkv）时统计数据包数，只解复用不解码
+        count_cmd = [ffprobe_path, "-v", "error", "-select_streams", "v:0", "-count_packets",
+                     "-show_entries", "stream=nb_read_packets", "-of", "csv=p=0", path]
+        count_result = subprocess.run(count_cmd, capture_output=True, text=True)
+        try:
+            video["frame_count"] = int(count_result.stdout.strip().split(",")[0])
+        except ValueError:
+            video["frame_count"] = None
+    if info["duration"] == 0.0 and video is not None and video["frame_count"] and video["fps"]:
+        info["duration"] = video["frame_count"] / video["fps"]
+    return info
+
+
+_CHANNEL_LAYOUTS = {"mono": 1, "stereo": 2, "2.1": 3, "quad": 4, "4.0": 4, "5.0": 5, "5.1": 6, "7.1": 8}
+
+
+def _probe_with_ffmpeg(path):
+    """
+    无 ffprobe 时的回退：视频流复制到 null 复用器（不解码），
+    解析头部得到流参数，并从最终进度行得到准确帧数。
+    """
+    cmd = [get_ffmpeg_path(), "-hide_banner", "-nostdin", "-i", path,
+           "-map", "0:v:0?", "-c", "copy", "-f", "null", "-"]
+    result = subprocess.run(cmd, capture_output=True, text=True, errors="ignore")
+    output = result.stderr
+
+    # 只解析输入部分，输出部分也会打印 Stream 行
+    header = re.split(r"^Output #0|^Stream mapping", output, maxsplit=1, flags=re.M)[0]
+
+    info = {"path": path, "duration": 0.0, "video": None, "audio": []}
+    duration_match = re.search(r"Duration: (\d+):(\d+):([\d.]+)", header)
+    if duration_match:
+        h, m, s = duration_match.groups()
+        info["duration"] = int(h) * 3600 + int(m) * 60 + float(s)
+
+    for line in header.splitlines():
+        if "Video:" in line and info["video"] is None and "attached pic" not in line:
+            codec_match = re.search(r"Video:\s*([\w-]+)", line)
+            # "Video: h264 (High) (avc1 / 0x31637661)"：编码名后不含 '/' 的括号为 profile
+            profile_match = re.search(r"Video:\s*[\w-]+\s*\(([^)/]+)\)", line)
+            pix_match = re.search(r"Video:[^,]*,\s*([\w-]+)", line)
+            size_match = re.search(r",\s*(\d{2,5})x(\d{2,5})", line)
+            fps_match = re.search(r"([\d.]+)\s+fps", line)
+            tbn_match = re.search(r"([\d.]+)(k?)\s+tbn", line)
+            timescale = None
+            if tbn_match:
+                timescale = int(float(tbn_match.group(1)) * (1000 if tbn_match.group(2) else 1))
+            info["video"] = {
+                "index": 0,
+                "codec": codec_match.group(1) if codec_match else None,
+                "profile": profile_match.group(1).strip() if profile_match else None,
+                "level": None,
+                "pix_fmt": pix_match.group(1) if pix_match else None,
+                "width": int(size_match.group(1)) if size_match else 0,
+                "height": int(size_match.group(2)) if size_match else 0,
+                "fps": float(fps_match.group(1)) if fps_match else 0.0,
+                "fps_str": fps_match.group(1) if fps_match else "0",
+                "frame_count": None,
+                "timescale": timescale,
+                "rotation": 0,
+            }
+        elif "Audio:" in line:
+            codec_match = re.search(r"Audio:\s*([\w-]+)", line)
+            rate_match = re.search(r"(\d+)\s+Hz", line)
+            layout_match = re.search(r"Hz,\s*([^,]+)", line)
+            channels = 0
+            if layout_match:
+                layout = layout_match.group(1).strip()
+                channels_match = re.match(r"(\d+)\s*channels", layout)
+                channels = _CHANNEL_LAYOUTS.get(layout.split("(")[0],
+                                                int(channels_match.group(1)) if channels_match else 0)
+            info["audio"].append({
+                "codec": codec_match.group(1) if codec_match else None,
+                "sample_rate": int(rate_match.group(1)) if rate_match else 0,
+                "channels": channels,
+            })
+
+    if info["video"] is not None:
+        rotation_match = (re.search(r"displaymatrix: rotation of ([-\d.]+) degrees", header)
+                          or re.search(r"^\s*rotate\s*:\s*([-\d.]+)", header, flags=re.M))
+        if rotation_match:
+            info["video"]["rotation"] = _normalize_rotation(rotation_match.group(1))
+        frame_matches = re.findall(r"frame=\s*(\d+)", output)
+        if frame_matches:
+            info["video"]["frame_count"] = int(frame_matches[-1])
+    elif result.returncode != 0 and info["duration"] == 0.0 and not info["audio"]:
+        raise RuntimeError(f"无法解析媒体文件: {path}\n{output}")
+    return info
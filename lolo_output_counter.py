@@ -0,0 +1,118 @@
+# ComfyUI-LoLo-Nodes/lolo_output_counter.py
+"""
+输出文件编号分配器：{base_name}_{NNNNN}.{ext}
+
+每个 (目录, base_name, ext) 在插件目录下的 .lolo_counters 中维护一个计数文件
+（不写入用户的输出目录，避免被目录计数 / 文件列表类节点统计进去），
+分配时对计数文件加文件锁（跨进程）并用 O_EXCL 创建目标文件占位，
+只在计数文件不存在时扫描一次目录作为初始值，之后每次分配为常数时间。
+"""
+import os
+import re
+import hashlib
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+COUNTER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".lolo_counters")
+
+_thread_lock = threading.Lock()
+
+
+def lock_file(fd):
+    """对文件描述符加独占锁（跨进程，阻塞等待）"""
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return
+    os.lseek(fd, 0, os.SEEK_SET)
+    while True:
+        try:
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            continue
+
+
+def unlock_file(fd):
+    """释放 lock_file 加的锁"""
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        return
+    os.lseek(fd, 0, os.SEEK_SET)
+    msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+def _scan_max_counter(directory, base_name, extension):
+    """扫描目录中已有的最大编号（仅在初始化计数文件时调用一次）"""
+    max_num = 0
+    pattern = re.compile(rf"^{re.escape(base_name)}_(\d+)\.{re.escape(extension)}$")
+    for f in os.listdir(directory):
+        match = pattern.match(f)
+        if match:
+            max_num = max(max_num, int(match.group(1)))
+    return max_num
+
+
+def _counter_path(directory, base_name, extension):
+    """(目录, base_name, ext) 对应的计数文件路径"""
+    key = f"{os.path.abspath(directory)}\0{base_name}\0{extension}"
+    return os.path.join(COUNTER_DIR, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".counter")
+
+
+def _take_legacy_counter(directory, base_name, extension):
+    """读取并删除旧版本写在输出目录里的隐藏计数文件，没有时返回 None"""
+    legacy_path = os.path.join(directory, f".{base_name}.{extension}.counter")
+    try:
+        with open(legacy_path, "rb") as f:
+            raw = f.read(64).decode("ascii", errors="ignore").strip()
+        os.remove(legacy_path)
+    except OSError:
+        return None
+    return int(raw) if raw.isdigit() else None
+
+
+def allocate_output_path(directory, base_name, extension):
+    """
+    分配下一个可用的输出文件路径，并以空文件占位（写入方直接覆盖即可）。
+    返回 (完整路径, 编号)。
+    """
+    os.makedirs(directory, exist_ok=True)
+    os.makedirs(COUNTER_DIR, exist_ok=True)
+    counter_path = _counter_path(directory, base_name, extension)
+
+    with _thread_lock:
+        fd = os.open(counter_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            lock_file(fd)
+            try:
+                os.lseek(fd, 0, os.SEEK_SET)
+                raw = os.read(fd, 64).decode("ascii", errors="ignore").strip()
+                if raw.isdigit():
+                    last = int(raw)
+                else:
+                    legacy = _take_legacy_counter(directory, base_name, extension)
+                    last = max(legacy or 0, _scan_max_counter(directory, base_name, extension))
+
+                # O_EXCL 占位：文件已被其他方式写入时顺延编号
+                while True:
+                    last += 1
+                    path = os.path.join(directory, f"{base_name}_{last:05d}.{extension}")
+                    try:
+                        os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+                        break
+                    except FileExistsError:
+                        continue
+
+                data = str(last).encode("ascii")
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.write(fd, data.ljust(20))
+            finally:
+                unlock_file(fd)
+        finally:
+            os.close(fd)
+
+    return path, last
@@ -0,0 +1,110 @@
+# ComfyUI-LoLo-Nodes/lolo_prefetch.py
+"""
+目录索引类加载节点的后台预取。
+
+批量工作流中 index 每次 +1，执行第 N 项时在后台线程提前加载 N+1 ~ N+k 项，
+下一次执行直接取走已就绪的结果，使磁盘读取/解码与 GPU 采样重叠。
+预取结果占用的内存受 budget 限制。
+提供 path_fn 时，预取结果附带加载时文件的 (路径, mtime_ns, size)，取用前文件被改写则丢弃重新加载。
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def estimate_result_bytes(value):
+    """粗略估计节点返回值占用的内存（张量按 nbytes，字符串按长度）"""
+    if hasattr(value, "element_size") and hasattr(value, "numel"):
+        return value.element_size() * value.numel()
+    if isinstance(value, (tuple, list)):
+        return sum(estimate_result_bytes(v) for v in value)
+    if isinstance(value, dict):
+        return sum(estimate_result_bytes(v) for v in value.values())
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    return 0
+
+
+class Prefetcher:
+    """
+    单个加载节点的预取器。
+    key 代表除 index 以外的输入（目录、后缀等），key 变化时丢弃旧的预取结果。
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"lolo_prefetch_{name}")
+        self._lock = threading.Lock()
+        self._futures = {}  # (key, index) -> Future，结果为 (文件状态, 返回值)
+
+    def fetch(self, key, index, load_fn, ahead, budget_bytes, path_fn=None):
+        """
+        返回 load_fn(index) 的结果；命中预取时直接取走，否则同步加载。
+        之后按 ahead / budget_bytes 在后台调度后续索引。
+        path_fn(index) 返回该索引对应的文件路径，用于校验预取结果是否仍对应磁盘上的文件。
+        """
+        with self._lock:
+            future = self._futures.pop((key, index), None)
+            self._drop_stale(key, index)
+
+        result = None
+        if future is not None:
+            try:
+                stat, result = future.result()
+                if stat != self._stat(path_fn, index):
+                    # 文件被改写，或目录变化后该索引指向了其它文件
+                    print(f"[{self.name}] 预取结果已过期，重新加载: index {index}")
+                    future = None
+                else:
+                    print(f"[{self.name}] 预取命中: index {index}")
+            except Exception as e:
+                # 后台失败时同步重试，让真实错误在当前执行中抛出
+                print(f"[{self.name}] 预取失败，改为同步加载: {e}")
+                future = None
+        if future is None:
+            result = load_fn(index)
+
+        self._schedule(key, index, load_fn, path_fn, ahead, budget_bytes, estimate_result_bytes(result))
+        return result
+
+    @staticmethod
+    def _stat(path_fn, index):
+        """索引对应文件的 (路径, mtime_ns, size)；未提供 path_fn 或无法确定时返回 None"""
+        if path_fn is None:
+            return None
+        try:
+            path = path_fn(index)
+            st = os.stat(path)
+        except Exception:
+            return None
+        return (path, st.st_mtime_ns, st.st_size)
+
+    def _load(self, load_fn, path_fn, index):
+        """后台任务：先记录文件状态再加载，文件在加载期间被改写时取用前的校验会发现不一致"""
+        stat = self._stat(path_fn, index)
+        return stat, load_fn(index)
+
+    def _drop_stale(self, key, index):
+        """丢弃其他 key 或已经落后于当前 index 的预取任务（需持有锁）"""
+        for entry in list(self._futures):
+            entry_key, entry_index = entry
+            if entry_key != key or entry_index <= index:
+                self._futures.pop(entry).cancel()
+
+    def _schedule(self, key, index, load_fn, path_fn, ahead, budget_bytes, item_bytes):
+        if ahead <= 0:
+            return
+        # 按当前条目大小估算预算内最多可以预取几项
+        if item_bytes > 0:
+            ahead = min(ahead, budget_bytes // item_bytes)
+        with self._lock:
+            for next_index in range(index + 1, index + 1 + ahead):
+                if (key, next_index) not in self._futures:
+                    self._futures[(key, next_index)] = self._executor.submit(self._load, load_fn, path_fn,
+                                                                             next_index)
+
+    def clear(self):
+        with self._lock:
+            for future in self._futures.values():
+                future.cancel()
+            self._futures.clear()
@@ -0,0 +1,304 @@
+# ComfyUI-LoLo-Nodes/lolo_profiler.py
+"""
+LoLo 节点的逐次执行性能记录。
+
+install_profiler 包装所有 LoLo 节点的 FUNCTION（V3 节点为 execute），每次调用记录：
+- 墙钟时间、进程 CPU 时间；
+- 调用前后的当前 RSS，以及调用期间的采样峰值 RSS（后台线程每 LOLO_PROFILE_SAMPLE_MS 毫秒采样一次）；
+- CUDA 已分配显存的前后增量，以及调用期间的峰值相对调用前的增量：
+  默认不重置 PyTorch 的峰值统计，由同一采样线程采样 memory_allocated()，
+  本次调用抬升了进程历史峰值时直接使用 max_memory_allocated()（精确）；
+  设置 LOLO_PROFILE_CUDA_RESET=1 时每次调用前 reset_peak_memory_stats()，得到精确峰值，
+  但会改写其它代码依赖的全局峰值统计；
+- 进程级磁盘读写字节数（包含同一时间段内预取、写出等后台线程的 IO，不只是本节点）。
+存入内存中的环形缓冲区，可导出为 JSON / CSV，也可通过 /lolo/profile 路由查看。
+默认关闭：设置环境变量 LOLO_PROFILE=1，或在 LoLo Profiler Report 节点 / 路由中开启。
+"""
+import os
+import io
+import csv
+import json
+import time
+import functools
+import threading
+from collections import deque
+
+try:
+    import psutil
+    HAS_PSUTIL = True
+except ImportError:
+    HAS_PSUTIL = False
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+# 环形缓冲区保留的记录条数
+PROFILE_HISTORY_SIZE = 4096
+
+# RSS / CUDA 显存采样间隔（毫秒），0 表示不采样
+PROFILE_SAMPLE_MS = int(os.environ.get("LOLO_PROFILE_SAMPLE_MS", "10") or 0)
+# 每次调用前重置 CUDA 峰值统计（精确但影响全局统计，默认关闭）
+PROFILE_CUDA_RESET = os.environ.get("LOLO_PROFILE_CUDA_RESET", "0") not in ("", "0", "false", "False")
+
+FIELDS = ("time", "node", "function", "wall_seconds", "cpu_seconds", "rss_before", "rss_after",
+          "rss_peak", "cuda_allocated_delta", "cuda_peak_delta", "process_read_bytes",
+          "process_write_bytes", "error")
+
+_records = deque(maxlen=PROFILE_HISTORY_SIZE)
+_records_lock = threading.Lock()
+_enabled = os.environ.get("LOLO_PROFILE", "0") not in ("", "0", "false", "False")
+
+
+def set_profiling(enabled):
+    global _enabled
+    _enabled = bool(enabled)
+
+
+def is_profiling():
+    return _enabled
+
+
+def _current_rss():
+    """进程当前 RSS（字节），不可用时返回 None"""
+    if HAS_PSUTIL:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class _PeakSampler(threading.Thread):
+    """
+    调用期间按固定间隔采样当前 RSS 与 CUDA 已分配显存，记录各自的最大值。
+    初始值为 None 的一项不采样；CUDA 按调用线程的当前设备采样。
+    """
+
+    def __init__(self, interval, rss, cuda_device, cuda_allocated):
+        super().__init__(name="LoLoProfilerSampler", daemon=True)
+        self.interval = interval
+        self.rss_peak = rss
+        self.cuda_device = cuda_device
+        self.cuda_peak = cuda_allocated
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            if self.rss_peak is not None:
+                rss = _current_rss()
+                if rss is not None and rss > self.rss_peak:
+                    self.rss_peak = rss
+            if self.cuda_peak is not None:
+                allocated = torch.cuda.memory_allocated(self.cuda_device)
+                if allocated > self.cuda_peak:
+                    self.cuda_peak = allocated
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+def _io_counters():
+    """进程级累计读写字节数（所有线程合计），不可用时返回 None"""
+    if HAS_PSUTIL:
+        try:
+            counters = psutil.Process().io_counters()
+            return counters.read_bytes, counters.write_bytes
+        except (AttributeError, psutil.Error):
+            pass
+    return None
+
+
+def _cuda_available():
+    return torch is not None and torch.cuda.is_available()
+
+
+def _profiled(node_name, function_name, func):
+    """包装节点函数；关闭时只多一次布尔判断"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+
+        rss_before = _current_rss()
+        io_before = _io_counters()
+        cuda = _cuda_available()
+        cuda_device = cuda_before = None
+        if cuda:
+            cuda_device = torch.cuda.current_device()
+            if PROFILE_CUDA_RESET:
+                torch.cuda.reset_peak_memory_stats(cuda_device)
+            cuda_before = torch.cuda.memory_allocated(cuda_device)
+            cuda_peak_before = torch.cuda.max_memory_allocated(cuda_device)
+        sampler = None
+        if PROFILE_SAMPLE_MS > 0 and (rss_before is not None or cuda):
+            sampler = _PeakSampler(PROFILE_SAMPLE_MS / 1000.0, rss_before, cuda_device, cuda_before)
+            sampler.start()
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        error = ""
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            if sampler is not None:
+                sampler.stop()
+            rss_after = _current_rss()
+            rss_peak = None
+            if sampler is not None and rss_before is not None:
+                rss_peak = max(sampler.rss_peak, rss_after)
+            cuda_allocated_delta = cuda_peak_delta = None
+            if cuda:
+                cuda_after = torch.cuda.memory_allocated(cuda_device)
+                cuda_peak_after = torch.cuda.max_memory_allocated(cuda_device)
+                peak = cuda_after if sampler is None else max(cuda_after, sampler.cuda_peak)
+                if PROFILE_CUDA_RESET or cuda_peak_after > cuda_peak_before:
+                    # 峰值统计已重置，或本次调用抬升了历史峰值：max_memory_allocated 即本次调用的精确峰值
+                    peak = max(peak, cuda_peak_after)
+                cuda_allocated_delta = cuda_after - cuda_before
+                cuda_peak_delta = peak - cuda_before
+            io_after = _io_counters()
+            record = (
+                time.time(), node_name, function_name, round(wall, 6), round(cpu, 6),
+                rss_before, rss_after, rss_peak, cuda_allocated_delta, cuda_peak_delta,
+                None if io_before is None else io_after[0] - io_before[0],
+                None if io_before is None else io_after[1] - io_before[1],
+                error,
+            )
+            with _records_lock:
+                _records.append(record)
+
+    wrapper.__lolo_profiled__ = True
+    return wrapper
+
+
+def _wrap_class(node_name, cls):
+    """包装 cls 的执行函数；方法继承自父类时，包装后挂到子类上，不影响父类"""
+    function_name = getattr(cls, "FUNCTION", None) or "execute"
+    inherited = function_name not in cls.__dict__
+    raw = None
+    for klass in cls.__mro__:
+        if function_name in klass.__dict__:
+            raw = klass.__dict__[function_name]
+            break
+    if raw is None:
+        return False
+
+    kind = type(raw) if isinstance(raw, (classmethod, staticmethod)) else None
+    func = raw.__func__ if kind is not None else raw
+    if getattr(func, "__lolo_profiled__", False):
+        if not inherited:
+            return False
+        # 父类已被包装（记录在父类名下），子类使用原函数重新包装
+        func = func.__wrapped__
+    wrapped = _profiled(node_name, function_name, func)
+    setattr(cls, function_name, kind(wrapped) if kind is not None else wrapped)
+    return True
+
+
+def install_profiler(node_class_mappings):
+    """包装节点映射中所有类的执行函数（重复调用不会重复包装）"""
+    count = 0
+    for node_name, cls in node_class_mappings.items():
+        try:
+            if _wrap_class(node_name, cls):
+                count += 1
+        except Exception as e:
+            print(f"[LoLo Profiler] 包装节点 {node_name} 失败: {e}")
+    print(f"[LoLo Profiler] 已挂载 {count} 个节点（{'开启' if _enabled else '关闭'}，LOLO_PROFILE=1 开启）")
+
+
+def get_records(node=None, limit=None):
+    """返回记录字典列表（从旧到新），可按节点名过滤、只取最近 limit 条"""
+    with _records_lock:
+        rows = list(_records)
+    if node:
+        rows = [r for r in rows if r[1] == node]
+    if limit:
+        rows = rows[-limit:]
+    return [dict(zip(FIELDS, r)) for r in rows]
+
+
+def clear_records():
+    with _records_lock:
+        _records.clear()
+
+
+def summarize(records=None):
+    """
+    按节点汇总：调用次数、总 / 最大墙钟时间、总 CPU 时间、
+    最大 RSS 增量（调用后 - 调用前）、最大采样峰值增量（峰值 - 调用前）、最大 CUDA 峰值增量，按总耗时降序
+    """
+    records = get_records() if records is None else records
+    summary = {}
+    for r in records:
+        s = summary.setdefault(r["node"], {"node": r["node"], "calls": 0, "errors": 0, "wall_total": 0.0,
+                                           "wall_max": 0.0, "cpu_total": 0.0, "rss_delta_max": 0,
+                                           "rss_peak_delta_max": 0, "cuda_peak_delta_max": 0})
+        s["calls"] += 1
+        s["errors"] += 1 if r["error"] else 0
+        s["wall_total"] += r["wall_seconds"]
+        s["wall_max"] = max(s["wall_max"], r["wall_seconds"])
+        s["cpu_total"] += r["cpu_seconds"]
+        if r["rss_before"] is not None:
+            s["rss_delta_max"] = max(s["rss_delta_max"], r["rss_after"] - r["rss_before"])
+            if r["rss_peak"] is not None:
+                s["rss_peak_delta_max"] = max(s["rss_peak_delta_max"], r["rss_peak"] - r["rss_before"])
+        s["cuda_peak_delta_max"] = max(s["cuda_peak_delta_max"], r["cuda_peak_delta"] or 0)
+    return sorted(summary.values(), key=lambda s: s["wall_total"], reverse=True)
+
+
+def export_json(records=None):
+    records = get_records() if records is None else records
+    return json.dumps({"records": records, "summary": summarize(records)}, ensure_ascii=False)
+
+
+def export_csv(records=None):
+    records = get_records() if records is None else records
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=FIELDS)
+    writer.writeheader()
+    writer.writerows(records)
+    return buffer.getvalue()
+
+
+def register_routes():
+    """注册 /lolo/profile 路由（ComfyUI 服务端不可用时跳过）"""
+    try:
+        from aiohttp import web
+        from server import PromptServer
+    except ImportError:
+        return
+
+    routes = PromptServer.instance.routes
+
+    @routes.get("/lolo/profile")
+    async def lolo_profile(request):
+        node = request.query.get("node")
+        try:
+            limit = int(request.query.get("limit") or 0)
+        except ValueError:
+            limit = -1
+        if limit < 0:
+            return web.Response(status=400, text="limit must be a non-negative integer")
+        records = get_records(node, limit or None)
+        if request.query.get("format") == "csv":
+            return web.Response(text=export_csv(records), content_type="text/csv")
+        return web.Response(text=export_json(records), content_type="application/json")
+
+    @routes.post("/lolo/profile/clear")
+    async def lolo_profile_clear(request):
+        clear_records()
+        return web.json_response({"cleared": True})
+
+    @routes.post("/lolo/profile/enable")
+    async def lolo_profile_enable(request):
+        set_profiling(request.query.get("on", "1") not in ("0", "false"))
+        return web.json_response({"enabled": is_profiling()})
@@ -1,9 +1,159 @@
 import os
-import glob
-import zipfile
 import time
+import uuid
+import hashlib
+import asyncio
+import threading
+import concurrent.futures
 import urllib.parse
+from collections import OrderedDict
+from aiohttp import web
 from server import PromptServer
+from .lolo_dir_index import get_dir_index
+from .lolo_zip_stream import write_zip, append_zip
+from .lolo_zip_manifest import manifest_path_for, load_manifest, save_manifest, diff_files
+
+# 进度消息的最小发送间隔（秒）
+PROGRESS_INTERVAL = 0.25
+# 流式下载任务最多保留的个数
+MAX_STREAM_JOBS = 32
+# 流式下载时每次写给客户端的数据块大小
+STREAM_CHUNK_BYTES = 256 << 10
+# 生成线程向队列投递数据时等待事件循环响应的最长时间（秒）
+STREAM_PUT_TIMEOUT = 30.0
+# 队列已满时的重试间隔（秒）
+STREAM_POLL_SECONDS = 0.05
+
+# token -> {"files", "compression", "workers", "node_id", "name"}
+_stream_jobs = OrderedDict()
+_stream_jobs_lock = threading.Lock()
+
+
+def _send_progress(node_id, done, total, bytes_written):
+    try:
+        PromptServer.instance.send_sync("lolo.zip_progress", {
+            "node_id": node_id,
+            "done": done,
+            "total": total,
+            "size_mb": round(bytes_written / (1024 * 1024), 2),
+        })
+    except Exception as e:
+        print(f"[LoLo Nodes] 后端警告: 发送压缩进度失败: {e}")
+
+
+def _make_progress(node_id):
+    """返回按时间节流的进度回调"""
+    last = [0.0]
+
+    def progress(done, total, bytes_written):
+        now = time.monotonic()
+        if done == total or now - last[0] >= PROGRESS_INTERVAL:
+            last[0] = now
+            _send_progress(node_id, done, total, bytes_written)
+    return progress
+
+
+class _StreamCancelled(Exception):
+    """客户端断开，停止生成流式 ZIP"""
+
+
+async def _try_put(queue, item):
+    try:
+        queue.put_nowait(item)
+        return True
+    except asyncio.QueueFull:
+        return False
+
+
+class _QueueWriter:
+    """把 ZIP 数据攒成块后交给事件循环中的队列（在线程中调用，队列满时等待实现背压，取消后抛出 _StreamCancelled）"""
+
+    def __init__(self, loop, queue, cancelled):
+        self.loop = loop
+        self.queue = queue
+        self.cancelled = cancelled
+        self.buffer = bytearray()
+
+    def write(self, data):
+        if self.cancelled.is_set():
+            raise _StreamCancelled()
+        self.buffer += data
+        if len(self.buffer) >= STREAM_CHUNK_BYTES:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            chunk = bytes(self.buffer)
+            self.buffer.clear()
+            self.put(chunk)
+
+    def put(self, item):
+        while True:
+            if self.cancelled.is_set():
+                raise _StreamCancelled()
+            future = asyncio.run_coroutine_threadsafe(_try_put(self.queue, item), self.loop)
+            try:
+                if future.result(timeout=STREAM_PUT_TIMEOUT):
+                    return
+            except concurrent.futures.TimeoutError:
+                # 事件循环长时间无响应，视为连接已失效
+                future.cancel()
+                self.cancelled.set()
+                raise _StreamCancelled()
+            # 队列已满：等待消费者取走数据（或被取消）
+            self.cancelled.wait(STREAM_POLL_SECONDS)
+
+
+@PromptServer.instance.routes.get("/lolo/zip_stream/{token}")
+async def lolo_zip_stream(request):
+    """边压缩边下载，不在 output/zip 下生成归档文件"""
+    with _stream_jobs_lock:
+        job = _stream_jobs.get(request.match_info["token"])
+    if job is None:
+        return web.Response(status=404, text="zip stream not found")
+
+    response = web.StreamResponse(headers={
+        "Content-Type": "application/zip",
+        "Content-Disposition": f"attachment; filename=\"{job['name']}\"",
+    })
+    await response.prepare(request)
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=8)
+    cancelled = threading.Event()
+
+    def build():
+        writer = _QueueWriter(loop, queue, cancelled)
+        try:
+            write_zip(writer, job["files"], job["compression"], job["workers"], _make_progress(job["node_id"]))
+            writer.flush()
+        except _StreamCancelled:
+            print(f"[LoLo Nodes] 客户端已断开，停止生成 {job['name']}")
+        finally:
+            try:
+                writer.put(None)
+            except _StreamCancelled:
+                pass
+
+    task = loop.run_in_executor(None, build)
+    try:
+        while True:
+            chunk = await queue.get()
+            if chunk is None:
+                break
+            await response.write(chunk)
+    finally:
+        # 无论正常结束还是客户端断开，都让生成线程退出并清空队列
+        if not task.done():
+            cancelled.set()
+        while not queue.empty():
+            queue.get_nowait()
+        try:
+            await task
+        except Exception as e:
+            print(f"[LoLo Nodes] 后端错误: 流式压缩出错: {e}")
+    await response.write_eof()
+    return response
 
 class LoloSaveDirToZip:
     """
@@ -37,6 +187,25 @@ class LoloSaveDirToZip:
             },
             "optional": {
                 "any_input": ("*", {}),
+                "compression": (["auto", "deflate", "store"], {
+                    "default": "auto",
+                    "tooltip": "auto：jpg/png/mp4 等已压缩格式直接存储，其余 deflate",
+                }),
+                "workers": ("INT", {
+                    "default": 0,
+                    "min": 0,
+                    "max": 64,
+                    "step": 1,
+                    "tooltip": "并行压缩线程数，0 表示 CPU 核数",
+                }),
+                "delivery": (["file", "stream"], {
+                    "default": "file",
+                    "tooltip": "file：生成到 output/zip；stream：下载时边压缩边传输，不落盘",
+                }),
+                "mode": (["full", "incremental", "delta"], {
+                    "default": "full",
+                    "tooltip": "full：每次生成新的完整压缩包；incremental：只把新增/修改的文件追加到该目录固定的压缩包；delta：只把新增/修改的文件打成单独的增量包",
+                }),
             },
             # ========== 核心修改：通过 hidden 字段获取系统生成的唯一节点ID ==========
             "hidden": {
@@ -50,7 +219,8 @@ class LoloSaveDirToZip:
     RETURN_NAMES = ("file_path", "file_size")
     FUNCTION = "save_to_zip"
 
-    def save_to_zip(self, dir, seed, suffix=".txt|.jpg|.png", limit=-1, any_input=None, unique_id=None):
+    def save_to_zip(self, dir, seed, suffix=".txt|.jpg|.png", limit=-1, any_input=None, unique_id=None,
+                    compression="auto", workers=0, delivery="file", mode="full"):
         """
         核心处理函数：筛选、压缩文件，并使用 unique_id 通知前端。
         """
@@ -68,30 +238,87 @@ class LoloSaveDirToZip:
 
         # 2. 查找匹配文件
         suffix_list = [s.strip() for s in suffix.split("|") if s.strip()] or [".txt", ".jpg", ".png"]
-        matched_files = set()
-        for pattern in suffix_list:
-            matched_files.update(glob.glob(os.path.join(dir, f"*{pattern}")))
-
-        matched_files = sorted(matched_files)
+        # 共享目录索引（已排序；与 glob 一致：区分大小写、忽略隐藏文件）
+        dir_index = get_dir_index(dir, suffix_list, case_sensitive=True, include_hidden=False)
         if limit_int > 0:
-            matched_files = matched_files[:limit_int]
+            matched_files = dir_index.paths(0, limit_int)
+        else:
+            matched_files = dir_index.paths()
 
         if not matched_files:
             print(f"[LoLo Nodes] 后端错误: 在目录 {dir} 中未找到后缀为 {suffix} 的文件")
             return ("", 0.0)
 
+        timestamp = str(int(time.time()))
+        zip_filename = f"{timestamp}.zip"
+
+        if mode != "full" and delivery == "stream":
+            print(f"[LoLo Nodes] 后端警告: {mode} 模式需要维护清单，忽略 stream，改为生成文件")
+            delivery = "file"
+
+        # 流式下载：只登记任务，压缩在客户端请求下载时进行
+        if delivery == "stream":
+            token = uuid.uuid4().hex
+            with _stream_jobs_lock:
+                _stream_jobs[token] = {"files": matched_files, "compression": compression, "workers": workers,
+                                       "node_id": unique_id, "name": zip_filename}
+                while len(_stream_jobs) > MAX_STREAM_JOBS:
+                    _stream_jobs.popitem(last=False)
+            web_path = f"/lolo/zip_stream/{token}"
+            try:
+                PromptServer.instance.send_sync("lolo.zip_ready", {
+                    "file_path": web_path,
+                    "file_size_mb": 0.0,
+                    "node_id": unique_id,
+                    "file_count": len(matched_files),
+                })
+                print(f"[LoLo Nodes] 后端成功: 已登记 {len(matched_files)} 个文件的流式下载。节点ID: {unique_id}")
+            except Exception as e:
+                print(f"[LoLo Nodes] 后端警告: 发送消息到前端时出错: {e}")
+            return (web_path, 0.0)
+
         # 3. 准备输出
         output_dir = os.path.join(".", "output", "zip")
         os.makedirs(output_dir, exist_ok=True)
-        timestamp = str(int(time.time()))
-        zip_filename = f"{timestamp}.zip"
         zip_path = os.path.join(output_dir, zip_filename)
 
-        # 4. 创建ZIP文件
+        # 4. 创建ZIP文件（按扩展名选择存储/deflate，多线程压缩，推送进度）
         try:
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for file_path in matched_files:
-                    zipf.write(file_path, os.path.basename(file_path))
+            if mode == "full":
+                with open(zip_path, 'wb') as f:
+                    write_zip(f, matched_files, compression, workers, _make_progress(unique_id))
+            else:
+                # 同一 (目录, 后缀) 使用固定的归档名与清单
+                source_key = hashlib.sha1(f"{os.path.abspath(dir)}|{suffix}".encode("utf-8")).hexdigest()[:8]
+                archive_base = f"{os.path.basename(os.path.abspath(dir)) or 'dir'}_{source_key}"
+                archive_path = os.path.join(output_dir, f"{archive_base}.zip")
+                manifest_path = manifest_path_for(archive_path if mode == "incremental" else os.path.join(output_dir, f"{archive_base}_delta.zip"))
+                manifest = load_manifest(manifest_path, archive_path if mode == "incremental" else None)
+                changed_files, records = diff_files(matched_files, manifest, workers)
+                print(f"[LoLo Nodes] {mode} 模式: {len(matched_files)} 个文件中 {len(changed_files)} 个新增或修改")
+
+                if mode == "incremental":
+                    zip_path = archive_path
+                    if not manifest["files"] or not os.path.exists(zip_path):
+                        # 首次导出或清单失效：全量生成
+                        changed_files = matched_files
+                        with open(zip_path, 'wb') as f:
+                            write_zip(f, changed_files, compression, workers, _make_progress(unique_id))
+                    elif changed_files:
+                        append_zip(zip_path, changed_files, compression, workers, _make_progress(unique_id))
+                else:
+                    if not changed_files:
+                        print(f"[LoLo Nodes] 后端提示: 目录 {dir} 自上次导出后没有新增或修改的文件")
+                        return ("", 0.0)
+                    zip_path = os.path.join(output_dir, f"{archive_base}_delta_{timestamp}.zip")
+                    with open(zip_path, 'wb') as f:
+                        write_zip(f, changed_files, compression, workers, _make_progress(unique_id))
+
+                # 写入成功后再更新清单
+                manifest["files"].update(records)
+                manifest["archive_size"] = os.path.getsize(archive_path) if mode == "incremental" else 0
+                save_manifest(manifest_path, manifest)
+                matched_files = changed_files
 
             # 5. 计算文件信息
             file_size_bytes = os.path.getsize(zip_path)
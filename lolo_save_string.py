@@ -1,6 +1,8 @@
 # ComfyUI-LoLo-Nodes/lolo_save_string.py
 import os
+import time
 import comfy
+from .lolo_string_writer import get_string_writer
 
 class LoloSaveString2File:
     """
@@ -42,6 +44,14 @@ class LoloSaveString2File:
                     "default": "---",
                     "multiline": False
                 }),
+                "buffered": ("BOOLEAN", {
+                    "default": False,
+                    "tooltip": "all_in_one 模式下缓冲追加内容，按大小/时间阈值批量写入（进程退出时自动写入）"
+                }),
+                "record_format": (["text", "jsonl"], {
+                    "default": "text",
+                    "tooltip": "all_in_one 模式的记录格式；jsonl 会额外生成 .idx 偏移索引用于随机读取"
+                }),
             }
         }
 
@@ -50,7 +60,8 @@ class LoloSaveString2File:
     RETURN_NAMES = ("init_str", "file_full_path")
     FUNCTION = "save_string"
 
-    def save_string(self, str, filename, path, mode="everyone", ext="txt", separator="---"):
+    def save_string(self, str, filename, path, mode="everyone", ext="txt", separator="---",
+                    buffered=False, record_format="text"):
         """
         核心业务逻辑：根据模式处理字符串并保存到文件。
         
@@ -61,11 +72,15 @@ class LoloSaveString2File:
             mode: 保存模式，"all_in_one"或"everyone"。
             ext: 文件后缀，默认为'txt'。
             separator: 在all_in_one模式中使用的分隔符。
+            buffered: all_in_one模式下是否缓冲批量写入。
+            record_format: all_in_one模式的记录格式，"text"或"jsonl"。
             
         返回:
             tuple: (原始字符串, 生成的完整文件路径)
         """
         # 1. 处理文件路径：拼接路径、文件名和后缀
+        if mode == "all_in_one" and record_format == "jsonl" and ext in ("", "txt", ".txt"):
+            ext = '.jsonl'
         if ext and not ext.startswith('.'):
             ext = '.' + ext
         elif not ext:
@@ -78,13 +93,17 @@ class LoloSaveString2File:
         os.makedirs(os.path.dirname(file_full_path), exist_ok=True)
         
         # 3. 根据mode标志执行不同的文件操作
+        writer = get_string_writer()
         try:
-            if mode == "all_in_one" and os.path.exists(file_full_path):
-                # all_in_one模式：追加内容，使用指定的分隔符
-                with open(file_full_path, 'a', encoding='utf-8') as f:
-                    f.write(f"\n{separator}\n{str}")
+            if mode == "all_in_one":
+                # all_in_one模式：通过写入服务追加（句柄常驻、文件加锁），文件已有内容时使用指定的分隔符
+                if record_format == "jsonl":
+                    writer.append_jsonl(file_full_path, {"time": time.time(), "text": str}, buffered)
+                else:
+                    writer.append_text(file_full_path, str, separator, buffered)
             else:
-                # everyone模式：总是创建新文件（覆盖旧文件）
+                # everyone模式：总是创建新文件（覆盖旧文件），先写出该文件尚未写入的追加内容
+                writer.close(file_full_path)
                 with open(file_full_path, 'w', encoding='utf-8') as f:
                     f.write(str)
                     
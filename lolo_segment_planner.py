@@ -0,0 +1,227 @@
+# ComfyUI-LoLo-Nodes/lolo_segment_planner.py
+"""
+整首歌的分段计划。
+
+一次性解析 shorts JSON，算出每一段（以及超长段拆出的续接块）的：
+帧数（满足 latent 的 4n+1 约束）、WanInfiniteTalkToVideoEx 的 audio_offset、
+音频窗口（秒 / 采样点）、首尾需要裁掉的帧数、输出文件名。
+其它节点按 index 从计划中取值，不再逐段解析 JSON 和重复计算。
+"""
+import json
+from collections import namedtuple
+from .JSONShortsMVParser import get_schedule
+
+# 计划中的一行（一次生成）
+PlanEntry = namedtuple("PlanEntry", (
+    "segment_index",       # 在 JSON 数组中的原始索引
+    "chunk_index",         # 超长段拆分后的块序号，0 为首块
+    "is_lip_sync",
+    "start_time",          # 片段在整首歌中的起始时间（秒）
+    "duration",            # 片段时长（秒）
+    "first_frame_prompt",
+    "video_prompt",
+    "length",              # 本次生成的帧数（4n+1）
+    "audio_offset",        # 本次生成对应的音频起始帧（整首歌的帧索引）
+    "trim_head",           # 生成结果开头需要裁掉的帧数（续接块的 motion frames）
+    "trim_tail",           # 为满足 4n+1 多生成、结尾需要裁掉的帧数
+    "audio_start",         # 音频窗口起点（秒）
+    "audio_duration",      # 音频窗口时长（秒），覆盖 length 帧
+    "audio_start_sample",  # 音频窗口起点（采样点，提供 audio 时有效，否则为 -1）
+    "output_name",         # 输出文件名（不含扩展名），按时间线顺序编号
+))
+
+SEGMENT_PLAN_TYPE = "LOLO_SEGMENT_PLAN"
+
+
+def round_up_4n1(frames):
+    """向上取整到 4n+1"""
+    frames = max(int(frames), 1)
+    return ((frames - 1 + 3) // 4) * 4 + 1
+
+
+def round_down_4n1(frames):
+    """向下取整到 4n+1"""
+    frames = max(int(frames), 1)
+    return ((frames - 1) // 4) * 4 + 1
+
+
+def plan_segments(schedule, fps=25, motion_frame_count=9, max_length=0, name_prefix="segment",
+                  sample_rate=0, order="timeline"):
+    """
+    根据 ShortsSchedule 生成计划，返回 PlanEntry 列表。
+    max_length > 0 时，超过该帧数的片段拆成多块：后续块以上一块最后 motion_frame_count 帧为运动上下文，
+    音频窗口相应回退 motion_frame_count 帧，生成后裁掉开头这些帧。
+    order 为 by_length 时，按片段最长块的帧数从大到小排列（同一片段的块保持连续、顺序不变），
+    使相同尺寸的生成排在一起；输出文件名仍按时间线编号，合并时顺序不变。
+    """
+    if max_length > 0:
+        max_length = round_down_4n1(max_length)
+        if max_length <= motion_frame_count:
+            raise ValueError(f"max_length ({max_length}) 必须大于 motion_frame_count ({motion_frame_count})。")
+
+    chains = []
+    output_number = 0
+    for segment_index in range(len(schedule)):
+        is_lip_sync, start_time, duration, first_frame_prompt, video_prompt = schedule.row(segment_index)
+
+        start_frame = int(round(start_time * fps))
+        total_frames = max(int(round(duration * fps)), 1)
+
+        chain = []
+        covered = 0
+        chunk_index = 0
+        while covered < total_frames:
+            remaining = total_frames - covered
+            if chunk_index == 0:
+                trim_head = 0
+                needed = remaining
+            else:
+                trim_head = motion_frame_count
+                needed = remaining + motion_frame_count
+            length = round_up_4n1(needed)
+            if max_length > 0 and length > max_length:
+                length = max_length
+            new_frames = min(length - trim_head, remaining)
+            trim_tail = length - trim_head - new_frames
+
+            audio_offset = start_frame + covered - trim_head
+            audio_start = audio_offset / fps
+            chain.append(PlanEntry(
+                segment_index=segment_index,
+                chunk_index=chunk_index,
+                is_lip_sync=is_lip_sync,
+                start_time=start_time,
+                duration=duration,
+                first_frame_prompt=first_frame_prompt,
+                video_prompt=video_prompt,
+                length=length,
+                audio_offset=audio_offset,
+                trim_head=trim_head,
+                trim_tail=trim_tail,
+                audio_start=audio_start,
+                audio_duration=length / fps,
+                audio_start_sample=int(round(audio_start * sample_rate)) if sample_rate > 0 else -1,
+                output_name=f"{name_prefix}_{output_number:05d}",
+            ))
+            output_number += 1
+            covered += new_frames
+            chunk_index += 1
+        chains.append(chain)
+
+    if order == "by_length":
+        chains.sort(key=lambda chain: max(entry.length for entry in chain), reverse=True)
+    return [entry for chain in chains for entry in chain]
+
+
+class LoloSegmentPlanner:
+    """
+    整首歌的分段规划：一次性算出每次生成的帧数、音频窗口、裁剪帧数和输出名。
+    输出的 plan 供 LoloSegmentPlanByIndex 按索引读取。
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "json_str": ("STRING", {
+                    "multiline": True,
+                    "default": "[]",
+                    "tooltip": "shorts JSON 数组字符串（与 JSON Shorts MV By Index 相同）"
+                }),
+                "fps": ("INT", {
+                    "default": 25,
+                    "min": 1,
+                    "max": 120,
+                    "step": 1,
+                    "tooltip": "生成帧率（InfiniteTalk 音频特征为 25fps）"
+                }),
+                "motion_frame_count": ("INT", {
+                    "default": 9,
+                    "min": 1,
+                    "max": 33,
+                    "step": 1,
+                    "tooltip": "续接块使用的前置帧数，与 WanInfiniteTalkToVideoEx 保持一致"
+                }),
+                "max_length": ("INT", {
+                    "default": 0,
+                    "min": 0,
+                    "max": 1025,
+                    "step": 4,
+                    "tooltip": "单次生成的最大帧数（取整到 4n+1），超过则拆成续接块；0 表示不拆分"
+                }),
+                "name_prefix": ("STRING", {
+                    "default": "segment",
+                    "tooltip": "输出文件名前缀，文件名为 {前缀}_{5位编号}"
+                }),
+                "order": (["timeline", "by_length"], {
+                    "default": "timeline",
+                    "tooltip": "by_length：按生成帧数从大到小排列，相同尺寸的生成排在一起"
+                }),
+            },
+            "optional": {
+                "audio": ("AUDIO", {"tooltip": "整首歌音频，用于计算采样点偏移并检查片段是否超出音频"}),
+            }
+        }
+
+    RETURN_TYPES = (SEGMENT_PLAN_TYPE, "STRING", "INT")
+    RETURN_NAMES = ("plan", "plan_json", "count")
+    FUNCTION = "plan"
+    CATEGORY = "utils/parser"
+
+    def plan(self, json_str, fps=25, motion_frame_count=9, max_length=0, name_prefix="segment",
+             order="timeline", audio=None):
+        schedule = get_schedule(json_str)
+
+        sample_rate = 0
+        audio_seconds = None
+        if audio is not None:
+            sample_rate = int(audio["sample_rate"])
+            audio_seconds = audio["waveform"].shape[-1] / sample_rate
+
+        entries = plan_segments(schedule, fps, motion_frame_count, max_length, name_prefix, sample_rate, order)
+
+        if audio_seconds is not None:
+            for entry in entries:
+                if entry.audio_start + entry.audio_duration > audio_seconds + 1.0 / fps:
+                    print(f"[LoloSegmentPlanner] 警告: 片段 {entry.segment_index} 块 {entry.chunk_index} 的音频窗口 "
+                          f"{entry.audio_start:.2f}s+{entry.audio_duration:.2f}s 超出音频长度 {audio_seconds:.2f}s")
+
+        plan_json = json.dumps([entry._asdict() for entry in entries], ensure_ascii=False)
+        print(f"[LoloSegmentPlanner] {len(schedule)} 个片段 -> {len(entries)} 次生成，"
+              f"共 {sum(e.length for e in entries)} 帧")
+        return (entries, plan_json, len(entries))
+
+
+class LoloSegmentPlanByIndex:
+    """从分段计划中按索引取出一次生成所需的全部参数"""
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "plan": (SEGMENT_PLAN_TYPE,),
+                "index": ("INT", {
+                    "default": 0,
+                    "min": 0,
+                    "max": 99999,
+                    "step": 1,
+                    "tooltip": "计划中的索引（从0开始）"
+                }),
+            }
+        }
+
+    RETURN_TYPES = ("BOOLEAN", "FLOAT", "FLOAT", "STRING", "STRING",
+                    "INT", "INT", "INT", "INT", "FLOAT", "FLOAT", "STRING", "INT", "BOOLEAN")
+    RETURN_NAMES = ("is_lip_sync", "start_time", "duration", "first_frame_prompt", "video_prompt",
+                    "length", "audio_offset", "trim_head", "trim_tail", "audio_start", "audio_duration",
+                    "output_name", "segment_index", "is_continuation")
+    FUNCTION = "get_entry"
+    CATEGORY = "utils/parser"
+
+    def get_entry(self, plan, index):
+        if index < 0 or index >= len(plan):
+            raise ValueError(f"索引 {index} 超出范围（计划长度 {len(plan)}）。")
+        e = plan[index]
+        return (e.is_lip_sync, e.start_time, e.duration, e.first_frame_prompt, e.video_prompt,
+                e.length, e.audio_offset, e.trim_head, e.trim_tail, e.audio_start, e.audio_duration,
+                e.output_name, e.segment_index, e.chunk_index > 0)
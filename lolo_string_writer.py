@@ -0,0 +1,230 @@
+# ComfyUI-LoLo-Nodes/lolo_string_writer.py
+"""
+all_in_one 模式的追加写入服务。
+
+- 每个目标文件保持一个打开的句柄，避免每条记录 open/close（NFS 上每次都是一次往返）；
+- 可选缓冲：按大小 / 时间阈值批量刷新，进程退出时全部刷新；
+- 刷新时对文件加锁（跨进程），每条记录整体写入，多个队列 worker 不会交错出半条记录；
+- 刷新前检查路径是否仍指向打开的文件，被删除 / 轮转后重新打开，不写入已脱离目录的旧文件；
+- 可选 JSONL 格式，并在 {文件}.idx 中记录每条记录的起始偏移，便于之后随机读取。
+"""
+import os
+import json
+import time
+import atexit
+import struct
+import threading
+from .lolo_output_counter import lock_file, unlock_file
+
+# 缓冲数据达到该字节数时立即刷新
+FLUSH_BYTES = 64 << 10
+# 缓冲数据最长停留时间（秒）
+FLUSH_INTERVAL = 1.0
+# 句柄空闲超过该时间（秒）后关闭
+IDLE_CLOSE_SECONDS = 30.0
+
+_OFFSET_FORMAT = "<Q"
+_OFFSET_SIZE = struct.calcsize(_OFFSET_FORMAT)
+
+
+class _PathWriter:
+    """单个目标文件的句柄与待写缓冲"""
+
+    def __init__(self, path, with_index):
+        self.path = path
+        self.existed = os.path.exists(path)
+        self.fd = _open_append(path)
+        self.index_fd = None
+        if with_index:
+            self.index_fd = _open_append(f"{path}.idx")
+        self.pending = []  # [("text", 正文, 分隔符) | ("jsonl", 行字节)]
+        self.pending_bytes = 0
+        self.first_pending_time = None
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _reopen_if_replaced(self):
+        """句柄打开期间目标文件被删除或替换（日志轮转）时重新打开"""
+        if not _is_open_file(self.path, self.fd):
+            print(f"[LoLo Nodes] 文件已被删除或替换，重新打开: {self.path}")
+            os.close(self.fd)
+            self.existed = os.path.exists(self.path)
+            self.fd = _open_append(self.path)
+            if self.index_fd is not None and os.fstat(self.fd).st_size == 0:
+                # 新的空文件：旧索引中的偏移已不对应，一并清空
+                os.close(self.index_fd)
+                self.index_fd = os.open(f"{self.path}.idx", os.O_WRONLY | os.O_APPEND | os.O_CREAT | os.O_TRUNC, 0o644)
+        if self.index_fd is not None and not _is_open_file(f"{self.path}.idx", self.index_fd):
+            os.close(self.index_fd)
+            self.index_fd = _open_append(f"{self.path}.idx")
+
+    def flush(self):
+        """把缓冲的记录整体写入文件（调用方持有 self.lock）"""
+        if not self.pending:
+            return
+        self._reopen_if_replaced()
+        lock_file(self.fd)
+        try:
+            for record in self.pending:
+                if record[0] == "text":
+                    _, text, separator = record
+                    # 与原 all_in_one 行为一致：文件已有内容时先写分隔符
+                    if self.existed or os.fstat(self.fd).st_size > 0:
+                        text = f"\n{separator}\n{text}"
+                    if os.linesep != "\n":
+                        # 与文本模式写入一致（Windows 下换行为 \r\n）
+                        text = text.replace("\n", os.linesep)
+                    _write_all(self.fd, text.encode("utf-8"))
+                else:
+                    offset = os.fstat(self.fd).st_size
+                    _write_all(self.fd, record[1])
+                    if self.index_fd is not None:
+                        _write_all(self.index_fd, struct.pack(_OFFSET_FORMAT, offset))
+                self.existed = True
+        finally:
+            unlock_file(self.fd)
+        self.pending.clear()
+        self.pending_bytes = 0
+        self.first_pending_time = None
+
+    def close(self):
+        """刷新并关闭句柄；刷新失败时句柄仍会关闭，异常继续抛出"""
+        try:
+            self.flush()
+        finally:
+            os.close(self.fd)
+            if self.index_fd is not None:
+                os.close(self.index_fd)
+
+
+def _open_append(path):
+    return os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+
+def _is_open_file(path, fd):
+    """path 当前指向的文件是否就是 fd 打开的文件（按设备号 + inode 比较）"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return False
+    fst = os.fstat(fd)
+    return (st.st_dev, st.st_ino) == (fst.st_dev, fst.st_ino)
+
+
+def _write_all(fd, data):
+    view = memoryview(data)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+
+class StringWriterService:
+    """按路径管理 _PathWriter，后台线程负责定时刷新和关闭空闲句柄"""
+
+    def __init__(self):
+        self._writers = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _get_writer(self, path, with_index=False):
+        path = os.path.abspath(path)
+        with self._lock:
+            writer = self._writers.get(path)
+            if writer is None or (with_index and writer.index_fd is None):
+                if writer is not None:
+                    with writer.lock:
+                        writer.close()
+                writer = _PathWriter(path, with_index)
+                self._writers[path] = writer
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="lolo_string_writer", daemon=True)
+                self._thread.start()
+            return writer
+
+    def _append(self, writer, record, size, buffered):
+        with writer.lock:
+            writer.pending.append(record)
+            writer.pending_bytes += size
+            writer.last_used = time.monotonic()
+            if writer.first_pending_time is None:
+                writer.first_pending_time = writer.last_used
+            if not buffered or writer.pending_bytes >= FLUSH_BYTES:
+                writer.flush()
+
+    def append_text(self, path, text, separator, buffered=False):
+        """追加一条文本记录（文件已有内容时以分隔符隔开）"""
+        writer = self._get_writer(path)
+        self._append(writer, ("text", text, separator), len(text), buffered)
+
+    def append_jsonl(self, path, record, buffered=False):
+        """追加一条 JSONL 记录，并在 {path}.idx 中记录其起始偏移"""
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        writer = self._get_writer(path, with_index=True)
+        self._append(writer, ("jsonl", line), len(line), buffered)
+
+    def close(self, path=None):
+        """刷新并关闭某个文件（或全部）的句柄，例如即将覆盖写该文件时"""
+        with self._lock:
+            if path is None:
+                writers = list(self._writers.values())
+                self._writers.clear()
+            else:
+                writer = self._writers.pop(os.path.abspath(path), None)
+                writers = [writer] if writer is not None else []
+        for writer in writers:
+            with writer.lock:
+                try:
+                    writer.close()
+                except Exception as e:
+                    print(f"[LoLo Nodes] 关闭写入句柄失败 ({writer.path}): {e}")
+
+    def shutdown(self):
+        self._stop.set()
+        self.close()
+
+    def _run(self):
+        while not self._stop.wait(FLUSH_INTERVAL / 2):
+            now = time.monotonic()
+            with self._lock:
+                writers = list(self._writers.items())
+            for path, writer in writers:
+                with writer.lock:
+                    try:
+                        if writer.first_pending_time is not None and now - writer.first_pending_time >= FLUSH_INTERVAL:
+                            writer.flush()
+                    except Exception as e:
+                        print(f"[LoLo Nodes] 定时刷新失败 ({path}): {e}")
+                if now - writer.last_used >= IDLE_CLOSE_SECONDS:
+                    with self._lock:
+                        if self._writers.get(path) is writer:
+                            del self._writers[path]
+                        else:
+                            continue
+                    with writer.lock:
+                        try:
+                            writer.close()
+                        except Exception as e:
+                            print(f"[LoLo Nodes] 关闭空闲句柄失败 ({path}): {e}")
+
+
+_service = StringWriterService()
+atexit.register(_service.shutdown)
+
+
+def get_string_writer():
+    return _service
+
+
+def read_jsonl_record(path, index):
+    """根据 {path}.idx 偏移索引随机读取第 index 条 JSONL 记录"""
+    get_string_writer().close(path)
+    with open(f"{path}.idx", "rb") as idx:
+        idx.seek(index * _OFFSET_SIZE)
+        raw = idx.read(_OFFSET_SIZE)
+    if len(raw) != _OFFSET_SIZE:
+        raise IndexError(f"记录索引 {index} 超出范围: {path}")
+    (offset,) = struct.unpack(_OFFSET_FORMAT, raw)
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return json.loads(f.readline().decode("utf-8"))
@@ -2,10 +2,54 @@ import os
 import subprocess
 import tempfile
 import re
-import numpy as np
+import time
+import shutil
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 import torch
 import folder_paths
-from .lolo_ffmpeg_utils import get_ffmpeg_path
+from .lolo_ffmpeg_utils import get_ffmpeg_path, audio_to_f32le
+from .lolo_media_info import get_media_info
+from .lolo_dir_index import get_dir_index
+from .lolo_output_counter import allocate_output_path
+
+# 参与合并的视频扩展名
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+
+# 音频 PCM 写入 ffmpeg stdin 时的分块大小
+AUDIO_PIPE_CHUNK_BYTES = 1 << 20
+
+# 片段规整时，基准视频编码对应的 ffmpeg 编码器
+CODEC_ENCODERS = {
+    "h264": "libx264",
+    "hevc": "libx265",
+    "vp8": "libvpx",
+    "vp9": "libvpx-vp9",
+}
+
+# ffprobe 的 profile 名称 -> 编码器的 -profile:v 取值
+ENCODER_PROFILES = {
+    "libx264": {"Baseline": "baseline", "Constrained Baseline": "baseline", "Main": "main", "High": "high",
+                "High 10": "high10", "High 4:2:2": "high422", "High 4:4:4 Predictive": "high444"},
+    "libx265": {"Main": "main", "Main 10": "main10", "Main 12": "main12", "Main Still Picture": "mainstillpicture",
+                "Rext": "main444-8"},
+    "libvpx-vp9": {"Profile 0": "0", "Profile 1": "1", "Profile 2": "2", "Profile 3": "3"},
+}
+
+
+def _profile_level_args(encoder, profile, level):
+    """按基准片段的 profile / level 生成编码参数，保证规整后的片段与其它片段的码流参数一致"""
+    args = []
+    encoder_profile = ENCODER_PROFILES.get(encoder, {}).get(profile)
+    if encoder_profile is not None:
+        args += ["-profile:v", encoder_profile]
+    if level:
+        if encoder == "libx264":
+            args += ["-level", f"{level / 10:.1f}"]
+        elif encoder == "libx265":
+            # libx265 没有 -level 选项，ffprobe 的 hevc level 为 级别×30
+            args += ["-x265-params", f"level-idc={level / 30:.1f}"]
+    return args
 
 class LoloVideoCombine:
     @classmethod
@@ -19,11 +63,14 @@ class LoloVideoCombine:
             "optional": {
                 "any": ("*",),
                 "enable_combine": ("BOOLEAN", {"default": True}),
+                "compat_mode": (["normalize_mismatched", "reencode_all"], {
+                    "default": "normalize_mismatched",
+                    "tooltip": "流复制失败时的兼容模式：只并行重编码参数不一致的片段，或整体重新编码"}),
             },
         }
 
-    RETURN_TYPES = ("STRING",)
-    RETURN_NAMES = ("result_path",)
+    RETURN_TYPES = ("STRING", "FLOAT", "INT")
+    RETURN_NAMES = ("result_path", "elapsed_seconds", "bytes_written")
     FUNCTION = "combine"
     CATEGORY = "LoLo Nodes/video"
 
@@ -38,7 +85,8 @@ class LoloVideoCombine:
         except RuntimeError as e:
             raise RuntimeError(f"节点初始化失败: {e}")
 
-    def combine(self, video_dir, audio, filename_prefix, any=None, enable_combine=True):
+    def combine(self, video_dir, audio, filename_prefix, any=None, enable_combine=True,
+                compat_mode="normalize_mismatched"):
         # ---------- 路径解析 ----------
         if not os.path.isabs(video_dir):
             video_dir = os.path.join(folder_paths.get_output_directory(), video_dir)
@@ -49,127 +97,221 @@ class LoloVideoCombine:
             if not os.path.isdir(video_dir):
                 raise NotADirectoryError(f"目录不存在: {video_dir}")
             # 获取所有视频文件（扩展名与合并时一致）
-            video_extensions = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
-            files = [f for f in os.listdir(video_dir) if f.lower().endswith(video_extensions)]
-            files.sort()
+            files = get_dir_index(video_dir, VIDEO_EXTENSIONS)
             if not files:
                 result_str = "当前没有已生成的视频文件。"
             else:
                 result_str = "当前已完成：\n" + "\n".join(files)
             print(f"[LoloVideoCombine] 合并已禁用，返回文件列表:\n{result_str}")
-            return (result_str,)
+            return (result_str, 0.0, 0)
 
         # ---------- 模式2：正常合并（原有逻辑） ----------
         if not os.path.isdir(video_dir):
             raise NotADirectoryError(f"目录不存在: {video_dir}")
 
-        files = [f for f in os.listdir(video_dir) if f.lower().endswith(('.mp4', '.avi', '.mov', '.mkv', '.webm'))]
-        files.sort()
+        files = get_dir_index(video_dir, VIDEO_EXTENSIONS)
         if not files:
             raise RuntimeError(f"目录中没有视频文件: {video_dir}")
 
         output_dir = folder_paths.get_output_directory()
-        os.makedirs(output_dir, exist_ok=True)
-        counter = 1
-        while True:
-            out_path = os.path.join(output_dir, f"{filename_prefix}_{counter:05d}.mp4")
-            if not os.path.exists(out_path):
-                break
-            counter += 1
+        prefix_path = os.path.join(output_dir, filename_prefix)
+        out_path, _ = allocate_output_path(os.path.dirname(prefix_path), os.path.basename(prefix_path), "mp4")
 
         list_file = None
-        temp_video = None
-        audio_file = None
+        normalized_list_file = None
+        normalize_dir = None
+        segment_paths = [os.path.join(video_dir, file) for file in files]
 
         try:
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as f:
-                list_file = f.name
-                for file in files:
-                    full_path = os.path.join(video_dir, file)
-                    full_path = full_path.replace('\\', '/')
-                    if ' ' in full_path:
-                        f.write(f'file "{full_path}"\n')
-                    else:
-                        f.write(f'file {full_path}\n')
-
-            with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as tmp:
-                temp_video = tmp.name
+            list_file = self._write_concat_list(segment_paths)
 
+            audio_np, sample_rate, channels = audio_to_f32le(audio)
+
+            # 单次 ffmpeg：concat 分离器读取视频片段，音频以 f32le 经 stdin 管道输入，直接写出最终文件
+            start_time = time.perf_counter()
             try:
-                print(f"[LoloVideoCombine] 尝试快速拼接（流复制）...")
-                subprocess.run([self.ffmpeg_path, "-f", "concat", "-safe", "0",
-                               "-i", list_file, "-c", "copy", "-y", temp_video],
-                               check=True, capture_output=True)
+                print(f"[LoloVideoCombine] 尝试快速拼接（流复制）并合入音频...")
+                self._concat_with_audio(list_file, audio_np, sample_rate, channels, out_path,
+                                        ["-c:v", "copy"])
                 print(f"[LoloVideoCombine] 流复制成功")
             except subprocess.CalledProcessError as e:
                 print(f"[LoloVideoCombine] 流复制失败，错误信息:")
                 print(e.stderr.decode('utf-8', errors='ignore'))
-                print(f"[LoloVideoCombine] 降级为重新编码（兼容模式）...")
-                try:
-                    subprocess.run([self.ffmpeg_path, "-f", "concat", "-safe", "0",
-                                   "-i", list_file,
-                                   "-c:v", "libx264", "-crf", "18", "-preset", "fast",
-                                   "-pix_fmt", "yuv420p",
-                                   "-c:a", "aac", "-b:a", "192k",
-                                   "-y", temp_video],
-                                   check=True, capture_output=True)
-                    print(f"[LoloVideoCombine] 重新编码成功")
-                except subprocess.CalledProcessError as e2:
-                    error_msg = f"[LoloVideoCombine] 重新编码失败！\n"
-                    error_msg += f"ffmpeg 命令: {' '.join(e2.cmd)}\n"
-                    error_msg += f"错误输出:\n{e2.stderr.decode('utf-8', errors='ignore')}\n"
-                    error_msg += "请检查视频片段是否损坏，或尝试手动运行上述命令诊断。"
-                    print(error_msg)
-                    raise RuntimeError(error_msg)
-
-            waveform = audio["waveform"]
-            sample_rate = audio["sample_rate"]
-            if waveform.dim() == 3:
-                waveform = waveform.squeeze(0)
-            elif waveform.dim() == 1:
-                waveform = waveform.unsqueeze(0)
-
-            samples = waveform.shape[1]
-            channels = waveform.shape[0]
-            audio_data = waveform.t().contiguous().numpy().astype(np.float32)
-
-            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as tmp_audio:
-                audio_file = tmp_audio.name
-
-            ffmpeg_audio_cmd = [
-                self.ffmpeg_path,
-                "-y",
-                "-f", "f32le",
-                "-ar", str(sample_rate),
-                "-ac", str(channels),
-                "-i", "-",
-                "-c:a", "pcm_s16le",
-                "-f", "wav",
-                audio_file
-            ]
-            proc_audio = subprocess.Popen(ffmpeg_audio_cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
-            proc_audio.stdin.write(audio_data.tobytes())
-            proc_audio.stdin.close()
-            proc_audio.wait()
-            if proc_audio.returncode != 0:
-                stderr = proc_audio.stderr.read().decode('utf-8', errors='ignore')
-                raise RuntimeError(f"ffmpeg 音频编码失败 (返回码 {proc_audio.returncode}):\n{stderr}")
-
-            subprocess.run([self.ffmpeg_path, "-i", temp_video, "-i", audio_file,
-                           "-c:v", "copy", "-c:a", "aac",
-                           "-map", "0:v:0", "-map", "1:a:0",
-                           "-shortest", "-y", out_path],
-                           check=True, capture_output=True)
+
+                normalized = False
+                if compat_mode == "normalize_mismatched":
+                    normalize_dir = tempfile.mkdtemp(prefix="lolo_concat_")
+                    normalized_paths = self._normalize_mismatched_segments(segment_paths, normalize_dir)
+                    if normalized_paths is not None:
+                        normalized_list_file = self._write_concat_list(normalized_paths)
+                        try:
+                            self._concat_with_audio(normalized_list_file, audio_np, sample_rate, channels,
+                                                    out_path, ["-c:v", "copy"])
+                            normalized = True
+                            print(f"[LoloVideoCombine] 片段规整后流复制成功")
+                        except subprocess.CalledProcessError as e_norm:
+                            print(f"[LoloVideoCombine] 片段规整后流复制仍失败:")
+                            print(e_norm.stderr.decode('utf-8', errors='ignore'))
+
+                if not normalized:
+                    self._reencode_all(list_file, audio_np, sample_rate, channels, out_path)
+
+            elapsed = time.perf_counter() - start_time
+            bytes_written = os.path.getsize(out_path)
+            print(f"[LoloVideoCombine] 合并完成: {out_path}，耗时 {elapsed:.2f}s，"
+                  f"写入 {bytes_written / (1024 * 1024):.2f} MB")
 
         except Exception as e:
             print(f"[LoloVideoCombine] 处理失败: {e}")
+            if os.path.exists(out_path):
+                try:
+                    os.remove(out_path)
+                except Exception:
+                    pass
             raise e
         finally:
-            for f in [list_file, temp_video, audio_file]:
+            for f in [list_file, normalized_list_file]:
                 if f is not None and os.path.exists(f):
                     try:
                         os.remove(f)
                     except Exception as e:
                         print(f"[LoloVideoCombine] 临时文件删除失败（可忽略）: {e}")
+            if normalize_dir is not None:
+                shutil.rmtree(normalize_dir, ignore_errors=True)
+
+        return (out_path, elapsed, bytes_written)
+
+    def _write_concat_list(self, paths):
+        """写出 concat 分离器使用的列表文件，返回其路径"""
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as f:
+            for full_path in paths:
+                full_path = full_path.replace('\\', '/')
+                if ' ' in full_path:
+                    f.write(f'file "{full_path}"\n')
+                else:
+                    f.write(f'file {full_path}\n')
+            return f.name
+
+    def _reencode_all(self, list_file, audio_np, sample_rate, channels, out_path):
+        print(f"[LoloVideoCombine] 降级为重新编码（兼容模式）...")
+        try:
+            self._concat_with_audio(list_file, audio_np, sample_rate, channels, out_path,
+                                    ["-c:v", "libx264", "-crf", "18", "-preset", "fast",
+                                     "-pix_fmt", "yuv420p"])
+            print(f"[LoloVideoCombine] 重新编码成功")
+        except subprocess.CalledProcessError as e2:
+            error_msg = f"[LoloVideoCombine] 重新编码失败！\n"
+            error_msg += f"ffmpeg 命令: {' '.join(e2.cmd)}\n"
+            error_msg += f"错误输出:\n{e2.stderr.decode('utf-8', errors='ignore')}\n"
+            error_msg += "请检查视频片段是否损坏，或尝试手动运行上述命令诊断。"
+            print(error_msg)
+            raise RuntimeError(error_msg)
+
+    def _probe_segment(self, path):
+        """
+        通过共享元数据缓存（只读容器头，不解码）获取视频流参数。
+        返回 (codec, profile, level, pix_fmt, width, height, fps, timescale)，解析失败返回 None。
+        """
+        try:
+            video = get_media_info(path)["video"]
+        except Exception as e:
+            print(f"[LoloVideoCombine] 片段探测失败 {path}: {e}")
+            return None
+        if video is None or not video["codec"] or not video["pix_fmt"] or not video["width"]:
+            return None
+        return (video["codec"], video.get("profile"), video.get("level"), video["pix_fmt"],
+                video["width"], video["height"],
+                video["fps_str"] if video["fps"] else None, video["timescale"])
+
+    def _normalize_mismatched_segments(self, segment_paths, work_dir):
+        """
+        探测所有片段参数，以出现次数最多的参数为基准，
+        仅对不一致的片段并行重编码（每个任务一个 ffmpeg 进程，并发数不超过 CPU 核数）。
+        返回可用于流复制拼接的新片段路径列表；无法规整或没有不一致的片段时返回 None
+        （参数全部一致时流复制失败另有原因，规整后再流复制同样会失败）。
+        """
+        workers = max(1, os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            signatures = list(pool.map(self._probe_segment, segment_paths))
+
+        if any(sig is None for sig in signatures):
+            print(f"[LoloVideoCombine] 部分片段无法解析视频参数，跳过片段规整")
+            return None
+
+        reference = Counter(signatures).most_common(1)[0][0]
+        codec, profile, level, pix_fmt, width, height, fps, timescale = reference
+        encoder = CODEC_ENCODERS.get(codec)
+        if encoder is None:
+            print(f"[LoloVideoCombine] 基准编码 {codec} 不支持规整，跳过片段规整")
+            return None
+
+        mismatched = [i for i, sig in enumerate(signatures) if sig != reference]
+        if not mismatched:
+            print(f"[LoloVideoCombine] 所有片段参数一致，跳过片段规整")
+            return None
+        print(f"[LoloVideoCombine] 基准参数 {reference}，需要规整 {len(mismatched)}/{len(segment_paths)} 个片段")
+
+        target_args = ["-c:v", encoder, "-pix_fmt", pix_fmt, "-s", f"{width}x{height}"]
+        target_args += _profile_level_args(encoder, profile, level)
+        if encoder == "libx264":
+            target_args += ["-crf", "18", "-preset", "fast"]
+        if fps:
+            target_args += ["-r", fps]
+        ext = os.path.splitext(segment_paths[0])[1].lower() or ".mp4"
+        if timescale and ext in (".mp4", ".mov"):
+            # 时间基一致才能无缝流复制拼接
+            target_args += ["-video_track_timescale", str(timescale)]
+
+        # 每个 ffmpeg 任务分到的线程数，避免并发进程互相抢占
+        threads = max(1, workers // max(1, len(mismatched)))
+
+        def normalize(index):
+            out_file = os.path.join(work_dir, f"{index:05d}{ext}")
+            cmd = [self.ffmpeg_path, "-y", "-i", segment_paths[index], "-an",
+                   *target_args, "-threads", str(threads), out_file]
+            subprocess.run(cmd, check=True, capture_output=True)
+            return index, out_file
+
+        new_paths = list(segment_paths)
+        try:
+            with ThreadPoolExecutor(max_workers=min(workers, max(1, len(mismatched)))) as pool:
+                for index, out_file in pool.map(normalize, mismatched):
+                    new_paths[index] = out_file
+        except subprocess.CalledProcessError as e:
+            print(f"[LoloVideoCombine] 片段规整失败:\n{e.stderr.decode('utf-8', errors='ignore')}")
+            return None
+        return new_paths
+
+    def _concat_with_audio(self, list_file, audio_np, sample_rate, channels, out_path, video_args):
+        """
+        一次 ffmpeg 调用完成拼接与音频合并。
+        音频 PCM 分块写入 stdin；stderr 写入临时文件，避免管道写满阻塞。
+        失败时抛出 subprocess.CalledProcessError（stderr 为 bytes）。
+        """
+        cmd = [self.ffmpeg_path, "-y",
+               "-f", "concat", "-safe", "0", "-i", list_file,
+               "-f", "f32le", "-ar", str(sample_rate), "-ac", str(channels), "-i", "pipe:0",
+               "-map", "0:v:0", "-map", "1:a:0",
+               *video_args,
+               "-c:a", "aac",
+               "-shortest", out_path]
+
+        audio_view = memoryview(audio_np).cast("B")
+        with tempfile.TemporaryFile() as stderr_file:
+            proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=stderr_file)
+            try:
+                for offset in range(0, len(audio_view), AUDIO_PIPE_CHUNK_BYTES):
+                    proc.stdin.write(audio_view[offset:offset + AUDIO_PIPE_CHUNK_BYTES])
+            except (BrokenPipeError, OSError):
+                # -shortest 时 ffmpeg 可能在音频读完前结束，由返回码判断是否成功
+                pass
+            finally:
+                try:
+                    proc.stdin.close()
+                except (BrokenPipeError, OSError):
+                    pass
+            proc.wait()
 
-        return (out_path,)
\ No newline at end of file
+            if proc.returncode != 0:
+                stderr_file.seek(0)
+                raise subprocess.CalledProcessError(proc.returncode, cmd, stderr=stderr_file.read())
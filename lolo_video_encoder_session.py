@@ -0,0 +1,273 @@
+import os
+import atexit
+import threading
+import subprocess
+import torch
+import folder_paths
+from .lolo_ffmpeg_utils import get_ffmpeg_path, FFmpegFrameWriter, audio_to_f32le
+from .lolo_video_save_output import LoloVideoSaveOutput
+
+
+class _EncoderSession:
+    """一个长期存活的 ffmpeg 编码进程，按 filename_prefix 区分"""
+
+    def __init__(self, writer, partial_file, output_file, width, height, fps, format, codec):
+        self.writer = writer
+        self.partial_file = partial_file
+        self.output_file = output_file
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.format = format
+        self.codec = codec
+        self.segments = 0
+        # 写入与收尾只锁单个会话，不同前缀的追加互不阻塞
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def check_params(self, width, height, fps, format, codec, filename_prefix):
+        """同一会话中途改变编码参数会被忽略，直接报错"""
+        if (width, height) != (self.width, self.height):
+            raise ValueError(f"片段分辨率 {width}x{height} 与会话分辨率 "
+                             f"{self.width}x{self.height} 不一致: {filename_prefix}")
+        if (fps, format, codec) != (self.fps, self.format, self.codec):
+            raise ValueError(f"片段编码参数 fps={fps}, format={format}, codec={codec} 与会话参数 "
+                             f"fps={self.fps}, format={self.format}, codec={self.codec} 不一致: {filename_prefix}，"
+                             f"请先结束会话或开启 new_session")
+
+
+# filename_prefix -> _EncoderSession
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _remove_placeholder(output_file):
+    """删除 allocate_output_path 创建的占位文件（仍为 0 字节时），避免留下空的视频文件"""
+    try:
+        if os.path.getsize(output_file) == 0:
+            os.remove(output_file)
+    except OSError:
+        pass
+
+
+def _discard_session(session):
+    """终止会话并清理 .partial 文件和输出占位文件"""
+    session.closed = True
+    try:
+        session.writer.abort()
+    except Exception:
+        pass
+    try:
+        if os.path.exists(session.partial_file):
+            os.remove(session.partial_file)
+    except OSError:
+        pass
+    _remove_placeholder(session.output_file)
+
+
+def _abort_all_sessions():
+    """进程退出时终止所有未结束的编码会话"""
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        _discard_session(session)
+
+
+atexit.register(_abort_all_sessions)
+
+
+class LoloVideoEncoderAppend:
+    """
+    持续编码会话：同一个 filename_prefix 只启动一个 ffmpeg 进程，
+    每个片段生成后直接把帧追加写入该进程，最后由 LoloVideoEncoderFinalize 收尾。
+    省去每段启动 ffmpeg、逐段写 mp4 以及之后再拼接的开销。
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "images": ("IMAGE",),
+                "filename_prefix": ("STRING", {"default": "video/ComfyUI"}),
+                "output_last_frame_count": ("INT", {"default": 1, "min": 1, "max": 999999}),
+                "fps": ("FLOAT", {"default": 30.0, "min": 1.0, "max": 120.0, "step": 1.0}),
+                "format": (["mp4", "webm"], {"default": "mp4"}),
+                "codec": (["auto", "libx264", "libx265", "libvpx", "h264_nvenc"], {"default": "auto"}),
+            },
+            "optional": {
+                "trim_first_frames": ("INT", {"default": 0, "min": 0, "max": 999999,
+                                              "tooltip": "追加前丢弃本片段开头的帧数（例如 InfiniteTalk 的 trim_image 重叠帧）"}),
+                "chunk_size": ("INT", {"default": 16, "min": 0, "max": 4096, "step": 1,
+                                       "tooltip": "流式写入 ffmpeg 时每块的帧数；0 表示一次性写入整个批次"}),
+                "new_session": ("BOOLEAN", {"default": False,
+                                            "tooltip": "为 True 时丢弃同前缀下尚未结束的会话，重新开始编码"}),
+            },
+        }
+
+    RETURN_TYPES = ("IMAGE", "INT")
+    RETURN_NAMES = ("output_last_frames", "frames_written")
+    FUNCTION = "append"
+    CATEGORY = "LoLo Nodes/video"
+    OUTPUT_NODE = True
+
+    def append(self, images, filename_prefix, output_last_frame_count, fps, format, codec,
+               trim_first_frames=0, chunk_size=16, new_session=False):
+        if images.shape[0] == 0:
+            print("[LoloVideoEncoderAppend] 警告：输入的 images 批次为空，跳过。")
+            return (images, 0)
+
+        batch_size, height, width, channels = images.shape
+        if codec == "auto":
+            codec = "libx264" if format == "mp4" else "libvpx"
+
+        stale = None
+        with _sessions_lock:
+            session = _sessions.get(filename_prefix)
+            if session is not None and (new_session or session.writer.proc.poll() is not None):
+                print(f"[LoloVideoEncoderAppend] 丢弃旧会话: {filename_prefix}")
+                stale = session
+                del _sessions[filename_prefix]
+                session = None
+
+            if session is None:
+                session = self._start_session(filename_prefix, width, height, fps, format, codec)
+                _sessions[filename_prefix] = session
+
+        if stale is not None:
+            with stale.lock:
+                _discard_session(stale)
+
+        frames = images[trim_first_frames:] if trim_first_frames > 0 else images
+        with session.lock:
+            if session.closed:
+                raise RuntimeError(f"编码会话已被结束或丢弃: {filename_prefix}")
+            session.check_params(width, height, fps, format, codec, filename_prefix)
+            written = 0
+            if frames.shape[0] > 0:
+                try:
+                    written = session.writer.write(frames, chunk_size)
+                except Exception as e:
+                    print(f"[LoloVideoEncoderAppend] 写入失败，会话已终止: {e}")
+                    _discard_session(session)
+                    with _sessions_lock:
+                        if _sessions.get(filename_prefix) is session:
+                            del _sessions[filename_prefix]
+                    raise
+                session.segments += 1
+            total = session.writer.frames_written
+
+        if written:
+            print(f"[LoloVideoEncoderAppend] {filename_prefix}: 第 {session.segments} 段追加 {written} 帧，累计 {total} 帧")
+        else:
+            # trim_first_frames >= 批次帧数：没有新帧，不写入也不终止会话
+            print(f"[LoloVideoEncoderAppend] {filename_prefix}: 裁掉前 {trim_first_frames} 帧后没有剩余帧，"
+                  f"跳过本次追加，累计 {total} 帧")
+
+        last_count = min(output_last_frame_count, batch_size)
+        last_frames = images[-last_count:] if last_count > 0 else torch.zeros((0, height, width, channels))
+        return (last_frames, total)
+
+    def _start_session(self, filename_prefix, width, height, fps, format, codec):
+        saver = LoloVideoSaveOutput()
+        full_output_folder, base_filename, _, _, _ = folder_paths.get_save_image_path(
+            filename_prefix,
+            folder_paths.get_output_directory(),
+            width,
+            height
+        )
+        output_file, _ = saver._get_next_available_filename(full_output_folder, base_filename, format)
+        # 编码过程中写入 {输出文件}.partial（非视频后缀，不会被目录扫描当作视频），
+        # 收尾时再改名（或与音频合并）为最终文件；后缀无法推断封装格式，显式指定 -f
+        partial_file = f"{output_file}.partial"
+        cmd = saver._build_ffmpeg_cmd(width, height, partial_file, fps, format, codec)
+        cmd[-1:-1] = ["-f", format]
+        print(f"[LoloVideoEncoderAppend] 启动编码会话: {' '.join(cmd)}")
+        try:
+            writer = FFmpegFrameWriter(cmd)
+        except Exception:
+            _remove_placeholder(output_file)
+            raise
+        return _EncoderSession(writer, partial_file, output_file, width, height, fps, format, codec)
+
+
+class LoloVideoEncoderFinalize:
+    """
+    结束 LoloVideoEncoderAppend 打开的编码会话：关闭 ffmpeg 输入并等待编码完成，
+    如提供 audio，则以流复制视频的方式一次性合入音频。
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "filename_prefix": ("STRING", {"default": "video/ComfyUI"}),
+            },
+            "optional": {
+                "audio": ("AUDIO",),
+                "any": ("*",),
+            },
+        }
+
+    RETURN_TYPES = ("STRING",)
+    RETURN_NAMES = ("result_path",)
+    FUNCTION = "finalize"
+    CATEGORY = "LoLo Nodes/video"
+    OUTPUT_NODE = True
+
+    def finalize(self, filename_prefix, audio=None, any=None):
+        with _sessions_lock:
+            session = _sessions.pop(filename_prefix, None)
+        if session is None:
+            raise RuntimeError(f"没有找到正在进行的编码会话: {filename_prefix}")
+
+        # 等待正在进行的追加写入完成
+        with session.lock:
+            session.closed = True
+            try:
+                session.writer.close()
+            except Exception:
+                _discard_session(session)
+                raise
+        print(f"[LoloVideoEncoderFinalize] {filename_prefix}: 编码完成，共 {session.segments} 段 "
+              f"{session.writer.frames_written} 帧")
+
+        try:
+            if audio is None:
+                os.replace(session.partial_file, session.output_file)
+            else:
+                self._mux_audio(session, audio)
+        except Exception:
+            _remove_placeholder(session.output_file)
+            raise
+        finally:
+            if os.path.exists(session.partial_file):
+                os.remove(session.partial_file)
+
+        print(f"[LoloVideoEncoderFinalize] 输出文件: {session.output_file}")
+        return (session.output_file,)
+
+    def _mux_audio(self, session, audio):
+        audio_np, sample_rate, channels = audio_to_f32le(audio)
+        audio_codec = "aac" if session.format == "mp4" else "libopus"
+        cmd = [
+            get_ffmpeg_path(), "-y",
+            "-i", session.partial_file,
+            "-f", "f32le", "-ar", str(sample_rate), "-ac", str(channels), "-i", "-",
+            "-map", "0:v:0", "-map", "1:a:0",
+            "-c:v", "copy", "-c:a", audio_codec,
+            "-shortest", session.output_file,
+        ]
+        result = subprocess.run(cmd, input=memoryview(audio_np).cast("B"), capture_output=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg 音频合并失败 (返回码 {result.returncode}):\n"
+                               f"{result.stderr.decode('utf-8', errors='ignore')}")
+
+    @classmethod
+    def IS_CHANGED(cls, filename_prefix, audio=None, any=None):
+        # 会话状态在进程内变化，每次都需要执行
+        return float("nan")
+
+    @classmethod
+    def VALIDATE_INPUTS(cls, input_types):
+        return True
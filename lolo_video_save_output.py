@@ -1,10 +1,8 @@
 import os
-import subprocess
-import re
 import torch
-import numpy as np
 import folder_paths
-from .lolo_ffmpeg_utils import get_ffmpeg_path
+from .lolo_ffmpeg_utils import get_ffmpeg_path, FFmpegFrameWriter
+from .lolo_output_counter import allocate_output_path
 
 class LoloVideoSaveOutput:
     @classmethod
@@ -18,6 +16,10 @@ class LoloVideoSaveOutput:
                 "format": (["mp4", "webm"], {"default": "mp4"}),
                 "codec": (["auto", "libx264", "libx265", "libvpx", "h264_nvenc"], {"default": "auto"}),
             },
+            "optional": {
+                "chunk_size": ("INT", {"default": 16, "min": 0, "max": 4096, "step": 1,
+                                       "tooltip": "流式写入 ffmpeg 时每块的帧数，峰值内存只与块大小有关；0 表示一次性写入整个批次"}),
+            },
         }
 
     RETURN_TYPES = ("IMAGE",)
@@ -26,7 +28,7 @@ class LoloVideoSaveOutput:
     CATEGORY = "LoLo Nodes/video"
     OUTPUT_NODE = True
 
-    def save_video(self, images, filename_prefix, output_last_frame_count, fps, format, codec):
+    def save_video(self, images, filename_prefix, output_last_frame_count, fps, format, codec, chunk_size=16):
         # 检查输入批次是否为空
         if images.shape[0] == 0:
             print("[LoloVideoSaveOutput] 警告：输入的 images 批次为空，跳过视频保存。")
@@ -52,12 +54,13 @@ class LoloVideoSaveOutput:
         output_file, next_counter = self._get_next_available_filename(full_output_folder, base_filename, format)
         print(f"[LoloVideoSaveOutput] 正在保存视频到: {output_file}")
 
-        # 转换图像并编码
+        # 分块转换图像并流式编码
         try:
-            images_np = (images.cpu().numpy() * 255).astype(np.uint8)
-            self._encode_with_ffmpeg(images_np, output_file, fps, format, codec)
+            self._encode_with_ffmpeg(images, output_file, fps, format, codec, chunk_size)
         except Exception as e:
             print(f"[LoloVideoSaveOutput] 视频编码失败: {e}")
+            if os.path.exists(output_file):
+                os.remove(output_file)
             raise e
 
         # 提取尾部帧
@@ -70,23 +73,11 @@ class LoloVideoSaveOutput:
         return (last_frames,)
 
     def _get_next_available_filename(self, directory, base_name, extension):
-        """扫描目录，找到下一个可用的文件名（如 base_name_00001.extension）"""
-        max_num = 0
-        pattern = re.compile(rf"^{re.escape(base_name)}_(\d+)\.{re.escape(extension)}$")
-        for f in os.listdir(directory):
-            match = pattern.match(f)
-            if match:
-                num = int(match.group(1))
-                if num > max_num:
-                    max_num = num
-        next_num = max_num + 1
-        filename = f"{base_name}_{next_num:05d}.{extension}"
-        return os.path.join(directory, filename), next_num
-
-    def _encode_with_ffmpeg(self, images_np, output_file, fps, format, codec):
-        ffmpeg_path = get_ffmpeg_path()
-        batch_size, height, width, _ = images_np.shape
+        """分配下一个可用的文件名（如 base_name_00001.extension），跨进程原子、常数时间"""
+        return allocate_output_path(directory, base_name, extension)
 
+    def _build_ffmpeg_cmd(self, width, height, output_file, fps, format, codec):
+        ffmpeg_path = get_ffmpeg_path()
         cmd = [
             ffmpeg_path,
             "-y",
@@ -102,17 +93,22 @@ class LoloVideoSaveOutput:
         else:  # webm
             cmd += ["-c:v", codec, "-pix_fmt", "yuv420p"]
         cmd.append(output_file)
+        return cmd
+
+    def _encode_with_ffmpeg(self, images, output_file, fps, format, codec, chunk_size=16):
+        batch_size, height, width, _ = images.shape
+        cmd = self._build_ffmpeg_cmd(width, height, output_file, fps, format, codec)
 
         print(f"[LoloVideoSaveOutput] 执行 ffmpeg 命令: {' '.join(cmd)}")
 
-        # 将所有图像数据合并为一个 bytes 对象
-        raw_data = images_np.tobytes()
-        
-        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
-        stdout, stderr = proc.communicate(input=raw_data)
-        
-        if proc.returncode != 0:
-            raise RuntimeError(f"ffmpeg 编码失败 (返回码 {proc.returncode}):\n{stderr.decode('utf-8', errors='ignore')}")
+        # 按 chunk_size 帧分块转换并写入 stdin，避免同时持有 float32 / uint8 / bytes 三份整段数据
+        writer = FFmpegFrameWriter(cmd)
+        try:
+            writer.write(images, chunk_size)
+        except Exception:
+            writer.abort()
+            raise
+        writer.close()
 
         if not os.path.exists(output_file):
-            raise RuntimeError(f"ffmpeg 执行成功但未生成输出文件: {output_file}")
\ No newline at end of file
+            raise RuntimeError(f"ffmpeg 执行成功但未生成输出文件: {output_file}")
@@ -0,0 +1,97 @@
+# ComfyUI-LoLo-Nodes/lolo_zip_manifest.py
+"""
+增量打包清单。
+
+记录每个已归档条目的 (大小, mtime_ns, sha1)，再次导出同一目录时只挑出新增或内容变化的文件：
+大小与 mtime 都没变的文件直接跳过，不读取内容；只有元数据变化的文件才计算哈希确认。
+清单同时记录归档文件的大小，归档被删除或被外部修改时视为失效并全量重建。
+"""
+import os
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+MANIFEST_VERSION = 1
+HASH_CHUNK_BYTES = 1 << 20
+
+
+def manifest_path_for(archive_path):
+    """清单与归档放在同一目录，隐藏文件"""
+    directory, name = os.path.split(archive_path)
+    return os.path.join(directory, f".{name}.manifest.json")
+
+
+def load_manifest(path, archive_path=None):
+    """
+    读取清单，不存在或损坏时返回空清单。
+    给出 archive_path 时校验归档大小，不一致（被删除/被修改/上次追加中断）返回空清单。
+    """
+    empty = {"version": MANIFEST_VERSION, "archive_size": 0, "files": {}}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return empty
+    if manifest.get("version") != MANIFEST_VERSION or not isinstance(manifest.get("files"), dict):
+        return empty
+    if archive_path is not None:
+        try:
+            archive_size = os.path.getsize(archive_path)
+        except OSError:
+            return empty
+        if archive_size != manifest.get("archive_size"):
+            print(f"[LoLo Nodes] 归档 {archive_path} 与清单不一致，将全量重建")
+            return empty
+    return manifest
+
+
+def save_manifest(path, manifest):
+    """先写临时文件再替换，避免中断时留下半个清单"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _sha1_file(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_BYTES)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def diff_files(files, manifest, workers=0):
+    """
+    找出相对清单新增或变化的文件。
+    返回 (changed_paths, records)，records 为 {归档名: [大小, mtime_ns, sha1]}，
+    包含所有输入文件的最新记录，写入成功后合并进清单。
+    """
+    known = manifest["files"]
+    records = {}
+    to_hash = []
+    for path in files:
+        st = os.stat(path)
+        arcname = os.path.basename(path)
+        old = known.get(arcname)
+        if old is not None and old[0] == st.st_size and old[1] == st.st_mtime_ns:
+            records[arcname] = old
+        else:
+            to_hash.append((path, arcname, st))
+
+    changed = set()
+    if to_hash:
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+            digests = pool.map(_sha1_file, [path for path, _, _ in to_hash])
+            for (path, arcname, st), digest in zip(to_hash, digests):
+                old = known.get(arcname)
+                records[arcname] = [st.st_size, st.st_mtime_ns, digest]
+                # 只是被 touch 过、内容没变的文件不需要重新归档
+                if old is None or old[2] != digest:
+                    changed.add(path)
+
+    # 保持输入顺序
+    return [path for path in files if path in changed], records
@@ -0,0 +1,253 @@
+# ComfyUI-LoLo-Nodes/lolo_zip_stream.py
+"""
+流式 ZIP 写入（只顺序写，不需要 seek，可以直接写到 HTTP 响应）。
+
+- 已压缩格式（jpg/png/mp4 等）直接存储，其余使用 deflate；
+- deflate 在线程池中并行完成（zlib 压缩时释放 GIL），按原顺序写入归档；
+- 大文件与存储条目边读边写，使用数据描述符，内存占用与文件大小无关；
+- 超过 4GB / 65535 个条目时自动使用 ZIP64；
+- 支持向已有归档追加条目（同名条目以新数据为准，只重写中央目录）。
+"""
+import os
+import time
+import zlib
+import struct
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# 本身已压缩、再 deflate 没有收益的扩展名
+STORED_EXTENSIONS = frozenset((
+    '.jpg', '.jpeg', '.png', '.webp', '.gif', '.avif', '.heic',
+    '.mp4', '.webm', '.mkv', '.mov', '.avi', '.m4v',
+    '.mp3', '.m4a', '.aac', '.ogg', '.opus', '.flac',
+    '.zip', '.7z', '.rar', '.gz', '.bz2', '.xz', '.zst',
+    '.safetensors',
+))
+
+# 超过该大小的 deflate 条目不整体读入内存，改为边读边压缩
+DEFLATE_IN_MEMORY_LIMIT = 32 << 20
+# 流式读取文件时的块大小
+READ_CHUNK_BYTES = 1 << 20
+# deflate 压缩级别
+DEFLATE_LEVEL = 6
+
+_STORED = 0
+_DEFLATED = 8
+_FLAG_DATA_DESCRIPTOR = 0x08
+_FLAG_UTF8 = 0x800
+_ZIP32_LIMIT = 0xFFFFFFFF
+_ZIP64_VERSION = 45
+_DEFAULT_VERSION = 20
+
+
+def choose_method(path, compression="auto"):
+    """按扩展名选择存储还是 deflate"""
+    if compression == "store":
+        return _STORED
+    if compression == "deflate":
+        return _DEFLATED
+    return _STORED if os.path.splitext(path)[1].lower() in STORED_EXTENSIONS else _DEFLATED
+
+
+def _dos_datetime(mtime):
+    t = time.localtime(mtime)
+    year = max(t.tm_year, 1980)
+    dos_date = ((year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    return dos_time, dos_date
+
+
+def _compress_file(path):
+    """线程池任务：整体读入并 deflate，压缩无收益时退回存储。返回 (method, crc, size, data)"""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    crc = zlib.crc32(raw)
+    compressor = zlib.compressobj(DEFLATE_LEVEL, zlib.DEFLATED, -15)
+    data = compressor.compress(raw) + compressor.flush()
+    if len(data) >= len(raw):
+        return _STORED, crc, len(raw), raw
+    return _DEFLATED, crc, len(raw), data
+
+
+class ZipStreamWriter:
+    """顺序写出 ZIP 归档，out 只需要提供 write(bytes)"""
+
+    def __init__(self, out, offset=0, entries=None):
+        self.out = out
+        self.offset = offset
+        # (name_bytes, method, flags, dos_time, dos_date, crc, csize, usize, offset)
+        self.entries = list(entries) if entries else []
+
+    def _write(self, data):
+        self.out.write(data)
+        self.offset += len(data)
+
+    def _local_header(self, name, method, flags, dos_time, dos_date, crc, csize, usize, zip64):
+        extra = b""
+        if zip64:
+            extra = struct.pack("<HHQQ", 1, 16, usize, csize)
+            csize = usize = _ZIP32_LIMIT
+        version = _ZIP64_VERSION if zip64 else _DEFAULT_VERSION
+        self._write(struct.pack("<IHHHHHIIIHH", 0x04034b50, version, flags, method,
+                                dos_time, dos_date, crc, csize, usize, len(name), len(extra)))
+        self._write(name)
+        self._write(extra)
+
+    def add_bytes(self, arcname, mtime, method, crc, usize, data):
+        """写入已在内存中完成压缩的条目"""
+        name = arcname.encode("utf-8")
+        dos_time, dos_date = _dos_datetime(mtime)
+        offset = self.offset
+        zip64 = max(len(data), usize) >= _ZIP32_LIMIT
+        self._local_header(name, method, _FLAG_UTF8, dos_time, dos_date, crc, len(data), usize, zip64)
+        self._write(data)
+        self.entries.append((name, method, _FLAG_UTF8, dos_time, dos_date, crc, len(data), usize, offset))
+
+    def add_file_stream(self, path, arcname, method):
+        """边读边写（可选边压缩），CRC 和大小写在数据描述符中"""
+        name = arcname.encode("utf-8")
+        st = os.stat(path)
+        dos_time, dos_date = _dos_datetime(st.st_mtime)
+        offset = self.offset
+        flags = _FLAG_UTF8 | _FLAG_DATA_DESCRIPTOR
+        # 按文件大小预判是否需要 ZIP64（deflate 结果不会显著大于原始大小）
+        zip64 = st.st_size >= _ZIP32_LIMIT - (1 << 20)
+        self._local_header(name, method, flags, dos_time, dos_date, 0, 0, 0, zip64)
+
+        crc = 0
+        usize = 0
+        csize = 0
+        compressor = zlib.compressobj(DEFLATE_LEVEL, zlib.DEFLATED, -15) if method == _DEFLATED else None
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(READ_CHUNK_BYTES)
+                if not chunk:
+                    break
+                crc = zlib.crc32(chunk, crc)
+                usize += len(chunk)
+                if compressor is not None:
+                    chunk = compressor.compress(chunk)
+                if chunk:
+                    self._write(chunk)
+                    csize += len(chunk)
+        if compressor is not None:
+            tail = compressor.flush()
+            self._write(tail)
+            csize += len(tail)
+
+        if zip64:
+            self._write(struct.pack("<IIQQ", 0x08074b50, crc, csize, usize))
+        else:
+            self._write(struct.pack("<IIII", 0x08074b50, crc, csize, usize))
+        self.entries.append((name, method, flags, dos_time, dos_date, crc, csize, usize, offset))
+
+    def close(self):
+        """写出中央目录"""
+        cd_offset = self.offset
+        for name, method, flags, dos_time, dos_date, crc, csize, usize, offset in self.entries:
+            zip64_fields = []
+            if usize >= _ZIP32_LIMIT:
+                zip64_fields.append(usize)
+                usize = _ZIP32_LIMIT
+            if csize >= _ZIP32_LIMIT:
+                zip64_fields.append(csize)
+                csize = _ZIP32_LIMIT
+            if offset >= _ZIP32_LIMIT:
+                zip64_fields.append(offset)
+                offset = _ZIP32_LIMIT
+            extra = b""
+            version = _DEFAULT_VERSION
+            if zip64_fields:
+                extra = struct.pack(f"<HH{len(zip64_fields)}Q", 1, 8 * len(zip64_fields), *zip64_fields)
+                version = _ZIP64_VERSION
+            self._write(struct.pack("<IHHHHHHIIIHHHHHII", 0x02014b50, (3 << 8) | version, version,
+                                    flags, method, dos_time, dos_date, crc, csize, usize,
+                                    len(name), len(extra), 0, 0, 0, 0o100644 << 16, offset))
+            self._write(name)
+            self._write(extra)
+        cd_size = self.offset - cd_offset
+
+        count = len(self.entries)
+        if count >= 0xFFFF or cd_size >= _ZIP32_LIMIT or cd_offset >= _ZIP32_LIMIT:
+            zip64_eocd_offset = self.offset
+            self._write(struct.pack("<IQHHIIQQQQ", 0x06064b50, 44, _ZIP64_VERSION, _ZIP64_VERSION,
+                                    0, 0, count, count, cd_size, cd_offset))
+            self._write(struct.pack("<IIQI", 0x07064b50, 0, zip64_eocd_offset, 1))
+        self._write(struct.pack("<IHHHHIIH", 0x06054b50, 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+                                min(cd_size, _ZIP32_LIMIT), min(cd_offset, _ZIP32_LIMIT), 0))
+
+
+def write_zip(out, files, compression="auto", workers=0, progress=None):
+    """
+    把 files（路径列表）按顺序写成 ZIP 到 out。
+    progress(done, total, bytes_written) 在每个条目写完后调用。
+    返回写出的字节数。
+    """
+    writer = ZipStreamWriter(out)
+    _write_entries(writer, files, compression, workers, progress)
+    writer.close()
+    return writer.offset
+
+
+def append_zip(zip_path, files, compression="auto", workers=0, progress=None):
+    """
+    向已有归档追加 files：截掉旧的中央目录，在其位置写入新条目，再写出合并后的中央目录。
+    与新条目同名的旧条目从目录中移除（旧数据保留在文件中，不再被引用）。
+    返回归档的总字节数。
+    """
+    new_names = {os.path.basename(path).encode("utf-8") for path in files}
+    with zipfile.ZipFile(zip_path) as zf:
+        start_dir = zf.start_dir
+        entries = []
+        for info in zf.infolist():
+            name = info.filename.encode("utf-8")
+            if name in new_names:
+                continue
+            year, month, day, hour, minute, second = info.date_time
+            dos_time = (hour << 11) | (minute << 5) | (second // 2)
+            dos_date = ((year - 1980) << 9) | (month << 5) | day
+            entries.append((name, info.compress_type, info.flag_bits | _FLAG_UTF8, dos_time, dos_date,
+                            info.CRC, info.compress_size, info.file_size, info.header_offset))
+
+    with open(zip_path, 'r+b') as f:
+        f.seek(start_dir)
+        f.truncate()
+        writer = ZipStreamWriter(f, offset=start_dir, entries=entries)
+        _write_entries(writer, files, compression, workers, progress)
+        writer.close()
+    return writer.offset
+
+
+def _write_entries(writer, files, compression, workers, progress):
+    workers = workers or os.cpu_count() or 1
+    total = len(files)
+    done = 0
+
+    def flush_one(item):
+        nonlocal done
+        path, method, future = item
+        arcname = os.path.basename(path)
+        if future is not None:
+            method, crc, usize, data = future.result()
+            writer.add_bytes(arcname, os.path.getmtime(path), method, crc, usize, data)
+        else:
+            writer.add_file_stream(path, arcname, method)
+        done += 1
+        if progress is not None:
+            progress(done, total, writer.offset)
+
+    # 限制已提交但未写出的压缩任务数量，控制内存占用
+    window = workers * 2
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for path in files:
+            method = choose_method(path, compression)
+            future = None
+            if method == _DEFLATED and os.path.getsize(path) <= DEFLATE_IN_MEMORY_LIMIT:
+                future = pool.submit(_compress_file, path)
+            pending.append((path, method, future))
+            while len(pending) > window:
+                flush_one(pending.popleft())
+        while pending:
+            flush_one(pending.popleft())
@@ -1,9 +1,13 @@
 import torch
+import hashlib
+import weakref
+import threading
 import comfy.model_management
 import comfy.utils
 import logging
 import node_helpers
 import nodes
+from collections import OrderedDict
 
 from comfy_api.latest import io
 # 从原始模块导入所需函数和类（假设它们都在 nodes_wan 或 model_multitalk 中）
@@ -23,12 +27,155 @@ from comfy.ldm.wan.model_multitalk import (
 # 确保 comfy.patcher_extension 可用
 import comfy.patcher_extension
 
+# project_audio_features 对每帧取前后各 2 帧的上下文
+AUDIO_CONTEXT_FRAMES = 2
+# 最多缓存几个 audio_encoder_output 的插值特征；长歌曲的特征很大，只保留当前这一首
+AUDIO_FEATURE_CACHE_SIZE = 1
+
+# id(audio_encoder_output) -> (audio_encoder_output, features)，保留原对象引用避免 id 被复用
+_audio_feature_cache = OrderedDict()
+_audio_feature_cache_lock = threading.Lock()
+
+
+def get_audio_features(audio_encoder_output):
+    """
+    返回 25fps 的逐帧音频特征 [T, num_layers, C]。
+    长音频分段生成时每段传入的是同一个 audio_encoder_output，
+    堆叠所有层 + 50->25fps 插值只在第一次计算，之后直接复用（调用方不得原地修改）。
+    """
+    key = id(audio_encoder_output)
+    with _audio_feature_cache_lock:
+        entry = _audio_feature_cache.get(key)
+        if entry is not None and entry[0] is audio_encoder_output:
+            _audio_feature_cache.move_to_end(key)
+            return entry[1]
+
+    all_layers = audio_encoder_output["encoded_audio_all_layers"]
+    encoded_audio = torch.stack(all_layers, dim=0).squeeze(1)[1:]  # [num_layers, T, 512]
+    features = linear_interpolation(encoded_audio, input_fps=50, output_fps=25).movedim(0, 1)  # [T, num_layers, 512]
+
+    with _audio_feature_cache_lock:
+        _audio_feature_cache[key] = (audio_encoder_output, features)
+        _audio_feature_cache.move_to_end(key)
+        while len(_audio_feature_cache) > AUDIO_FEATURE_CACHE_SIZE:
+            _audio_feature_cache.popitem(last=False)
+    return features
+
+
+def clear_audio_feature_cache():
+    with _audio_feature_cache_lock:
+        _audio_feature_cache.clear()
+
+
+# 最多缓存几组 motion frames 的 VAE 编码结果
+MOTION_LATENT_CACHE_SIZE = 4
+
+# (id(vae), width, height, 帧哈希) -> (weakref(vae), latent)，只弱引用 VAE，不阻止模型卸载
+_motion_latent_cache = OrderedDict()
+_motion_latent_cache_lock = threading.Lock()
+
+
+def _frames_digest(frames):
+    """motion frames 的内容哈希（形状 + 数据）"""
+    frames = frames.detach().contiguous().cpu()
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str((tuple(frames.shape), str(frames.dtype))).encode("ascii"))
+    h.update(frames.reshape(-1).view(torch.uint8).numpy())
+    return h.hexdigest()
+
+
+def encode_motion_frames(vae, frames, width, height):
+    """
+    缩放并 VAE 编码 motion frames，按帧内容哈希缓存。
+    同一段重跑（换种子、调参数）时 previous_frames 不变，直接复用上次的编码结果。
+    """
+    key = (id(vae), width, height, _frames_digest(frames))
+    with _motion_latent_cache_lock:
+        entry = _motion_latent_cache.get(key)
+        # VAE 已被释放时 id 可能被新对象复用，弱引用失效即视为未命中
+        if entry is not None and entry[0]() is vae:
+            _motion_latent_cache.move_to_end(key)
+            logging.info("InfiniteTalkEx: motion frames latent cache hit")
+            return entry[1]
+
+    motion_frames = comfy.utils.common_upscale(frames.movedim(-1, 1), width, height, "bilinear", "center").movedim(1, -1)
+    latent = vae.encode(motion_frames[:, :, :, :3])
+
+    with _motion_latent_cache_lock:
+        for dead in [k for k, (vae_ref, _) in _motion_latent_cache.items() if vae_ref() is None]:
+            del _motion_latent_cache[dead]
+        _motion_latent_cache[key] = (weakref.ref(vae), latent)
+        _motion_latent_cache.move_to_end(key)
+        while len(_motion_latent_cache) > MOTION_LATENT_CACHE_SIZE:
+            _motion_latent_cache.popitem(last=False)
+    return latent
+
+
+def clear_motion_latent_cache():
+    with _motion_latent_cache_lock:
+        _motion_latent_cache.clear()
+
+
+def tail_motion_latent(previous_latent, motion_frame_count, width, height):
+    """
+    从上一段采样得到的 latent 中取出末尾 ((motion_frame_count - 1) // 4) + 1 个 latent 帧，
+    作为 motion_frames_latent 的近似值，尺寸不匹配时返回 None（回退到解码帧 + VAE 编码）。
+
+    与 vae.encode(previous_frames[-motion_frame_count:]) 并不相同：
+    因果 VAE 的第一个 latent 帧只编码 1 个像素帧，其后每个 latent 帧编码 4 个像素帧，
+    而上一段末尾的这些 latent 帧每个都覆盖 4 个像素帧（默认 9 帧时覆盖的是最后约 12 帧），
+    且带有上一段的时序上下文。按上一段的帧布局无法重新对齐到编码路径的布局，
+    因此这是以条件精度换取省掉一次 解码 -> 缩放 -> 编码 的取舍。
+    """
+    samples = previous_latent["samples"]
+    latent_frames = ((motion_frame_count - 1) // 4) + 1
+    if samples.ndim != 5 or samples.shape[-2] != height // 8 or samples.shape[-1] != width // 8 \
+            or samples.shape[2] < latent_frames:
+        logging.warning(f"InfiniteTalkEx: previous_latent shape {tuple(samples.shape)} does not match "
+                        f"{width}x{height}, falling back to VAE encode")
+        return None
+    return samples[:1, :, -latent_frames:].to(comfy.model_management.intermediate_device())
+
+
+def window_audio_features(features, audio_start, audio_end, offset=0, total=None):
+    """
+    只取出 [audio_start, audio_end) 及前后上下文帧，长度为 (audio_end - audio_start) + 2 * AUDIO_CONTEXT_FRAMES。
+    与 project_audio_features 对整段音频的处理等价：下标越界时截断到边界，
+    音频不足 audio_end 时用第一帧补齐。把结果以 (AUDIO_CONTEXT_FRAMES, AUDIO_CONTEXT_FRAMES + length)
+    传给 project_audio_features 即可，单段开销与窗口长度成正比，与整首歌长度无关。
+
+    offset / total 描述一条长度为 total 的虚拟时间轴，features 位于 [offset, offset + T)，其余位置为 0
+    （多人 add / para 模式下补零后的完整张量），只生成窗口与该说话人区间重叠的部分。
+    """
+    length = features.shape[0]
+    if total is None:
+        total = offset + length
+    padded_total = max(total, audio_end)
+    idx = torch.arange(audio_start - AUDIO_CONTEXT_FRAMES, audio_end + AUDIO_CONTEXT_FRAMES)
+    idx = idx.clamp(0, padded_total - 1)
+    # 补齐部分取第一帧
+    idx = torch.where(idx < total, idx, torch.zeros_like(idx))
+    if offset == 0 and total == length:
+        return features[idx]
+
+    local = idx - offset
+    valid = (local >= 0) & (local < length)
+    window = torch.zeros((idx.shape[0], *features.shape[1:]), dtype=features.dtype, device=features.device)
+    if bool(valid.any()):
+        window[valid] = features[local[valid]]
+    return window
+
 class WanInfiniteTalkToVideoEx(io.ComfyNode):
     @classmethod
     def define_schema(cls):
         return io.Schema(
             node_id="WanInfiniteTalkToVideoEx",
             category="conditioning/video_models",
+            description="WanInfiniteTalkToVideo with an explicit audio_offset for long-audio segment chains. "
+                        "Connecting previous_latent (together with audio_offset) reuses the previous segment's "
+                        "sampled latent tail as the motion context instead of VAE-encoding previous_frames. "
+                        "This is a quality trade-off: the tail does not match the causal VAE encode of the last "
+                        "motion_frame_count frames, so the conditioning differs from the previous_frames path.",
             inputs=[
                 io.DynamicCombo.Input("mode", options=[
                 io.DynamicCombo.Option("single_speaker", []),
@@ -54,6 +201,8 @@ class WanInfiniteTalkToVideoEx(io.ComfyNode):
                 io.Image.Input("previous_frames", optional=True),
                 # 新增的 audio_offset 输入
                 io.Int.Input("audio_offset", optional=True, default=None, min=0, max=nodes.MAX_RESOLUTION, tooltip="Audio start frame index (relative to full audio). If provided, overrides calculation from previous_frames length."),
+                # 可选：直接传入上一段的采样 latent，跳过 motion frames 的 解码->缩放->编码
+                io.Latent.Input("previous_latent", optional=True, tooltip="Optional, APPROXIMATE. Sampled latent of the previous segment; its tail is used as motion_frames_latent directly, skipping the VAE encode of previous_frames. The result is not identical to encoding the decoded frames (the causal VAE encodes the tail chunk differently), so leave it unconnected for exact continuation. Only used together with audio_offset."),
             ],
             outputs=[
                 io.Model.Output(display_name="model"),
@@ -69,7 +218,7 @@ class WanInfiniteTalkToVideoEx(io.ComfyNode):
                 audio_encoder_output_1, motion_frame_count, audio_scale=1.0,
                 start_image=None, clip_vision_output=None, previous_frames=None,
                 audio_encoder_output_2=None, mask_1=None, mask_2=None,
-                audio_offset=None):   # 新增参数
+                audio_offset=None, previous_latent=None):   # 新增参数
         """执行逻辑与原始节点基本相同，但音频起始位置优先使用 audio_offset"""
 
         # 处理模式选择（同原始代码）
@@ -108,39 +257,32 @@ class WanInfiniteTalkToVideoEx(io.ComfyNode):
 
         model_patched = model.clone()
 
-        # 处理音频编码（同原始代码）
+        # 处理音频编码：插值后的特征按 audio_encoder_output 缓存，分段时不再重复计算
         encoded_audio_list = []
         seq_lengths = []
         for audio_encoder_output in [audio_encoder_output_1, audio_encoder_output_2]:
             if audio_encoder_output is None:
                 continue
-            all_layers = audio_encoder_output["encoded_audio_all_layers"]
-            encoded_audio = torch.stack(all_layers, dim=0).squeeze(1)[1:]  # [num_layers, T, 512]
-            encoded_audio = linear_interpolation(encoded_audio, input_fps=50, output_fps=25).movedim(0, 1)  # [T, num_layers, 512]
+            encoded_audio = get_audio_features(audio_encoder_output)
             encoded_audio_list.append(encoded_audio)
             seq_lengths.append(encoded_audio.shape[0])
 
+        # 多人时不再分配补零后的完整张量，只记录每个说话人在虚拟时间轴上的 (offset, total)
+        audio_layouts = [(0, seq_len) for seq_len in seq_lengths]
         multi_audio_type = "add"
         if len(encoded_audio_list) > 1:
             if multi_audio_type == "para":
+                # 各自从 0 开始，补零到最长
                 max_len = max(seq_lengths)
-                padded = []
-                for emb in encoded_audio_list:
-                    if emb.shape[0] < max_len:
-                        pad = torch.zeros(max_len - emb.shape[0], *emb.shape[1:], dtype=emb.dtype)
-                        emb = torch.cat([emb, pad], dim=0)
-                    padded.append(emb)
-                encoded_audio_list = padded
+                audio_layouts = [(0, max_len) for _ in seq_lengths]
             elif multi_audio_type == "add":
+                # 依次首尾相接，总长为各段之和
                 total_len = sum(seq_lengths)
-                full_list = []
+                audio_layouts = []
                 offset = 0
-                for emb, seq_len in zip(encoded_audio_list, seq_lengths):
-                    full = torch.zeros(total_len, *emb.shape[1:], dtype=emb.dtype)
-                    full[offset:offset+seq_len] = emb
-                    full_list.append(full)
+                for seq_len in seq_lengths:
+                    audio_layouts.append((offset, total_len))
                     offset += seq_len
-                encoded_audio_list = full_list
 
         token_ref_target_masks = None
         if ref_masks is not None:
@@ -149,8 +291,14 @@ class WanInfiniteTalkToVideoEx(io.ComfyNode):
             token_ref_target_masks = (token_ref_target_masks > 0).view(token_ref_target_masks.shape[0], -1)
 
         # ========== 核心修改：处理前置帧和音频偏移 ==========
-        if previous_frames is not None:
-            motion_frames = comfy.utils.common_upscale(previous_frames[-motion_frame_count:].movedim(-1, 1), width, height, "bilinear", "center").movedim(1, -1)
+        if previous_latent is not None and audio_offset is None:
+            # 没有 audio_offset 时无法确定 latent 对应的音频位置，退回到编码 previous_frames
+            if previous_frames is None:
+                raise ValueError("previous_latent requires audio_offset; connect audio_offset or previous_frames.")
+            logging.warning("InfiniteTalkEx: audio_offset not provided, ignoring previous_latent and encoding previous_frames")
+            previous_latent = None
+        is_extend = previous_frames is not None or previous_latent is not None
+        if is_extend:
             # 优先使用传入的 audio_offset
             if audio_offset is not None:
                 frame_offset = audio_offset
@@ -161,7 +309,16 @@ class WanInfiniteTalkToVideoEx(io.ComfyNode):
             audio_end = audio_start + length
             logging.info(f"InfiniteTalkEx: Processing audio frames {audio_start} - {audio_end}")
 
-            motion_frames_latent = vae.encode(motion_frames[:, :, :, :3])
+            motion_frames_latent = None
+            if previous_latent is not None:
+                motion_frames_latent = tail_motion_latent(previous_latent, motion_frame_count, width, height)
+                if motion_frames_latent is not None:
+                    logging.warning("InfiniteTalkEx: using the tail of previous_latent as motion context "
+                                    "(approximate, differs from encoding previous_frames)")
+            if motion_frames_latent is None:
+                if previous_frames is None:
+                    raise ValueError("previous_frames is required when previous_latent cannot be used.")
+                motion_frames_latent = encode_motion_frames(vae, previous_frames[-motion_frame_count:], width, height)
             trim_image = motion_frame_count
         else:
             audio_start = trim_image = 0
@@ -172,8 +329,11 @@ class WanInfiniteTalkToVideoEx(io.ComfyNode):
             else:
                 motion_frames_latent = torch.zeros([1, 16, 1, height//8, width//8], device=latent.device)
 
-        # 音频投影（同原始代码）
-        audio_embed = project_audio_features(model_patch.model.audio_proj, encoded_audio_list, audio_start, audio_end).to(model_patched.model_dtype())
+        # 音频投影：只把当前窗口（含上下文帧）交给 project_audio_features
+        audio_windows = [window_audio_features(emb, audio_start, audio_end, offset, total)
+                         for emb, (offset, total) in zip(encoded_audio_list, audio_layouts)]
+        audio_embed = project_audio_features(model_patch.model.audio_proj, audio_windows,
+                                             AUDIO_CONTEXT_FRAMES, AUDIO_CONTEXT_FRAMES + audio_end - audio_start).to(model_patched.model_dtype())
         model_patched.model_options["transformer_options"]["audio_embeds"] = audio_embed
 
         # 添加包装器和补丁（同原始代码）
@@ -183,7 +343,7 @@ class WanInfiniteTalkToVideoEx(io.ComfyNode):
             InfiniteTalkOuterSampleWrapper(
                 motion_frames_latent,
                 model_patch,
-                is_extend=previous_frames is not None,
+                is_extend=is_extend,
             ))
         model_patched.set_model_patch(MultiTalkCrossAttnPatch(model_patch, audio_scale), "attn2_patch")
         if token_ref_target_masks is not None:
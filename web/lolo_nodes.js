@@ -104,6 +104,21 @@ app.registerExtension({
 
             console.log(`[LoLo Nodes] 节点 ${node_id} 的按钮已更新并生效。`);
         });
+
+        // 监听压缩进度 'lolo.zip_progress'，在按钮上显示已处理文件数
+        app.api.addEventListener("lolo.zip_progress", (event) => {
+            const { node_id, done, total, size_mb } = event.detail;
+            const targetNode = app.graph._nodes_by_id[node_id];
+            const button = targetNode?._loloDownloadButton;
+            if (!button) return;
+
+            if (done >= total && !button.disabled) {
+                // 流式下载完成，恢复按钮文字
+                button.textContent = '⬇ 下载ZIP文件';
+                return;
+            }
+            button.textContent = `⏳ 压缩中 ${done}/${total} (${size_mb} MB)`;
+        });
     }
 });
 